@@ -165,17 +165,16 @@ if FASTAPI_AVAILABLE and router and sorter:
                 raise HTTPException(status_code=404, detail=f"Category not found: {category}")
             
             # Get files recursively
-            files = []
-            for root, _, filenames in os.walk(category_path):
-                for filename in filenames:
-                    file_path = os.path.join(root, filename)
-                    relative_path = os.path.relpath(file_path, sorter.sorting_dept_path)
-                    files.append({
-                        "path": relative_path,
-                        "filename": filename,
-                        "size": os.path.getsize(file_path),
-                        "modified": os.path.getmtime(file_path)
-                    })
+            from src.crawler import crawl
+            files = [
+                {
+                    "path": os.path.relpath(record.path, sorter.sorting_dept_path),
+                    "filename": record.name,
+                    "size": record.size,
+                    "modified": record.mtime
+                }
+                for record in crawl(category_path)
+            ]
             
             return {"category": category, "files": files}
         except Exception as e:
@@ -14,7 +14,6 @@ import os
 import sys
 import json
 import time
-import shutil
 import logging
 import datetime
 import re
@@ -60,6 +59,11 @@ except ImportError:
                 os.makedirs(SafePaths.DEFAULT_SAFE_PATH, exist_ok=True)
             return SafePaths.DEFAULT_SAFE_PATH
 
+# Destination names come from the shared allocator, and moves are recorded in
+# the undo log so a sorting session can be rolled back
+from src.name_allocator import get_name_allocator
+from src.undo_log import get_undo_log
+
 # Define hierarchical categories for sorting
 HIERARCHICAL_CATEGORIES = {
     "People": ["portrait", "face", "group", "selfie", "person", "people", "family", "child", "baby"],
@@ -480,6 +484,9 @@ class PhotoPrismSorter:
         self.photoprism_password = self.config.get("photoprism_password")
         self.photoprism_session = None
         
+        # Undo log run for this sorter, opened on the first move
+        self.undo_run = None
+        
         if self.photoprism_url:
             self._init_photoprism_session()
     
@@ -561,20 +568,20 @@ class PhotoPrismSorter:
             destination_path = self._get_destination_path(final_result)
             
             # Move and rename file
-            os.makedirs(destination_path, exist_ok=True)
-            new_file_path = os.path.join(destination_path, new_filename)
+            if self.undo_run is None:
+                self.undo_run = get_undo_log().start_run("photoprism", self.sorting_dept_path, autoflush=True)
+            self.undo_run.makedirs(destination_path)
             
-            # Handle filename conflicts
-            if os.path.exists(new_file_path):
-                base_name, extension = os.path.splitext(new_filename)
-                counter = 1
-                while os.path.exists(os.path.join(destination_path, f"{base_name}_{counter}{extension}")):
-                    counter += 1
-                new_filename = f"{base_name}_{counter}{extension}"
-                new_file_path = os.path.join(destination_path, new_filename)
+            # Handle filename conflicts (destination folders are listed once, not probed per file)
+            allocator = get_name_allocator()
+            new_file_path = allocator.allocate(os.path.join(destination_path, new_filename))
             
-            # Move the file
-            shutil.move(file_path, new_file_path)
+            # Move the file, handing the name back if it didn't land there
+            try:
+                self.undo_run.move_file(file_path, new_file_path)
+            except Exception:
+                allocator.release(new_file_path)
+                raise
             
             # Update PhotoPrism index if configured
             if self.photoprism_session:
@@ -42,12 +42,12 @@ class LogManager:
         self.error_log_file = os.path.join(self.logs_dir, 'error.log')
         self.access_log_file = os.path.join(self.logs_dir, 'access.log')
         
+        # Log message queue for live viewing (needed by the queue handler)
+        self.log_queue = queue.Queue(maxsize=1000)  # Store last 1000 log messages
+        
         # Setup main logger
         self._setup_main_logger()
         
-        # Log message queue for live viewing
-        self.log_queue = queue.Queue(maxsize=1000)  # Store last 1000 log messages
-        
         # Store component loggers
         self.component_loggers = {}
         
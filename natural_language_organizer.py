@@ -22,12 +22,6 @@ import logging
 from typing import Dict, List, Tuple, Set, Optional, Any, Union
 from pathlib import Path
 
-try:
-    import groq
-    GROQ_AVAILABLE = True
-except ImportError:
-    GROQ_AVAILABLE = False
-
 # Set up logging with the centralized log manager
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 try:
@@ -38,6 +32,23 @@ except ImportError:
     logging.basicConfig(level=logging.INFO)
     logger = logging.getLogger("natural_organizer")
 
+# Import the shared LLM provider layer
+try:
+    from src.llm_provider import get_provider
+    PROVIDER_AVAILABLE = True
+except ImportError:
+    PROVIDER_AVAILABLE = False
+
+# Compiled rule engine over the shared directory crawler, name allocator,
+# journaled move transactions and undo log
+from src.crawler import FileRecord
+from src.error_handler import FileOperationError
+from src.move_planner import MoveTransaction, PlanError
+from src.name_allocator import NameAllocator
+from src.path_policy import get_path_policy
+from src.rule_engine import RuleEngine
+from src.undo_log import get_undo_log
+
 # Import safe path utilities
 try:
     from safe_paths import SafePaths
@@ -168,9 +179,14 @@ class NaturalLanguageParser:
         os.makedirs(self.data_dir, exist_ok=True)
         
         self.api_key = self._get_api_key()
+        if self.api_key and not os.environ.get("GROQ_API_KEY"):
+            # The provider layer reads the key from the environment
+            os.environ["GROQ_API_KEY"] = self.api_key
         self.client = None
-        if self.api_key and GROQ_AVAILABLE:
-            self.client = groq.Client(api_key=self.api_key)
+        if PROVIDER_AVAILABLE:
+            provider = get_provider()
+            if provider.available:
+                self.client = provider
             
     def _get_api_key(self) -> Optional[str]:
         """Get the API key from environment or file"""
@@ -255,18 +271,16 @@ Example response:
 
         logger.info("Using AI to parse instruction")
         try:
-            # Make API call to Groq
-            completion = self.client.chat.completions.create(
-                messages=[
+            # Make API call through the configured provider
+            response_text = await self.client.achat(
+                [
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": instruction}
                 ],
-                model="llama-3.1-70b-versatile",
-                response_format={"type": "json_object"}
+                json_mode=True,
             )
             
             # Parse the response
-            response_text = completion.choices[0].message.content
             response_json = json.loads(response_text)
             
             # Convert to rule objects
@@ -348,278 +362,252 @@ class NaturalLanguageOrganizer:
         self.base_dir = os.path.dirname(os.path.abspath(__file__))
         self.parser = NaturalLanguageParser()
         
-    async def organize(self, instruction: str, base_path: Optional[str] = None) -> Dict[str, Any]:
+    async def organize(self, instruction: str, base_path: Optional[str] = None,
+                       dry_run: bool = False) -> Dict[str, Any]:
         """Organize files based on natural language instruction
         
+        Every action is planned up front (see `plan`), then the plan is
+        executed in one move transaction. Unlike a plan passed to
+        `execute_plan`, the plan built here is not checked again.
+        
         Args:
             instruction: Natural language instruction
             base_path: Optional base path to start from (defaults to safe path)
+            dry_run: Only plan; the result lists the actions without moving anything
             
         Returns:
             Dictionary with organization results
         """
         start_time = time.time()
         
+        plan = await self.plan(instruction, base_path)
+        if not plan["rules"]:
+            return {"success": False, "message": "Could not parse instruction", "files_moved": 0}
+        
+        if dry_run:
+            return {
+                "success": True,
+                "dry_run": True,
+                "message": f"Would organize {len(plan['actions'])} files according to instruction",
+                "files_moved": 0,
+                "actions": plan["actions"],
+                "plan": plan,
+                "execution_time": time.time() - start_time
+            }
+        
+        result = await self._apply_actions(plan["base_path"], plan["actions"])
+        result["execution_time"] = time.time() - start_time
+        return result
+    
+    async def plan(self, instruction: str, base_path: Optional[str] = None) -> Dict[str, Any]:
+        """Work out every move an instruction would make, without moving anything
+        
+        Args:
+            instruction: Natural language instruction
+            base_path: Optional base path to start from (defaults to safe path)
+            
+        Returns:
+            Plan dictionary with "instruction", "base_path", "rules",
+            "actions" (source/destination pairs) and "now" (the reference
+            time of date filters), which can be previewed, saved as JSON and
+            passed to `execute_plan`
+        """
         # Get safe base path
         if base_path:
             safe_path = SafePaths.get_safe_path(base_path)
         else:
             safe_path = SafePaths.DEFAULT_SAFE_PATH
+        safe_path = os.path.abspath(safe_path)
         
-        logger.info(f"Starting organization with base path: {safe_path}")
+        logger.info(f"Planning organization with base path: {safe_path}")
         
         # Parse the instruction into rules
         rules = await self.parser.parse_instruction(instruction)
-        if not rules:
-            return {"success": False, "message": "Could not parse instruction", "files_moved": 0}
+        now = time.time()
+        actions = await asyncio.to_thread(self.plan_rules, rules, safe_path, now)
+        return {
+            "instruction": instruction,
+            "base_path": safe_path,
+            "rules": [rule.to_dict() for rule in rules],
+            "actions": actions,
+            "now": now
+        }
+    
+    def plan_rules(self, rules: List[NLOrganizationRule], safe_path: str,
+                   now: Optional[float] = None) -> List[Dict]:
+        """Plan the actions of parsed rules against in-memory directory listings
         
-        # Process rules and move files
-        total_moved = 0
-        actions = []
+        The rules are compiled into one rule engine, which walks each source
+        folder once and gives every file to the highest-priority rule that
+        matches it (the earlier rule on a tie). Name collisions are resolved
+        by a planning allocator, so no file is stat-ed to find a free name.
+        
+        Args:
+            rules: Rules to apply
+            safe_path: Base safe path
+            now: Reference time for date filters (defaults to now)
+            
+        Returns:
+            List of actions (source, destination and rule index)
+        """
+        allocator = NameAllocator(verify=False)
+        safe_path = os.path.abspath(safe_path)
+        compiled = []
+        destinations = []
+        
+        def outside(path):
+            return os.path.commonpath([path, safe_path]) != safe_path or SafePaths.is_github_path(path)
         
-        for rule in rules:
+        for index, rule in enumerate(rules):
             source_path = rule.source_path
             
             # Handle relative/absolute paths
-            if not os.path.isabs(source_path):
-                source_path = os.path.join(safe_path, source_path)
+            source_path = os.path.abspath(os.path.join(safe_path, source_path))
             
             # Verify source path is within safe path
-            if not source_path.startswith(safe_path) and SafePaths.is_github_path(source_path):
+            if outside(source_path):
                 logger.warning(f"Source path outside of safe path: {source_path}")
                 continue
                 
             if not os.path.exists(source_path):
-            logger.warning(f"Source path does not exist: {source_path}. Please check the path and try again.")
-
+                logger.warning(f"Source path does not exist: {source_path}. Please check the path and try again.")
                 continue
             
-            # Apply rule to files
-            files_moved = await self._process_rule(rule, source_path, safe_path)
-            total_moved += len(files_moved)
-            actions.extend(files_moved)
-        
-        execution_time = time.time() - start_time
-        
-        result = {
-            "success": True,
-            "message": f"Organized {total_moved} files according to instruction",
-            "files_moved": total_moved,
-            "actions": actions,
-            "execution_time": execution_time
-        }
-        
-        logger.info(f"Organization complete: {result['message']}")
-        return result
-    
-    async def _process_rule(self, rule: NLOrganizationRule, source_path: str, base_path: str) -> List[Dict]:
-        """Process a single organization rule
-        
-        Args:
-            rule: The rule to apply
-            source_path: Source path to look for files
-            base_path: Base safe path
+            # Build destination path, which must be within safe path too
+            dest_path = os.path.abspath(os.path.join(safe_path, rule.destination_path))
+            if outside(dest_path):
+                logger.warning(f"Destination path outside of safe path: {dest_path}")
+                continue
             
-        Returns:
-            List of actions performed (files moved)
-        """
-        files_moved = []
+            compiled.append((rule, source_path))
+            destinations.append((index, dest_path))
         
-        # Build destination path
-        dest_path = rule.destination_path
-        if not os.path.isabs(dest_path):
-            dest_path = os.path.join(base_path, dest_path)
+        # Files in GitHub, tool and system folders are never moved
+        engine = RuleEngine(compiled, now=now, policy=get_path_policy())
+        actions = []
+        for record, match in engine.matches():
+            index, dest_path = destinations[match.index]
+            rule = rules[index]
             
-        # Ensure destination exists
-        os.makedirs(dest_path, exist_ok=True)
-        
-        # Find matching files
-        matching_files = self._find_matching_files(rule, source_path)
-        
-        # Move each file
-        for src_file in matching_files:
             # Generate destination filename
-            filename = os.path.basename(src_file)
+            filename = record.name
             if rule.name_pattern:
-                filename = self._apply_name_pattern(rule.name_pattern, filename, src_file)
-                
-            dst_file = os.path.join(dest_path, filename)
+                filename = self._apply_name_pattern(rule.name_pattern, filename, record)
             
-            # Handle filename conflicts
-            if os.path.exists(dst_file):
-                base, ext = os.path.splitext(dst_file)
-                counter = 1
-                while os.path.exists(f"{base}_{counter}{ext}"):
-                    counter += 1
-                dst_file = f"{base}_{counter}{ext}"
-            
-            # Move the file
-            try:
-                # Create containing folder if needed
-                os.makedirs(os.path.dirname(dst_file), exist_ok=True)
-                
-                # Move file
-                shutil.move(src_file, dst_file)
-                
-                # Record action
-                files_moved.append({
-                    "source": src_file,
-                    "destination": dst_file,
-                    "success": True
-                })
-                logger.info(f"Moved file: {src_file} -> {dst_file}")
-            except Exception as e:
-                files_moved.append({
-                    "source": src_file,
-                    "destination": dst_file,
-                    "success": False,
-                    "error": str(e)
-                })
-                logger.error(f"Failed to move file {src_file}: {e}")
-        
-        return files_moved
-    
-    def _find_matching_files(self, rule: NLOrganizationRule, source_path: str) -> List[str]:
-        """Find files matching the rule criteria
-        
-        Args:
-            rule: The rule to apply
-            source_path: Source path to look for files
+            # Files already in place stay where they are
+            if os.path.dirname(record.path) == dest_path and filename == record.name:
+                continue
             
-        Returns:
-            List of matching file paths
-        """
-        matching_files = []
-        
-        # Walk through directory (recursive or not)
-        if rule.recursive:
-            for root, _, files in os.walk(source_path):
-                for filename in files:
-                    file_path = os.path.join(root, filename)
-                    if self._file_matches_rule(file_path, rule):
-                        matching_files.append(file_path)
-        else:
-            # Non-recursive mode
-            for filename in os.listdir(source_path):
-                file_path = os.path.join(source_path, filename)
-                if os.path.isfile(file_path) and self._file_matches_rule(file_path, rule):
-                    matching_files.append(file_path)
+            # Handle filename conflicts
+            dst_file = allocator.allocate(os.path.join(dest_path, filename))
+            actions.append({"source": record.path, "destination": dst_file, "rule": index})
         
-        return matching_files
+        logger.info(f"Planned {len(actions)} moves from {engine.stats['files']} files "
+                    f"({engine.stats['matched']} matched, {engine.stats['content_reads']} read for content)")
+        return actions
     
-    def _file_matches_rule(self, file_path: str, rule: NLOrganizationRule) -> bool:
-        """Check if a file matches the rule criteria
-        
-        Args:
-            file_path: Path to the file
-            rule: The rule to check against
-            
-        Returns:
-            True if file matches all criteria, False otherwise
-        """
-        # Check file extension
-        _, ext = os.path.splitext(file_path.lower())
-        if "*" not in rule.file_types and ext not in rule.file_types:
-            return False
-        
-        # Check date filter
-        if rule.date_filter:
-            file_time = os.path.getmtime(file_path)
-            if not self._matches_date_filter(file_time, rule.date_filter):
-                return False
+    async def execute_plan(self, plan: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute a plan from `plan` in one journaled move transaction
         
-        # Check content filter
-        if rule.content_filter and not self._matches_content_filter(file_path, rule.content_filter):
-            return False
-        
-        # Check size filter
-        if rule.size_filter:
-            file_size = os.path.getsize(file_path)
-            if not self._matches_size_filter(file_size, rule.size_filter):
-                return False
-        
-        return True
-    
-    def _matches_date_filter(self, file_time: float, date_filter: Dict) -> bool:
-        """Check if a file's modification time matches the date filter
+        Plans may come from clients, so only a plan whose base path is a
+        safe path, whose moves all stay inside it and whose actions are
+        exactly what its rules produce when planned again here (with date
+        filters relative to the plan's own reference time) is executed.
+        A plan that went stale since it was previewed therefore moves
+        nothing. If a move fails, the moves already made are rolled back.
+        The moves are recorded in the undo log.
         
         Args:
-            file_time: File modification timestamp
-            date_filter: Date filter specification
+            plan: Plan dictionary from `plan`
             
         Returns:
-            True if file matches the date filter
-        """
-        now = time.time()
-        
-        if "newer_than_days" in date_filter:
-            days = date_filter["newer_than_days"]
-            return now - file_time < days * 86400  # seconds in a day
-            
-        if "older_than_days" in date_filter:
-            days = date_filter["older_than_days"]
-            return now - file_time > days * 86400
-            
-        return True
-    
-    def _matches_content_filter(self, file_path: str, content_filter: str) -> bool:
-        """Check if a file's content matches the content filter
-        
-        Args:
-            file_path: Path to the file
-            content_filter: Content filter specification
+            Dictionary with organization results
             
-        Returns:
-            True if file matches the content filter
+        Raises:
+            ValueError: If the plan is rejected
         """
-        # Only check text-based files
-        _, ext = os.path.splitext(file_path.lower())
-        text_extensions = [".txt", ".md", ".py", ".js", ".html", ".css", ".json", ".xml", ".csv"]
+        start_time = time.time()
+        base_path = plan.get("base_path")
+        safe_path = os.path.abspath(SafePaths.get_safe_path(base_path) if base_path else SafePaths.DEFAULT_SAFE_PATH)
+        if base_path and os.path.abspath(base_path) != safe_path:
+            raise ValueError(f"Plan base path is not a safe path: {base_path}")
+        
+        actions = [{"source": action["source"], "destination": action["destination"]}
+                   for action in plan.get("actions", [])]
+        for action in actions:
+            for path in (action["source"], action["destination"]):
+                path = os.path.abspath(path)
+                if os.path.commonpath([path, safe_path]) != safe_path or SafePaths.is_github_path(path):
+                    raise ValueError(f"Plan moves a path outside {safe_path}: {path}")
+        
+        now = plan.get("now")
+        if now is not None and (isinstance(now, bool) or not isinstance(now, (int, float))):
+            raise ValueError(f"Plan reference time is not a timestamp: {now!r}")
+        
+        # Only the moves the plan's own rules produce now are executed
+        rules = [NLOrganizationRule.from_dict(rule) for rule in plan.get("rules", [])]
+        expected = await asyncio.to_thread(self.plan_rules, rules, safe_path, now)
+        if {(a["source"], a["destination"]) for a in expected} != {(a["source"], a["destination"]) for a in actions}:
+            raise ValueError("Plan does not match what its rules produce now; preview it again")
+        
+        result = await self._apply_actions(safe_path, actions)
+        result["execution_time"] = time.time() - start_time
+        return result
+    
+    async def _apply_actions(self, safe_path: str, actions: List[Dict]) -> Dict[str, Any]:
+        """Move the files of checked actions in one move transaction and record them"""
+        start_time = time.time()
+        actions = [{"source": action["source"], "destination": action["destination"]} for action in actions]
+        if not actions:
+            return {"success": True, "message": "Organized 0 files according to instruction",
+                    "files_moved": 0, "actions": [], "execution_time": time.time() - start_time}
         
-        if ext not in text_extensions:
-            return False
-            
+        moves = [{"src_path": action["source"], "dst_path": action["destination"]} for action in actions]
         try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-                return content_filter.lower() in content.lower()
-        except Exception:
-            return False
-    
-    def _matches_size_filter(self, file_size: int, size_filter: Dict) -> bool:
-        """Check if a file's size matches the size filter
+            transaction = await asyncio.to_thread(MoveTransaction.from_plan, safe_path, moves)
+            await asyncio.to_thread(transaction.apply)
+        except PlanError as e:
+            logger.error(f"Plan is out of date: {e}")
+            return {"success": False, "message": f"Plan is out of date: {e}", "problems": e.problems,
+                    "files_moved": 0, "actions": actions}
+        except FileOperationError as e:
+            logger.error(f"Organization failed and was rolled back: {e}")
+            for action in actions:
+                action.update(success=False, error=str(e))
+            return {"success": False, "message": f"Organization failed and was rolled back: {e}",
+                    "files_moved": 0, "actions": actions}
+        
+        undo_run = await asyncio.to_thread(get_undo_log().record_transaction, transaction, "natural_language")
+        for action in actions:
+            action["success"] = True
         
-        Args:
-            file_size: File size in bytes
-            size_filter: Size filter specification
-            
-        Returns:
-            True if file matches the size filter
-        """
-        if "min_bytes" in size_filter and file_size < size_filter["min_bytes"]:
-            return False
-            
-        if "max_bytes" in size_filter and file_size > size_filter["max_bytes"]:
-            return False
-            
-        return True
+        result = {
+            "success": True,
+            "message": f"Organized {len(actions)} files according to instruction",
+            "files_moved": len(actions),
+            "actions": actions,
+            "undo_run": undo_run,
+            "execution_time": time.time() - start_time
+        }
+        
+        logger.info(f"Organization complete: {result['message']}")
+        return result
     
-    def _apply_name_pattern(self, pattern: str, filename: str, file_path: str) -> str:
+    def _apply_name_pattern(self, pattern: str, filename: str, record: FileRecord) -> str:
         """Apply naming pattern to a file
         
         Args:
             pattern: Naming pattern
             filename: Original filename
-            file_path: Path to the file
+            record: Crawler record of the file (for its date and size)
             
         Returns:
             New filename based on pattern
         """
         # Get file info
         name, ext = os.path.splitext(filename)
-        mod_time = os.path.getmtime(file_path)
-        mod_date = time.strftime("%Y-%m-%d", time.localtime(mod_time))
-        file_size = os.path.getsize(file_path)
+        mod_date = time.strftime("%Y-%m-%d", time.localtime(record.mtime))
+        file_size = record.size
         
         # Replace placeholders
         result = pattern.replace("{filename}", name)
@@ -634,39 +622,99 @@ class NaturalLanguageOrganizer:
             
         return result
 
+def format_plan(plan: Dict[str, Any]) -> str:
+    """Render a plan as one "source -> destination" line per move, relative to its base path
+    
+    Args:
+        plan: Plan dictionary from `NaturalLanguageOrganizer.plan`
+        
+    Returns:
+        Text suitable for previewing or diffing against another plan
+    """
+    base = plan.get("base_path") or ""
+    
+    def relative(path):
+        return os.path.relpath(path, base) if base and path.startswith(base) else path
+    
+    lines = [f"{relative(action['source'])} -> {relative(action['destination'])}"
+             for action in plan["actions"]]
+    return "\n".join(sorted(lines))
+
 # API functions for the FastAPI server
-async def handle_natural_language_command(instruction: str, path: Optional[str] = None) -> Dict[str, Any]:
+async def handle_natural_language_command(instruction: str, path: Optional[str] = None,
+                                          dry_run: bool = False) -> Dict[str, Any]:
     """Handle a natural language organization command
     
     Args:
         instruction: Natural language instruction
         path: Optional base path to start from
+        dry_run: Only plan the moves
         
     Returns:
-        Dictionary with organization results
+        Dictionary with organization results (and the plan, for a dry run)
+        
+    Raises:
+        ValueError: If the plan is rejected
     """
     organizer = NaturalLanguageOrganizer()
-    result = await organizer.organize(instruction, path)
+    result = await organizer.organize(instruction, path, dry_run=dry_run)
     return result
 
+async def handle_plan_execution(plan: Dict[str, Any]) -> Dict[str, Any]:
+    """Execute a plan previewed with a dry run
+    
+    Args:
+        plan: Plan dictionary returned by a dry run
+        
+    Returns:
+        Dictionary with organization results
+        
+    Raises:
+        ValueError: If the plan is rejected (see `NaturalLanguageOrganizer.execute_plan`)
+    """
+    organizer = NaturalLanguageOrganizer()
+    return await organizer.execute_plan(plan)
+
 # Command-line interface
 def main():
     """Command-line interface for testing the natural language organizer"""
     import argparse
     
     parser = argparse.ArgumentParser(description="Organize files using natural language commands")
-    parser.add_argument("instruction", help="Natural language instruction for file organization")
+    parser.add_argument("instruction", nargs="?", help="Natural language instruction for file organization")
     parser.add_argument("--path", "-p", help="Base path to start organization from")
+    parser.add_argument("--dry-run", "-n", action="store_true", help="Print the planned moves without moving anything")
+    parser.add_argument("--save-plan", help="With --dry-run, also write the plan as JSON to this file")
+    parser.add_argument("--apply-plan", help="Execute a plan saved with --save-plan")
     
     args = parser.parse_args()
+    if not args.instruction and not args.apply_plan:
+        parser.error("an instruction or --apply-plan is required")
     
     loop = asyncio.get_event_loop()
     organizer = NaturalLanguageOrganizer()
-    result = loop.run_until_complete(organizer.organize(args.instruction, args.path))
+    
+    if args.apply_plan:
+        with open(args.apply_plan, "r", encoding="utf-8") as f:
+            plan = json.load(f)
+        try:
+            result = loop.run_until_complete(organizer.execute_plan(plan))
+        except ValueError as e:
+            parser.exit(1, f"Plan rejected: {e}\n")
+    elif args.dry_run:
+        plan = loop.run_until_complete(organizer.plan(args.instruction, args.path))
+        if args.save_plan:
+            with open(args.save_plan, "w", encoding="utf-8") as f:
+                json.dump(plan, f, indent=2)
+        print(format_plan(plan))
+        return
+    else:
+        try:
+            result = loop.run_until_complete(organizer.organize(args.instruction, args.path))
+        except ValueError as e:
+            parser.exit(1, f"Plan rejected: {e}\n")
     
     print(json.dumps(result, indent=2))
 
 if __name__ == "__main__":
-    # Required imports for standalone use
-    import shutil
     main()
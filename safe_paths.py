@@ -2,6 +2,8 @@ import os
 import shutil
 from pathlib import Path
 
+from src.move_engine import move_file
+
 class SafePaths:
     """Helper class to manage safe paths for file operations"""
     
@@ -33,13 +35,8 @@ class SafePaths:
     def safe_move(src, dst):
         """Safely move a file with proper directory creation"""
         try:
-            # Create destination directory if it doesn't exist
-            dst_dir = os.path.dirname(dst)
-            if dst_dir and not os.path.exists(dst_dir):
-                os.makedirs(dst_dir, exist_ok=True)
-            
-            # Move the file
-            shutil.move(src, dst)
+            # Move the file, creating its directory (verified copy across devices)
+            move_file(src, dst)
             return True
         except Exception as e:
             print(f"Error moving file: {e}")
@@ -1,4 +1,5 @@
 from transformers import pipeline  # Added import for HuggingFace transformers
+import asyncio
 import json
 import logging
 
@@ -16,8 +17,14 @@ from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from watchdog.observers import Observer
 
-from src.loader import get_dir_summaries
-from src.tree_generator import create_file_tree
+from src.loader import (
+    get_incremental_dir_summaries,
+    iter_incremental_dir_summaries,
+)
+from src.error_handler import FileOperationError
+from src.move_planner import MoveTransaction, PlanError, journal_dir, pending_journals, recover
+from src.undo_log import get_undo_log
+from src.tree_generator import _mock_file_tree, create_file_tree, iter_file_tree
 from src.watch_utils import Handler
 from src.watch_utils import create_file_tree as create_watch_file_tree
 
@@ -32,6 +39,7 @@ class Request(BaseModel):
     path: Optional[str] = None
     instruction: Optional[str] = None
     incognito: Optional[bool] = False
+    stream: Optional[bool] = False  # Stream /batch results as NDJSON
 
 
 class CommitRequest(BaseModel):
@@ -40,6 +48,27 @@ class CommitRequest(BaseModel):
     dst_path: str  # Relative to base_path
 
 
+class Move(BaseModel):
+    src_path: str  # Relative to base_path
+    dst_path: str  # Relative to base_path
+
+
+class BulkCommitRequest(BaseModel):
+    base_path: str
+    moves: List[Move]
+    rollback_on_error: Optional[bool] = True  # Otherwise leave the journal for /commit/recover
+
+
+class RecoverRequest(BaseModel):
+    journal: Optional[str] = None  # Journal file name; defaults to every unfinished journal
+    direction: Optional[str] = "back"  # "forward" or "back"
+
+
+class RollbackRequest(BaseModel):
+    run_id: str
+    dry_run: Optional[bool] = False  # Only report what would be moved back
+
+
 class FeedbackRequest(BaseModel):
     src_path: str
     recommended_path: str
@@ -51,6 +80,12 @@ class EvolutionRequest(BaseModel):
     force_rebuild: Optional[bool] = False
 
 
+# Number of placement proposals per line of a streamed /batch response
+BATCH_STREAM_CHUNK_SIZE = 50
+
+# Active watch handlers keyed by watched path
+watch_handlers = {}
+
 app = FastAPI()
 
 origins = ["*"]
@@ -89,9 +124,15 @@ async def batch(request: Request):
         raise HTTPException(
             status_code=400, detail="Path does not exist in filesystem")
 
-    summaries = await get_dir_summaries(path)
+    if request.stream:
+        return StreamingResponse(
+            stream_batch(path, session), media_type="application/x-ndjson"
+        )
+
+    # Only files changed since the last run are re-summarized
+    summaries = await get_incremental_dir_summaries(path)
     # Get file tree
-    files = create_file_tree(summaries, session)
+    files = await asyncio.to_thread(create_file_tree, summaries, session)
 
     # Recursively create dictionary from file paths
     tree = {}
@@ -106,15 +147,75 @@ async def batch(request: Request):
     tr = LeftAligned(draw=BoxStyle(gfx=BOX_LIGHT, horiz_len=1))
     print(tr(tree))
 
-    # Prepend base path to dst_path
+    summary_by_path = {s["file_path"]: s["summary"] for s in summaries}
     for file in files:
-        file["summary"] = summaries[files.index(file)]["summary"]
+        file["summary"] = summary_by_path.get(file["src_path"], "")
 
     agentops.end_session(
         "Success", end_state_reason="Reorganized directory structure")
     return files
 
 
+async def stream_batch(path: str, session):
+    """
+    Yield /batch results as NDJSON lines.
+
+    Each summary is sent as soon as it lands. The placement proposals of
+    each shard are then sent in chunks as soon as that shard is planned.
+    When the tree was planned in several shards, a "folders" line follows
+    that maps proposed folders to the merged taxonomy, and clients rewrite
+    the dst_path folders they already received with it. A final "done"
+    line ends the stream. If planning fails part way, the files without a
+    proposal are placed by extension, as create_file_tree does; if
+    summarizing fails, an "error" line ends the stream instead.
+    """
+    end_state, reason = "Fail", "Streaming stopped early"
+    try:
+        summaries = []
+        try:
+            async for summary in iter_incremental_dir_summaries(path):
+                summaries.append(summary)
+                yield json.dumps({"type": "summary", **summary}) + "\n"
+        except Exception as e:
+            logging.error("Error summarizing %s: %s", path, e)
+            reason = f"Summarization failed: {e}"
+            yield json.dumps({"type": "error", "message": reason}) + "\n"
+            return
+
+        summary_by_path = {s["file_path"]: s["summary"] for s in summaries}
+        sent = set()
+        count = 0
+        updates = iter_file_tree(summaries, session)
+        while True:
+            try:
+                # Each shard is planned off the event loop
+                update = await asyncio.to_thread(next, updates, None)
+            except Exception as e:
+                logging.error("Error planning %s: %s", path, e)
+                remaining = [s for s in summaries if s["file_path"] not in sent]
+                update = {"type": "files", "files": _mock_file_tree(remaining)}
+                # Nothing more is planned after the fallback
+                updates = iter(())
+            if update is None:
+                break
+            if update["type"] == "folders":
+                yield json.dumps(update) + "\n"
+                continue
+            files = update["files"]
+            for start in range(0, len(files), BATCH_STREAM_CHUNK_SIZE):
+                chunk = files[start:start + BATCH_STREAM_CHUNK_SIZE]
+                for file in chunk:
+                    file["summary"] = summary_by_path.get(file["src_path"], "")
+                    sent.add(file["src_path"])
+                yield json.dumps({"type": "files", "files": chunk}) + "\n"
+            count += len(files)
+
+        yield json.dumps({"type": "done", "count": count}) + "\n"
+        end_state, reason = "Success", "Reorganized directory structure"
+    finally:
+        agentops.end_session(end_state, end_state_reason=reason)
+
+
 @app.post("/watch")
 async def watch(request: Request):
     path = request.path
@@ -126,54 +227,167 @@ async def watch(request: Request):
 
     observer = Observer()
     event_handler = Handler(path, create_watch_file_tree, response_queue)
-    await event_handler.set_summaries()
+    try:
+        await event_handler.set_summaries()
+    except Exception:
+        event_handler.stop()
+        raise
+    watch_handlers[path] = event_handler
     observer.schedule(event_handler, path, recursive=True)
     observer.start()
 
     # background_tasks.add_task(observer.start)
 
-    def stream():
-        while True:
-            response = response_queue.get()
-            yield json.dumps(response) + "\n"
-            # yield json.dumps({"status": "watching"}) + "\n"
-            # time.sleep(5)
+    async def stream():
+        try:
+            while True:
+                try:
+                    # The timeout frees the worker thread soon after the client goes away
+                    response = await asyncio.to_thread(response_queue.get, True, 1)
+                except queue.Empty:
+                    continue
+                yield json.dumps(response) + "\n"
+        finally:
+            # The client went away: stop watching and forget the handler. Nobody
+            # reads flushed results any more, and stopping joins the pipeline
+            # thread, so it runs off the event loop.
+            observer.stop()
+            await asyncio.to_thread(event_handler.stop, False)
+            if watch_handlers.get(path) is event_handler:
+                del watch_handlers[path]
+            await asyncio.to_thread(observer.join)
 
     return StreamingResponse(stream())
 
 
-@app.post("/commit")
-async def commit(request: CommitRequest):
-    print('*'*80)
-    print(request)
-    print(request.base_path)
-    print(request.src_path)
-    print(request.dst_path)
-    print('*'*80)
-
-    src = os.path.join(request.base_path, request.src_path)
-    dst = os.path.join(request.base_path, request.dst_path)
+@app.get("/watch/history")
+async def watch_history(path: str, cursor: int = 0, limit: Optional[int] = None):
+    """
+    Replay the move history of an active watch after a cursor.
 
-    if not os.path.exists(src):
+    **Responses**:
+    - 200: Returns the newest cursor and the events after `cursor`.
+    - 404: No watch is active for the path.
+    """
+    handler = watch_handlers.get(path)
+    if handler is None:
         raise HTTPException(
-            status_code=400, detail="Source path does not exist in filesystem"
-        )
+            status_code=404, detail="No active watch for this path")
+    return {
+        "cursor": handler.events.cursor,
+        "events": handler.events.since(cursor, limit),
+    }
 
-    # Ensure the destination directory exists
-    dst_directory = os.path.dirname(dst)
-    os.makedirs(dst_directory, exist_ok=True)
 
+def apply_moves(base_path: str, moves: List[Dict], rollback_on_error: bool = True) -> Dict:
+    """Plan and apply moves as one journaled transaction, raising HTTP errors"""
     try:
-        # If src is a file and dst is a directory, move the file into dst with the original filename.
-        if os.path.isfile(src) and os.path.isdir(dst):
-            shutil.move(src, os.path.join(dst, os.path.basename(src)))
-        else:
-            shutil.move(src, dst)
-    except Exception as e:
-        logging.error("Error occurred while moving resource: %s", e)
+        transaction = MoveTransaction.from_plan(base_path, moves)
+    except PlanError as e:
+        raise HTTPException(status_code=400, detail={"message": str(e), "problems": e.problems})
+    try:
+        result = transaction.apply(rollback_on_error=rollback_on_error)
+    except FileOperationError as e:
+        logging.error("Error occurred while moving resources: %s", e)
         raise HTTPException(
             status_code=500,
-            detail=f"An error occurred while moving the resource: {e}"
+            detail={"message": f"An error occurred while moving the resources: {e}",
+                    "rolled_back": rollback_on_error, "journal": transaction.journal_path}
         )
+    result["undo_run"] = get_undo_log().record_transaction(transaction, source="commit")
+    return result
+
+
+@app.post("/commit")
+async def commit(request: CommitRequest):
+    logging.debug("Commit %s -> %s in %s", request.src_path, request.dst_path, request.base_path)
+    # If src is a file and dst is a directory, the file is moved into dst with its original name
+    result = await asyncio.to_thread(
+        apply_moves, request.base_path,
+        [{"src_path": request.src_path, "dst_path": request.dst_path}],
+    )
+    return {"message": "Commit successful", "undo_run": result["undo_run"]}
+
+
+@app.post("/commit/bulk")
+async def commit_bulk(request: BulkCommitRequest):
+    """
+    Apply a whole /batch plan in one journaled transaction.
+
+    Moves are ordered so chains, swaps and cycles work, directories are
+    created once, and a failure rolls every applied move back unless
+    `rollback_on_error` is false.
+
+    **Responses**:
+    - 200: Returns the transaction id, counts and elapsed time.
+    - 400: The plan has problems (listed per move); nothing was moved.
+    - 500: A move failed.
+    """
+    if not os.path.isdir(request.base_path):
+        raise HTTPException(
+            status_code=400, detail="Base path does not exist in filesystem")
+    moves = [move.dict() for move in request.moves]
+    return await asyncio.to_thread(
+        apply_moves, request.base_path, moves, request.rollback_on_error)
 
-    return {"message": "Commit successful"}
+
+@app.get("/commit/pending")
+async def commit_pending():
+    """List the journals of transactions that were interrupted."""
+    return {"journals": await asyncio.to_thread(pending_journals)}
+
+
+@app.post("/commit/recover")
+async def commit_recover(request: RecoverRequest):
+    """
+    Roll interrupted transactions forward or back from their journals.
+
+    **Responses**:
+    - 200: Returns one result per recovered transaction.
+    - 400: Unknown direction.
+    """
+    if request.direction not in ("forward", "back"):
+        raise HTTPException(
+            status_code=400, detail="direction must be 'forward' or 'back'")
+    if request.journal:
+        # Only journals written by this server can be replayed
+        journals = [os.path.join(journal_dir(), os.path.basename(request.journal))]
+        if not os.path.exists(journals[0]):
+            raise HTTPException(status_code=404, detail="Journal not found")
+    else:
+        journals = await asyncio.to_thread(pending_journals)
+    results = []
+    for journal in journals:
+        results.append(await asyncio.to_thread(recover, journal, request.direction))
+    return {"results": results}
+
+
+@app.get("/undo/runs")
+async def undo_runs(limit: int = 50):
+    """List recent organization runs that can be rolled back, newest first."""
+    return {"runs": await asyncio.to_thread(get_undo_log().runs, limit)}
+
+
+@app.post("/undo/rollback")
+async def undo_rollback(request: RollbackRequest):
+    """
+    Move the files of an organization run back where they came from.
+
+    Files changed, replaced or removed since the run, or whose original
+    location is taken again, are reported as conflicts and left in place.
+
+    **Responses**:
+    - 200: Returns the number of files restored and the conflicts.
+    - 404: Unknown run.
+    - 409: The reversal could not be planned (problems listed per move).
+    - 500: A move failed; the files already moved back were returned.
+    """
+    try:
+        return await asyncio.to_thread(get_undo_log().rollback, request.run_id, request.dry_run)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Run not found")
+    except PlanError as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "problems": e.problems})
+    except FileOperationError as e:
+        logging.error("Error occurred while rolling back run %s: %s", request.run_id, e)
+        raise HTTPException(status_code=500, detail=f"An error occurred while rolling back: {e}")
@@ -8,7 +8,7 @@ from typing import Dict, List, Optional, Any
 from fastapi import APIRouter, HTTPException, Depends, Body
 
 # Import natural language organizer
-from natural_language_organizer import handle_natural_language_command
+from natural_language_organizer import handle_natural_language_command, handle_plan_execution
 
 # Create router for natural language organization endpoints
 natural_router = APIRouter()
@@ -16,7 +16,8 @@ natural_router = APIRouter()
 @natural_router.post("/organize")
 async def organize_with_natural_language(
     instruction: str = Body(..., embed=True),
-    path: Optional[str] = Body(None, embed=True)
+    path: Optional[str] = Body(None, embed=True),
+    dry_run: bool = Body(False, embed=True)
 ):
     """
     Organize files using a natural language instruction.
@@ -24,13 +25,40 @@ async def organize_with_natural_language(
     Parameters:
     - instruction: Natural language description of how to organize files
     - path: Optional base path to organize (defaults to safe path)
+    - dry_run: Only plan; the response includes the plan to preview and
+      pass to /organize/execute
     
     Returns:
     - Organization results including files moved and actions taken
+    - 400 if the planned moves are rejected
     """
     try:
-        result = await handle_natural_language_command(instruction, path)
+        result = await handle_natural_language_command(instruction, path, dry_run)
         return result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Plan rejected: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Organization failed: {str(e)}")
+
+@natural_router.post("/organize/execute")
+async def execute_organization_plan(plan: Dict[str, Any] = Body(..., embed=True)):
+    """
+    Execute a plan previewed with a dry run of /organize.
+    
+    Parameters:
+    - plan: The "plan" returned by the dry run
+    
+    Returns:
+    - Organization results; nothing is moved if the plan went out of date
+    - 400 if the plan leaves its base path or doesn't match what its rules
+      produce when planned again
+    """
+    if not isinstance(plan.get("actions"), list) or not isinstance(plan.get("rules"), list):
+        raise HTTPException(status_code=400, detail="Plan has no actions or rules")
+    try:
+        return await handle_plan_execution(plan)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Plan rejected: {e}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Organization failed: {str(e)}")
 
@@ -1,11 +1,19 @@
 import os
-import shutil
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 
+from src.crawler import crawl
+from src.undo_log import get_undo_log
+
 class FastSorter(FileSystemEventHandler):
     def __init__(self, target_directory):
         self.target_directory = target_directory
+        self.undo_run = None  # Undo log run, opened on the first move
+
+    def _undo_run(self):
+        if self.undo_run is None:
+            self.undo_run = get_undo_log().start_run("fast_sorter", self.target_directory, autoflush=True)
+        return self.undo_run
 
     def on_created(self, event):
         if "GitHub" in event.src_path:  # Check for GitHub paths
@@ -26,8 +34,8 @@ class FastSorter(FileSystemEventHandler):
             # Example: Move file to a specific directory based on its type
             file_extension = os.path.splitext(file_path)[1]
             destination_folder = os.path.join(self.target_directory, file_extension[1:])  # Remove the dot from extension
-            os.makedirs(destination_folder, exist_ok=True)  # Create the folder if it doesn't exist
-            shutil.move(file_path, os.path.join(destination_folder, os.path.basename(file_path)))  # Move the file
+            self._undo_run().makedirs(destination_folder)  # Create the folder if it doesn't exist
+            self._undo_run().move_file(file_path, os.path.join(destination_folder, os.path.basename(file_path)))  # Move the file
 
     def is_program_folder(self, file_path):
         # Logic to determine if the file is part of a program folder
@@ -39,8 +47,8 @@ class FastSorter(FileSystemEventHandler):
         # Logic to keep the entire program folder together
         program_folder = os.path.dirname(file_path)
         destination_folder = os.path.join(self.target_directory, "Programs")
-        os.makedirs(destination_folder, exist_ok=True)  # Create the folder if it doesn't exist
-        shutil.move(program_folder, os.path.join(destination_folder, os.path.basename(program_folder)))  # Move the entire folder
+        self._undo_run().makedirs(destination_folder)  # Create the folder if it doesn't exist
+        self._undo_run().move_file(program_folder, os.path.join(destination_folder, os.path.basename(program_folder)))  # Move the entire folder
 
 class DeepUnderstanding:
     def __init__(self, target_directory):
@@ -49,10 +57,8 @@ class DeepUnderstanding:
     def analyze_files(self):
         # Logic to analyze files for deeper understanding
         print("Analyzing files for deeper understanding...")
-        for root, _, files in os.walk(self.target_directory):  # Remove unused 'dirs'
-            for file in files:
-                file_path = os.path.join(root, file)
-                self.process_file(file_path)
+        for record in crawl(self.target_directory):
+            self.process_file(record.path)
 
     def process_file(self, file_path):
         # Implement logic to process and analyze the file
@@ -39,6 +39,78 @@ DEFAULT_CONFIG = {
             "*.tmp",  # Temporary files
         ],
         "depth": 1,  # Default depth for file watching
+        "debounce_seconds": 1.0,  # Quiet time before a burst of events is processed
+        "max_batch_wait_seconds": 10.0,  # Longest an event waits during a continuous burst
+        "event_history_size": 500,  # Move events kept in memory per watch
+        "event_history_max_age_seconds": 7 * 24 * 3600,
+        "event_history_spill": False,  # Append events dropped from memory to data/watch_events_*.jsonl
+        "prompt_examples": 20,  # Recent moves shown to the model as examples
+    },
+    "llm": {
+        "provider": "groq",  # "groq", "ollama" or "fake" (offline, for load testing)
+        "image_provider": "ollama",
+        "timeout_seconds": 60,  # Per call
+        "retry": {"max_attempts": 5, "base_delay_seconds": 1.0, "max_delay_seconds": 30.0},
+        "hedge_after_seconds": None,  # Send a duplicate request when one takes longer (None to disable)
+        "circuit_breaker": {"failure_threshold": 5, "reset_seconds": 30.0},
+        "fallback_provider": "ollama",  # Used while the primary provider's circuit is open
+        "providers": {
+            "groq": {"model": "llama-3.1-70b-versatile", "base_url": None},  # GROQ_BASE_URL if None
+            "ollama": {"model": "llama3.1", "image_model": "moondream"},
+            "fake": {"model": "fake", "latency_seconds": 0.05, "jitter_seconds": 0.02, "seed": 0},
+        },
+        "max_concurrency": 8,  # Summaries in flight at once
+        "batch": {
+            "enabled": True,  # Summarize small text files several per request
+            "small_file_tokens": 500,  # Larger documents are always sent alone
+            "max_tokens": 4000,  # Prompt budget per batch
+            "max_files": 20,
+        },
+        "tree_shard_tokens": 6000,  # Prompt budget per file tree planning request
+        "rate_limits": {
+            "groq": {"requests_per_minute": 30, "tokens_per_minute": 60000},
+            "ollama": {"requests_per_minute": None, "tokens_per_minute": None},
+        },
+    },
+    "crawler": {
+        "max_workers": 8,  # Threads listing directories concurrently
+    },
+    "move_engine": {
+        "max_workers": 4,  # Concurrent cross-device copies
+        "verify": True,  # Compare checksums before deleting a copied source
+        "chunk_mb": 8,
+        "bytes_per_second": None,  # Copy throughput cap (None for unlimited)
+        "work_hours": [9, 18],  # Local hours when work_hours_bytes_per_second applies
+        "work_hours_bytes_per_second": None,
+    },
+    "undo_log": {
+        "hash_bytes": 4096,  # Leading bytes hashed to recognise a moved file at rollback
+    },
+    "extraction": {
+        "max_tokens": 6144,  # Text read per file for its summary
+        "sampling": "head",  # "head" or "head_middle_tail" for long documents
+        "max_workers": None,  # Parsing processes (None for one per core)
+        "max_pending": 32,  # Files being parsed ahead of summarization
+    },
+    "images": {
+        "thumbnail_size": 512,  # Longest side of the picture sent to the vision model
+        "duplicate_distance": 6,  # Perceptual hash bits that may differ between near-duplicates
+        "duplicate_cache_size": 512,  # Recent image summaries kept for near-duplicate lookups
+    },
+    "fast_path": {
+        "enabled": True,  # Resolve archives, installers, media and code without the LLM
+        "min_confidence": 0.9,
+        "exif_photos": True,  # Camera photos are filed by EXIF date instead of a vision summary
+    },
+    "summary_cache": {
+        "enabled": True,
+        "max_size_mb": 256,  # Least recently used summaries are evicted past this size
+    },
+    "embedding_index": {
+        "enabled": True,
+        "dimensions": 1024,
+        "neighbours": 10,  # Organized files that vote on a placement
+        "min_confidence": 0.6,  # Below this the LLM is asked instead
     },
     "system": {
         "debug": False,
@@ -163,6 +235,10 @@ class Config:
         if os.environ.get("INCOGNITO_MODE"):
             self._config["system"]["incognito_mode"] = os.environ.get("INCOGNITO_MODE").lower() in ("true", "1", "yes")
             
+        # LLM provider ("fake" benchmarks /batch and /watch offline)
+        if os.environ.get("LLM_PROVIDER"):
+            self._config["llm"]["provider"] = os.environ.get("LLM_PROVIDER")
+            
         # Paths
         if os.environ.get("SAFE_PATH"):
             self._config["paths"]["safe_path"] = os.environ.get("SAFE_PATH")
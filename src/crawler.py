@@ -0,0 +1,132 @@
+"""
+Shared directory crawler
+
+Every directory scanner walks the tree through `crawl`, which lists
+directories with `os.scandir` on a thread pool and yields one compact
+`FileRecord` per file. Sizes, times and inodes come from the stat result
+cached on each `DirEntry` (free on Windows, one stat per file elsewhere),
+so callers don't need extra getsize/getmtime calls. A path policy is
+applied below the root while walking, so rejected directories are never
+listed. By default only `file_watching.ignore_patterns` (hidden and
+temporary files, tool directories) is applied; code that moves files
+passes `get_path_policy()` to also skip GitHub, unsafe and system folders.
+"""
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from src.config import config
+from src.error_handler import get_logger
+from src.path_policy import PathPolicy, get_ignore_policy
+
+logger = get_logger(__name__)
+
+
+class FileRecord(NamedTuple):
+    """One file found by the crawler"""
+    path: str
+    rel_path: str
+    name: str
+    ext: str  # Lowercase, with the dot
+    size: int
+    mtime: float
+    mtime_ns: int
+    inode: int
+
+
+def _slashed(path: str) -> str:
+    return path if os.sep == "/" else path.replace(os.sep, "/")
+
+
+def _scan_dir(path: str, prefix_length: int, policy: Optional[PathPolicy],
+              extensions: Optional[set]) -> Tuple[List[FileRecord], List[str]]:
+    """List one directory, returning its file records and subdirectories"""
+    records = []
+    subdirs = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    # Rules apply below the root, which the caller chose; the
+                    # directory being listed has already passed them. The
+                    # leading "/" lets globs like "*/venv/*" match at the top.
+                    rel_path = entry.path[prefix_length:]
+                    if entry.is_dir(follow_symlinks=False):
+                        if policy is None or policy.allows_child("/" + _slashed(rel_path), entry.name, is_dir=True):
+                            subdirs.append(entry.path)
+                        continue
+                    if not entry.is_file():
+                        continue
+                    ext = os.path.splitext(entry.name)[1].lower()
+                    if extensions is not None and ext not in extensions:
+                        continue
+                    if policy is not None and not policy.allows_child("/" + _slashed(rel_path), entry.name):
+                        continue
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                records.append(FileRecord(
+                    path=entry.path,
+                    rel_path=rel_path,
+                    name=entry.name,
+                    ext=ext,
+                    size=stat.st_size,
+                    mtime=stat.st_mtime,
+                    mtime_ns=stat.st_mtime_ns,
+                    inode=stat.st_ino,
+                ))
+    except OSError as e:
+        logger.debug(f"Could not list {path}: {e}")
+    return records, subdirs
+
+
+def crawl(root: str, recursive: bool = True, extensions: Optional[Iterable[str]] = None,
+          ignore_patterns: Optional[Iterable[str]] = None, max_workers: Optional[int] = None,
+          apply_ignore_rules: bool = True, policy: Optional[PathPolicy] = None) -> Iterator[FileRecord]:
+    """
+    Walk a directory tree and yield a record for every file
+
+    Directories are listed concurrently, so records arrive in no
+    particular order; sort them if order matters.
+
+    Args:
+        root: Directory to walk
+        recursive: Whether to descend into subdirectories
+        extensions: Optional file extensions to include (with the dot)
+        ignore_patterns: Glob patterns to skip (defaults to `file_watching.ignore_patterns`)
+        max_workers: Directory listing threads (defaults to `crawler.max_workers`)
+        apply_ignore_rules: Set to False to list every file, skipping the path policy
+        policy: Path policy to apply instead of the ignore patterns, e.g.
+            `get_path_policy()` for the folder safety rules
+
+    Yields:
+        FileRecord for each file
+    """
+    if not apply_ignore_rules:
+        policy = None
+    elif policy is None:
+        policy = PathPolicy(ignore_patterns=ignore_patterns, safety=False) if ignore_patterns is not None \
+            else get_ignore_policy()
+    extensions = {ext.lower() for ext in extensions} if extensions else None
+    # Entry paths are root joined with the relative path
+    prefix_length = len(os.path.join(root, ""))
+
+    if not recursive:
+        yield from _scan_dir(root, prefix_length, policy, extensions)[0]
+        return
+
+    max_workers = max_workers or config.get("crawler.max_workers", 8)
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="crawler")
+    pending = {executor.submit(_scan_dir, root, prefix_length, policy, extensions)}
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                records, subdirs = future.result()
+                for subdir in subdirs:
+                    pending.add(executor.submit(_scan_dir, subdir, prefix_length, policy, extensions))
+                yield from records
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
@@ -0,0 +1,243 @@
+"""
+Local embedding index over file summaries
+
+This module embeds file summaries with a hashing vectorizer (no model
+download, no network, microseconds per summary) and keeps them in a
+persistent in-memory matrix. A new file can then be placed by a
+nearest-neighbour vote among files that are already organized into
+folders; only low-confidence files need an LLM call. Each row keeps a
+checksum of the text it was embedded from, so `sync` only re-embeds
+summaries that changed since the index was saved.
+"""
+import os
+import re
+import threading
+import zlib
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.config import config
+from src.error_handler import get_logger
+
+logger = get_logger(__name__)
+
+TOKEN_RE = re.compile(r"[a-z0-9]{2,}")
+
+
+class HashingEmbedder:
+    """Stateless hashing vectorizer over word unigrams and bigrams"""
+
+    def __init__(self, dim: int = 1024):
+        """
+        Initialize the HashingEmbedder
+
+        Args:
+            dim: Number of dimensions of the embedding
+        """
+        self.dim = dim
+
+    def embed(self, text: str) -> np.ndarray:
+        """
+        Embed a text into a unit-length vector
+
+        Args:
+            text: Text to embed
+
+        Returns:
+            Float32 vector of length `dim`
+        """
+        vector = np.zeros(self.dim, dtype=np.float32)
+        tokens = TOKEN_RE.findall(text.lower())
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        for feature in features:
+            # crc32 is stable across processes, unlike hash()
+            h = zlib.crc32(feature.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+
+class EmbeddingIndex:
+    """Persistent nearest-neighbour index of summary embeddings keyed by file path"""
+
+    def __init__(self, index_path: Optional[str] = None, dim: int = 1024):
+        """
+        Initialize the EmbeddingIndex
+
+        Args:
+            index_path: Optional .npz file the index is loaded from and saved to
+            dim: Embedding dimensions (ignored if an existing index is loaded)
+        """
+        self.index_path = index_path
+        self.embedder = HashingEmbedder(dim)
+        self._paths: List[str] = []
+        self._digests: List[int] = []  # crc32 of the embedded text, -1 if unknown
+        self._rows: Dict[str, int] = {}
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._size = 0
+        self._lock = threading.RLock()
+        if index_path and os.path.exists(index_path):
+            self.load()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, file_path: str) -> bool:
+        return file_path in self._rows
+
+    @staticmethod
+    def _digest(text: str) -> int:
+        return zlib.crc32(text.encode("utf-8"))
+
+    def add(self, file_path: str, text: str) -> None:
+        """Add or replace the embedding of one file"""
+        vector = self.embedder.embed(text)
+        digest = self._digest(text)
+        with self._lock:
+            row = self._rows.get(file_path)
+            if row is None:
+                if self._size == len(self._vectors):
+                    grown = np.zeros((max(64, self._size * 2), self.embedder.dim), dtype=np.float32)
+                    grown[:self._size] = self._vectors[:self._size]
+                    self._vectors = grown
+                row = self._size
+                self._size += 1
+                self._paths.append(file_path)
+                self._digests.append(digest)
+                self._rows[file_path] = row
+            self._vectors[row] = vector
+            self._digests[row] = digest
+
+    def remove(self, file_path: str) -> None:
+        """Remove a file from the index by moving the last row into its place"""
+        with self._lock:
+            row = self._rows.pop(file_path, None)
+            if row is None:
+                return
+            last = self._size - 1
+            if row != last:
+                moved = self._paths[last]
+                self._vectors[row] = self._vectors[last]
+                self._paths[row] = moved
+                self._digests[row] = self._digests[last]
+                self._rows[moved] = row
+            self._paths.pop()
+            self._digests.pop()
+            self._size -= 1
+
+    def sync(self, summaries: Iterable[Dict]) -> Tuple[int, int]:
+        """
+        Make the index hold exactly the given summaries
+
+        Only files that are new or whose summary changed are embedded;
+        files that are not in `summaries` are removed.
+
+        Returns:
+            (files embedded, files removed)
+        """
+        with self._lock:
+            wanted = {summary["file_path"]: summary.get("summary", "") for summary in summaries}
+            removed = [path for path in self._paths if path not in wanted]
+            for path in removed:
+                self.remove(path)
+            embedded = 0
+            for path, text in wanted.items():
+                row = self._rows.get(path)
+                if row is None or self._digests[row] != self._digest(text):
+                    self.add(path, text)
+                    embedded += 1
+        return embedded, len(removed)
+
+    def query(self, text: str, k: int = 10, exclude: Iterable[str] = ()) -> List[Tuple[str, float]]:
+        """
+        Find the files whose summaries are most similar to a text
+
+        Args:
+            text: Text to search for
+            k: Number of neighbours
+            exclude: Paths to leave out of the results
+
+        Returns:
+            List of (path, cosine similarity), most similar first
+        """
+        vector = self.embedder.embed(text)
+        excluded = set(exclude)
+        with self._lock:
+            if self._size == 0:
+                return []
+            scores = self._vectors[:self._size] @ vector
+            count = min(self._size, k + len(excluded))
+            top = np.argpartition(-scores, count - 1)[:count]
+            ranked = sorted(top, key=lambda i: -scores[i])
+            results = [(self._paths[i], float(scores[i])) for i in ranked]
+        return [(path, score) for path, score in results if path not in excluded][:k]
+
+    def suggest_folder(self, file_path: str, text: str, k: int = 10) -> Tuple[Optional[str], float]:
+        """
+        Vote on a folder for a file using its nearest organized neighbours
+
+        Neighbours in the root of the watched directory are not organized
+        yet and do not vote.
+
+        Args:
+            file_path: Path of the file being placed (excluded from its own neighbours)
+            text: Summary of the file
+            k: Number of neighbours that vote
+
+        Returns:
+            (folder, confidence) where confidence is in [0, 1], or (None, 0.0)
+        """
+        votes = defaultdict(float)
+        best = defaultdict(float)
+        for path, score in self.query(text, k=k, exclude=[file_path]):
+            folder = os.path.dirname(path)
+            if score <= 0 or not folder:
+                continue
+            votes[folder] += score
+            best[folder] = max(best[folder], score)
+        if not votes:
+            return None, 0.0
+        folder = max(votes, key=votes.get)
+        confidence = votes[folder] / sum(votes.values()) * best[folder]
+        return folder, confidence
+
+    def save(self) -> None:
+        """Write the index to `index_path`"""
+        if not self.index_path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+        with self._lock:
+            tmp_path = self.index_path + ".tmp.npz"
+            np.savez(tmp_path, vectors=self._vectors[:self._size],
+                     paths=np.array(self._paths, dtype=str),
+                     digests=np.array(self._digests, dtype=np.int64))
+            os.replace(tmp_path, self.index_path)
+
+    def load(self) -> None:
+        """Read the index from `index_path`"""
+        try:
+            data = np.load(self.index_path, allow_pickle=False)
+            vectors = data["vectors"].astype(np.float32)
+            paths = [str(p) for p in data["paths"]]
+            # Indexes saved without checksums are re-embedded on the next sync
+            digests = [int(d) for d in data["digests"]] if "digests" in data.files else [-1] * len(paths)
+        except Exception as e:
+            logger.error(f"Could not load embedding index {self.index_path}: {e}")
+            return
+        with self._lock:
+            self.embedder = HashingEmbedder(vectors.shape[1] if vectors.ndim == 2 else self.embedder.dim)
+            self._vectors = vectors
+            self._paths = paths
+            self._digests = digests
+            self._rows = {path: i for i, path in enumerate(paths)}
+            self._size = len(paths)
+
+
+def index_path_for(base_path: str) -> str:
+    """Return where the embedding index of a watched directory is stored"""
+    digest = zlib.crc32(os.path.abspath(base_path).encode("utf-8"))
+    return os.path.join(config.get("paths.cache_dir"), f"embeddings_{digest:08x}.npz")
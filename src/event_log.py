@@ -0,0 +1,135 @@
+"""
+Bounded filesystem event history for watch mode
+
+The watch handler remembers recent moves so they can be shown to the
+model as examples and replayed to clients. This module keeps that history
+in a fixed-size ring buffer with an optional age limit; events that fall
+out of the buffer can be spilled to a JSON Lines file so clients can
+still replay them from a cursor.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from src.config import config
+from src.error_handler import get_logger
+
+logger = get_logger(__name__)
+
+
+class EventLog:
+    """Ring buffer of watch events with sequence-number cursors"""
+
+    def __init__(self, max_events: Optional[int] = None,
+                 max_age_seconds: Optional[float] = None,
+                 spill_path: Optional[str] = None):
+        """
+        Initialize the EventLog
+
+        Args:
+            max_events: Number of events kept in memory
+            max_age_seconds: Events older than this are dropped from memory (None to keep)
+            spill_path: Optional JSON Lines file that receives events dropped from memory
+        """
+        self.max_events = max_events or config.get("file_watching.event_history_size", 500)
+        self.max_age_seconds = max_age_seconds if max_age_seconds is not None else \
+            config.get("file_watching.event_history_max_age_seconds")
+        self.spill_path = spill_path
+        self._events = deque()
+        self._next_seq = 1
+        self._lock = threading.Lock()
+        if spill_path:
+            # Sequence numbers restart with every log, so start a fresh spill file
+            os.makedirs(os.path.dirname(os.path.abspath(spill_path)), exist_ok=True)
+            open(spill_path, "w").close()
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    @property
+    def cursor(self) -> int:
+        """Sequence number of the newest event (0 if none)"""
+        return self._next_seq - 1
+
+    def append(self, event: Dict) -> int:
+        """
+        Record an event
+
+        Args:
+            event: Event dictionary (e.g. src_path and dst_path)
+
+        Returns:
+            The sequence number assigned to the event
+        """
+        with self._lock:
+            entry = {"seq": self._next_seq, "timestamp": time.time(), **event}
+            self._next_seq += 1
+            self._events.append(entry)
+            self._trim(entry["timestamp"])
+            return entry["seq"]
+
+    def _trim(self, now: float) -> None:
+        """Drop events beyond the size or age limit (caller holds the lock)"""
+        dropped = []
+        while len(self._events) > self.max_events:
+            dropped.append(self._events.popleft())
+        if self.max_age_seconds:
+            while self._events and now - self._events[0]["timestamp"] > self.max_age_seconds:
+                dropped.append(self._events.popleft())
+        if dropped and self.spill_path:
+            try:
+                with open(self.spill_path, "a", encoding="utf-8") as f:
+                    for entry in dropped:
+                        f.write(json.dumps(entry) + "\n")
+            except OSError as e:
+                logger.error(f"Failed to spill {len(dropped)} watch events: {e}")
+
+    def recent(self, limit: int = 20) -> List[Dict]:
+        """
+        Get the most recent events, without bookkeeping fields
+
+        Args:
+            limit: Maximum number of events
+
+        Returns:
+            Up to `limit` events, oldest first
+        """
+        with self._lock:
+            entries = list(self._events)[-limit:] if limit > 0 else []
+        return [
+            {k: v for k, v in entry.items() if k not in ("seq", "timestamp")}
+            for entry in entries
+        ]
+
+    def since(self, cursor: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Get every event after a cursor, reading spilled events from disk if needed
+
+        Args:
+            cursor: Sequence number of the last event the caller has seen
+            limit: Optional maximum number of events
+
+        Returns:
+            Events with a sequence number greater than `cursor`, oldest first
+        """
+        with self._lock:
+            in_memory = [entry for entry in self._events if entry["seq"] > cursor]
+            oldest = self._events[0]["seq"] if self._events else self._next_seq
+
+        events = []
+        if cursor + 1 < oldest and self.spill_path and os.path.exists(self.spill_path):
+            with open(self.spill_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if cursor < entry.get("seq", 0) < oldest:
+                        events.append(entry)
+                        if limit and len(events) >= limit:
+                            return events
+        events.extend(in_memory)
+        return events[:limit] if limit else events
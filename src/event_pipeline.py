@@ -0,0 +1,182 @@
+"""
+Debounced filesystem event pipeline for watch mode
+
+Watchdog delivers events on its observer thread, often in bursts (an
+editor save, an unzip). This module queues them in O(1), merges events
+for the same path (create+modify, move chains, create+delete) and hands
+the coalesced batch to a worker thread once the directory has been quiet
+for a short window, so one burst produces one recommendation request.
+"""
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from src.config import config
+from src.error_handler import get_logger
+
+logger = get_logger(__name__)
+
+
+class PendingEvent:
+    """A coalesced event waiting to be processed"""
+
+    def __init__(self, event_type: str, src_path: str, dst_path: Optional[str] = None):
+        self.event_type = event_type
+        self.src_path = src_path
+        self.dst_path = dst_path
+
+    @property
+    def path(self) -> str:
+        """Current location of the file the event is about"""
+        return self.dst_path or self.src_path
+
+    def to_dict(self) -> Dict:
+        """Convert the event to a dictionary"""
+        return {"event_type": self.event_type, "src_path": self.src_path, "dst_path": self.dst_path}
+
+
+class EventPipeline:
+    """Coalesces watch events and processes them in batches off the observer thread"""
+
+    def __init__(self, process_batch: Callable[[List[PendingEvent]], None],
+                 quiet_seconds: Optional[float] = None,
+                 max_wait_seconds: Optional[float] = None):
+        """
+        Initialize the EventPipeline
+
+        Args:
+            process_batch: Called on the worker thread with each batch of coalesced events
+            quiet_seconds: How long no new event must arrive before a batch is flushed
+            max_wait_seconds: Flush anyway once the oldest pending event is this old
+        """
+        self.process_batch = process_batch
+        self.quiet_seconds = quiet_seconds if quiet_seconds is not None else \
+            config.get("file_watching.debounce_seconds", 1.0)
+        self.max_wait_seconds = max_wait_seconds if max_wait_seconds is not None else \
+            config.get("file_watching.max_batch_wait_seconds", 10.0)
+
+        # Keyed by the current path of the file, in arrival order
+        self._pending: Dict[str, PendingEvent] = {}
+        self._first_event_at = None
+        self._last_event_at = None
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def start(self) -> None:
+        """Start the worker thread"""
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="watch-event-pipeline", daemon=True)
+        self._thread.start()
+
+    def stop(self, flush: bool = True) -> None:
+        """
+        Stop the worker thread
+
+        Args:
+            flush: Whether to process events that are still pending
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread:
+            self._thread.join()
+        if flush:
+            batch = self._drain()
+            if batch:
+                self.process_batch(batch)
+
+    def submit(self, event_type: str, src_path: str, dst_path: Optional[str] = None) -> None:
+        """
+        Queue an event, merging it with any pending event for the same file
+
+        Args:
+            event_type: "created", "modified", "deleted" or "moved"
+            src_path: Path the event refers to
+            dst_path: Destination path for move events
+        """
+        with self._condition:
+            self._coalesce(event_type, src_path, dst_path)
+            now = time.monotonic()
+            if self._first_event_at is None:
+                self._first_event_at = now
+            self._last_event_at = now
+            self._condition.notify()
+
+    def _coalesce(self, event_type: str, src_path: str, dst_path: Optional[str]) -> None:
+        """Merge a new event into the pending set (caller holds the lock)"""
+        pending = self._pending
+
+        if event_type == "moved":
+            previous = pending.pop(src_path, None)
+            if previous is None:
+                pending[dst_path] = PendingEvent("moved", src_path, dst_path)
+            elif previous.event_type == "created":
+                # Created then moved: it is simply a new file at the destination
+                pending[dst_path] = PendingEvent("created", dst_path)
+            else:
+                # Follow the chain back to where the file was before this batch
+                origin = previous.src_path if previous.event_type == "moved" else src_path
+                if origin == dst_path:
+                    pending[dst_path] = PendingEvent("modified", dst_path)
+                else:
+                    pending[dst_path] = PendingEvent("moved", origin, dst_path)
+            return
+
+        previous = pending.get(src_path)
+        if previous is None:
+            pending[src_path] = PendingEvent(event_type, src_path)
+        elif event_type == "deleted":
+            if previous.event_type == "created":
+                # Created and deleted within one window: nothing happened
+                del pending[src_path]
+            elif previous.event_type == "moved":
+                # The moved file is gone; report the original path as deleted
+                del pending[src_path]
+                pending[previous.src_path] = PendingEvent("deleted", previous.src_path)
+            else:
+                pending[src_path] = PendingEvent("deleted", src_path)
+        elif event_type == "created" and previous.event_type == "deleted":
+            pending[src_path] = PendingEvent("modified", src_path)
+        elif event_type == "modified":
+            # created/moved/modified absorb later modifications
+            pass
+        else:
+            pending[src_path] = PendingEvent(event_type, src_path)
+
+    def _drain(self) -> List[PendingEvent]:
+        """Take every pending event"""
+        with self._condition:
+            batch = list(self._pending.values())
+            self._pending.clear()
+            self._first_event_at = None
+            self._last_event_at = None
+        return batch
+
+    def _run(self) -> None:
+        """Worker loop: wait for a quiet window, then process the batch"""
+        while True:
+            with self._condition:
+                while self._running and not self._pending:
+                    self._condition.wait()
+                if not self._running:
+                    return
+
+                now = time.monotonic()
+                quiet_at = self._last_event_at + self.quiet_seconds
+                deadline = self._first_event_at + self.max_wait_seconds
+                flush_at = min(quiet_at, deadline)
+                if now < flush_at:
+                    self._condition.wait(flush_at - now)
+                    continue
+
+            batch = self._drain()
+            if not batch:
+                continue
+            try:
+                self.process_batch(batch)
+            except Exception as e:
+                logger.error(f"Error processing batch of {len(batch)} watch events: {e}")
@@ -0,0 +1,155 @@
+"""
+Fake OpenAI-compatible chat server for failure-injection testing
+
+Serves POST /openai/v1/chat/completions in the format the Groq client
+expects, with replies built by the offline fake provider. A share of
+requests can be answered with 429 (with Retry-After), 500 or 503, or
+delayed, to exercise retries, hedging, the circuit breaker and failover
+end to end. Point the Groq provider at it with
+
+    python -m src.fake_llm_server --port 8808 --error-rate 0.2 --slow-rate 0.1
+    GROQ_API_KEY=test GROQ_BASE_URL=http://127.0.0.1:8808 python main.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.llm_provider import FakeProvider
+
+CHAT_PATH = "/openai/v1/chat/completions"
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    """Answers chat completion requests, injecting failures and delays"""
+
+    server_version = "FakeLLM/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, status: int, message: str, headers=None):
+        self._send_json(status, {"error": {"message": message, "type": "fake_error"}}, headers)
+
+    def do_POST(self):
+        if self.path.rstrip("/") != CHAT_PATH:
+            self._error(404, f"Unknown path {self.path}")
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._error(400, "Request body is not JSON")
+            return
+
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            fail = server.requests <= server.fail_first or server.random.random() < server.error_rate
+            slow = server.random.random() < server.slow_rate
+            status = server.random.choice(server.statuses)
+
+        if fail:
+            headers = {"Retry-After": str(server.retry_after)} if status in (429, 503) else None
+            self._error(status, "Injected failure", headers)
+            return
+        if slow:
+            time.sleep(server.slow_seconds)
+
+        json_mode = (request.get("response_format") or {}).get("type") == "json_object"
+        content = server.provider.reply(request.get("messages", []), json_mode)
+        self._send_json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        })
+
+
+def create_server(host: str = "127.0.0.1", port: int = 8808, error_rate: float = 0.0,
+                  slow_rate: float = 0.0, slow_seconds: float = 5.0, retry_after: float = 1.0,
+                  seed: int = 0, verbose: bool = False, statuses=(429, 500, 503),
+                  fail_first: int = 0) -> ThreadingHTTPServer:
+    """
+    Create the fake server (call `serve_forever` to run it)
+
+    Args:
+        host: Interface to bind
+        port: Port to bind (0 for any free port)
+        error_rate: Share of requests answered with one of `statuses`
+        slow_rate: Share of requests delayed by `slow_seconds`
+        slow_seconds: Delay of slow requests
+        retry_after: Retry-After seconds sent with 429 and 503 responses
+        seed: Seed of the failure injection
+        verbose: Whether to log every request
+        statuses: Error statuses to choose from
+        fail_first: Number of requests that fail before `error_rate` applies
+
+    Returns:
+        The server
+    """
+    server = ThreadingHTTPServer((host, port), FakeLLMHandler)
+    server.daemon_threads = True
+    server.provider = FakeProvider(latency=0, jitter=0)
+    server.error_rate = error_rate
+    server.slow_rate = slow_rate
+    server.slow_seconds = slow_seconds
+    server.retry_after = retry_after
+    server.statuses = tuple(statuses)
+    server.fail_first = fail_first
+    server.random = random.Random(seed)
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.verbose = verbose
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible chat server with failure injection")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8808)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests that fail with 429/500/503")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="share of requests delayed by --slow-seconds")
+    parser.add_argument("--slow-seconds", type=float, default=5.0)
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds on 429/503")
+    parser.add_argument("--statuses", type=int, nargs="+", default=[429, 500, 503],
+                        help="error statuses to inject")
+    parser.add_argument("--fail-first", type=int, default=0, help="number of requests that fail up front")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    server = create_server(args.host, args.port, args.error_rate, args.slow_rate, args.slow_seconds,
+                           args.retry_after, args.seed, args.verbose, args.statuses, args.fail_first)
+    print(f"Fake LLM server listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Served {server.requests} requests")
+
+
+if __name__ == "__main__":
+    main()
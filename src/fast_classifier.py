@@ -0,0 +1,258 @@
+"""
+Metadata-only fast path in front of the summarizer
+
+Archives, installers, media and source files are organized by what they
+are, not by what they say, so summarizing them with a model is wasted
+time. This classifier tries cheap tiers in order (filename conventions,
+learned extension patterns, the extension map, EXIF, MIME sniffing of
+the first bytes) and resolves files it is confident about locally;
+everything else is left for the LLM. Each run counts how many files
+every tier resolved.
+"""
+import mimetypes
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from src.config import config
+from src.error_handler import get_logger
+from src.tree_generator import EXTENSION_FOLDERS
+
+logger = get_logger(__name__)
+
+# Top-level folders whose files don't need a content summary
+CONTENT_FREE_FOLDERS = {"Archives", "Installers", "Audio", "Video", "Code"}
+
+FAST_PATH_EXTENSIONS = sorted(
+    ext for ext, folder in EXTENSION_FOLDERS.items()
+    if folder.split("/")[0] in CONTENT_FREE_FOLDERS
+)
+
+# (pattern on the file name, folder, confidence)
+NAME_CONVENTIONS = [
+    (re.compile(r"^(screen ?shot|screenshot|screen recording)[ _-]", re.IGNORECASE), "Images/Screenshots", 0.95),
+    (re.compile(r"^(IMG|DSC|DSCN|DSCF|PXL|GOPR)[_-]?\d{3,}", re.IGNORECASE), "Images/Photos", 0.9),
+    (re.compile(r"^(README|LICENSE|LICENCE|CHANGELOG|CONTRIBUTING|CODE_OF_CONDUCT)(\.\w+)?$", re.IGNORECASE), "Code/Project", 0.95),
+    (re.compile(r"^(package(-lock)?\.json|requirements[\w.-]*\.txt|pyproject\.toml|setup\.(py|cfg)|"
+                r"Dockerfile|Makefile|\.gitignore|tsconfig\.json)$", re.IGNORECASE), "Code/Project", 0.95),
+]
+
+# (magic bytes, offset, folder, MIME type, extensions the signature agrees with)
+MAGIC_NUMBERS = [
+    (b"PK\x03\x04", 0, "Archives", "application/zip", {".zip"}),
+    (b"Rar!\x1a\x07", 0, "Archives", "application/vnd.rar", {".rar"}),
+    (b"7z\xbc\xaf\x27\x1c", 0, "Archives", "application/x-7z-compressed", {".7z"}),
+    (b"\x1f\x8b", 0, "Archives", "application/gzip", {".gz", ".tgz"}),
+    (b"ustar", 257, "Archives", "application/x-tar", {".tar"}),
+    (b"MZ", 0, "Installers", "application/x-msdownload", {".exe", ".dll"}),
+    (b"\x7fELF", 0, "Installers", "application/x-executable", {".bin", ".run", ".appimage"}),
+    (b"ID3", 0, "Audio", "audio/mpeg", {".mp3"}),
+    (b"fLaC", 0, "Audio", "audio/flac", {".flac"}),
+    (b"OggS", 0, "Audio", "audio/ogg", {".ogg", ".oga", ".opus"}),
+    (b"\x1aE\xdf\xa3", 0, "Video", "video/x-matroska", {".mkv", ".webm"}),
+]
+
+# ISO base media files ("ftyp" at offset 4) are told apart by the major
+# brand that follows: (brand, folder, MIME type, extensions)
+FTYP_BRANDS = [
+    ({b"heic", b"heix", b"hevc", b"hevx", b"heim", b"heis", b"mif1", b"msf1"}, "Images", "image/heic",
+     {".heic", ".heif"}),
+    ({b"avif", b"avis"}, "Images", "image/avif", {".avif"}),
+    ({b"M4A ", b"M4B "}, "Audio", "audio/mp4", {".m4a", ".m4b"}),
+    ({b"qt  "}, "Video", "video/quicktime", {".mov"}),
+    ({b"isom", b"iso2", b"iso4", b"iso5", b"iso6", b"mp41", b"mp42", b"avc1", b"dash", b"M4V ",
+      b"3gp4", b"3gp5", b"3g2a"}, "Video", "video/mp4", {".mp4", ".m4v", ".3gp", ".3g2"}),
+]
+
+# Office documents are zip files too and need their contents summarized
+ZIP_DOCUMENT_EXTENSIONS = {".docx", ".xlsx", ".pptx", ".odt", ".ods", ".odp", ".epub", ".jar"}
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".heic", ".heif", ".avif", ".tif", ".tiff"}
+
+
+def sniff_mime(path: str) -> Tuple[Optional[str], Optional[str], Set[str]]:
+    """
+    Identify a file from its first bytes
+
+    Returns:
+        (folder, MIME type, extensions that agree with the signature), or
+        (None, None, empty set) if the signature is unknown
+    """
+    try:
+        with open(path, "rb") as f:
+            head = f.read(512)
+    except OSError:
+        return None, None, set()
+    if head[4:8] == b"ftyp":
+        brand = head[8:12]
+        for brands, folder, mime, extensions in FTYP_BRANDS:
+            if brand in brands:
+                return folder, mime, extensions
+        return None, None, set()
+    for magic, offset, folder, mime, extensions in MAGIC_NUMBERS:
+        if head[offset:offset + len(magic)] == magic:
+            return folder, mime, extensions
+    return None, None, set()
+
+
+def _learned_patterns(min_confidence: float) -> Dict[str, Tuple[str, float]]:
+    """Load extension -> (directory, confidence) patterns learned by the EvolutionTracker"""
+    try:
+        from evolution_tracker import EvolutionTracker
+    except ImportError:
+        return {}
+    try:
+        patterns = EvolutionTracker().get_active_patterns(min_confidence)
+    except Exception as e:
+        logger.warning(f"Could not load learned patterns: {e}")
+        return {}
+    return {
+        p["data"]["extension"]: (p["data"]["directory"], p["confidence"])
+        for p in patterns
+        if p["type"] == "extension" and p["data"].get("extension")
+    }
+
+
+class FastPathClassifier:
+    """Resolves files from their name, type and metadata without calling the LLM"""
+
+    def __init__(self, min_confidence: Optional[float] = None, use_learned_patterns: bool = True):
+        """
+        Initialize the FastPathClassifier
+
+        Args:
+            min_confidence: Confidence a tier needs for a file to skip the LLM
+            use_learned_patterns: Whether to consult the EvolutionTracker patterns
+        """
+        self.min_confidence = min_confidence if min_confidence is not None else \
+            config.get("fast_path.min_confidence", 0.9)
+        self.exif_photos = config.get("fast_path.exif_photos", True)
+        self.learned = _learned_patterns(self.min_confidence) if use_learned_patterns else {}
+        self.stats = Counter()
+
+    def _by_name(self, path, name, ext):
+        for pattern, folder, confidence in NAME_CONVENTIONS:
+            if pattern.search(name):
+                return folder, confidence, mimetypes.guess_type(name)[0]
+        return None
+
+    def _by_learned_pattern(self, path, name, ext):
+        if ext in self.learned:
+            folder, confidence = self.learned[ext]
+            return folder, confidence, mimetypes.guess_type(name)[0]
+        return None
+
+    def _by_extension(self, path, name, ext):
+        folder = EXTENSION_FOLDERS.get(ext)
+        if folder and folder.split("/")[0] in CONTENT_FREE_FOLDERS:
+            return folder, 0.95, mimetypes.guess_type(name)[0]
+        return None
+
+    def _by_mime(self, path, name, ext):
+        if ext in ZIP_DOCUMENT_EXTENSIONS:
+            return None
+        folder, mime, extensions = sniff_mime(path)
+        # A short signature can occur by chance, so it only settles files
+        # without an extension or whose extension it agrees with
+        if folder not in CONTENT_FREE_FOLDERS or (ext and ext not in extensions):
+            return None
+        return folder, 0.95, mime
+
+    def _by_exif(self, path, name, ext):
+        if not self.exif_photos or ext not in IMAGE_EXTENSIONS:
+            return None
+        from src.image_stage import PIL_AVAILABLE, read_exif
+        if not PIL_AVAILABLE:
+            return None
+        from PIL import Image
+        try:
+            with Image.open(path) as image:
+                exif = read_exif(image)
+        except Exception:
+            return None
+        # A camera make and capture date mean a photo, organized by when it was taken
+        if exif.get("camera") and exif.get("date"):
+            return f"Images/Photos/{exif['date'][:4]}", 0.9, mimetypes.guess_type(name)[0]
+        return None
+
+    def classify(self, path: str) -> Optional[Dict]:
+        """
+        Try to resolve one file locally
+
+        Args:
+            path: Path of the file
+
+        Returns:
+            A summary dictionary ("file_path", "summary", "category", "tier",
+            "confidence") if some tier is confident enough, otherwise None
+        """
+        name = os.path.basename(path)
+        ext = os.path.splitext(name)[1].lower()
+        tiers = (
+            ("name", self._by_name),
+            ("learned", self._by_learned_pattern),
+            ("extension", self._by_extension),
+            ("exif", self._by_exif),
+            ("mime", self._by_mime),
+        )
+        for tier, classify in tiers:
+            result = classify(path, name, ext)
+            if result is None:
+                continue
+            folder, confidence, mime = result
+            if confidence < self.min_confidence:
+                continue
+            self.stats[tier] += 1
+            return {
+                "file_path": path,
+                "summary": f"{name}: {mime or ext or 'unknown type'} file that belongs in {folder} "
+                           f"(classified from its {tier}).",
+                "category": folder,
+                "tier": tier,
+                "confidence": confidence,
+            }
+        self.stats["llm"] += 1
+        return None
+
+    def partition(self, paths: Iterable[str]) -> Tuple[List[Dict], List[str]]:
+        """
+        Split files into those resolved locally and those that need the LLM
+
+        Returns:
+            (summaries of resolved files, paths left for the LLM)
+        """
+        resolved = []
+        remaining = []
+        for path in paths:
+            summary = self.classify(path)
+            if summary is None:
+                remaining.append(path)
+            else:
+                resolved.append(summary)
+        return resolved, remaining
+
+    def report(self) -> Dict[str, int]:
+        """Return how many files each tier resolved (and how many went to the LLM)"""
+        return dict(self.stats)
+
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+
+def get_fast_path() -> Optional[FastPathClassifier]:
+    """
+    Get the shared classifier, or None if the fast path is disabled
+
+    The learned patterns are loaded from the EvolutionTracker once, when
+    the classifier is first needed, not on every file.
+    """
+    global _classifier
+    if not config.get("fast_path.enabled", True):
+        return None
+    with _classifier_lock:
+        if _classifier is None:
+            _classifier = FastPathClassifier()
+        return _classifier
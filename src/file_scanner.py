@@ -6,8 +6,12 @@ import time
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 
-from .path_utils import is_safe_path, sanitize_path
-from .error_handler import logger
+from .crawler import FileRecord, crawl
+from .path_policy import get_path_policy
+from .path_utils import SafePath
+from .error_handler import get_logger
+
+logger = get_logger(__name__)
 
 class FileScanResult:
     """Container for file scan results"""
@@ -47,9 +51,9 @@ class FileScanner:
     def __init__(self, base_path: str):
         self.base_path = base_path
         
-    def scan_file(self, file_path: str) -> FileScanResult:
-        """Scan a single file for issues"""
-        if not is_safe_path(file_path) or not sanitize_path(file_path):
+    def scan_file(self, file_path: str, record: Optional[FileRecord] = None) -> FileScanResult:
+        """Scan a single file for issues (a crawler record saves stat calls)"""
+        if not SafePath.is_safe_path(file_path):
             raise ValueError(f"Path validation failed for {file_path}")
         
         result = FileScanResult(file_path)
@@ -59,20 +63,21 @@ class FileScanner:
             path_obj = Path(file_path)
             
             # Check if file exists
-            if not path_obj.exists():
+            if record is None and not path_obj.exists():
                 result.add_issue("File does not exist")
                 return result
+            is_file = record is not None or path_obj.is_file()
                 
             # Check if file is readable
             if not os.access(file_path, os.R_OK):
                 result.add_issue("File is not readable")
             
             # Check for zero-byte files
-            if path_obj.is_file() and path_obj.stat().st_size == 0:
+            if is_file and (record.size if record is not None else path_obj.stat().st_size) == 0:
                 result.add_issue("File is empty (zero bytes)")
             
             # Check file extension matches content type
-            if path_obj.is_file() and path_obj.suffix:
+            if is_file and path_obj.suffix:
                 mime_type, encoding = mimetypes.guess_type(file_path)
                 if mime_type:
                     guessed_ext = mimetypes.guess_extension(mime_type)
@@ -81,7 +86,7 @@ class FileScanner:
             
             # Check for permissions issues
             try:
-                if path_obj.is_file():
+                if is_file:
                     with open(file_path, 'rb') as f:
                         # Just read a small chunk to verify readability
                         f.read(1024)
@@ -147,7 +152,7 @@ class FileScanner:
         
     def scan_directory(self, directory_path: str, recursive: bool = True) -> List[FileScanResult]:
         """Scan all files in a directory"""
-        if not is_safe_path(directory_path) or not sanitize_path(directory_path):
+        if not SafePath.is_safe_path(directory_path):
             raise ValueError(f"Path validation failed for {directory_path}")
             
         results = []
@@ -157,15 +162,9 @@ class FileScanner:
             if not path_obj.is_dir():
                 raise ValueError(f"{directory_path} is not a directory")
                 
-            if recursive:
-                for root, dirs, files in os.walk(directory_path):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        results.append(self.scan_file(file_path))
-            else:
-                for item in path_obj.iterdir():
-                    if item.is_file():
-                        results.append(self.scan_file(str(item)))
+            # Prune unsafe subtrees while walking; scan_file rejects them
+            for record in crawl(directory_path, recursive=recursive, policy=get_path_policy()):
+                results.append(self.scan_file(record.path, record))
         except Exception as e:
             logger.error(f"Error scanning directory {directory_path}: {str(e)}")
             # Create a dummy result for the directory itself
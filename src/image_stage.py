@@ -0,0 +1,278 @@
+"""
+Local image pre-processing before vision summaries
+
+Camera originals can be tens of megabytes, but the vision model only
+needs a small picture. This module decodes each photo once into a cached
+thumbnail (using JPEG draft mode, so large originals are decoded at a
+fraction of their resolution), reads EXIF date, camera and GPS position,
+and computes a perceptual hash so near-duplicate shots from a burst reuse
+one summary instead of calling the model again.
+
+Pillow is optional; without it images are sent to the model unchanged.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from src.config import config
+from src.error_handler import get_logger
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+logger = get_logger(__name__)
+
+EXIF_IFD = 0x8769
+GPS_IFD = 0x8825
+TAG_MAKE = 271
+TAG_MODEL = 272
+TAG_DATETIME = 306
+TAG_DATETIME_ORIGINAL = 36867
+
+HASH_SIZE = 8
+HASH_SAMPLE = 32
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II matrix"""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+_DCT = _dct_matrix(HASH_SAMPLE)
+
+
+def perceptual_hash(image) -> int:
+    """
+    Compute a 64-bit DCT perceptual hash of a PIL image
+
+    Args:
+        image: PIL image (any mode or size)
+
+    Returns:
+        Hash as an integer; similar pictures differ in few bits
+    """
+    small = image.convert("L").resize((HASH_SAMPLE, HASH_SAMPLE), Image.BILINEAR)
+    pixels = np.asarray(small, dtype=np.float64)
+    coefficients = (_DCT @ pixels @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].flatten()
+    # The DC term only reflects overall brightness
+    median = np.median(coefficients[1:])
+    value = 0
+    for bit in coefficients > median:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits between two hashes"""
+    return bin(a ^ b).count("1")
+
+
+def _gps_coordinate(values, ref) -> Optional[float]:
+    try:
+        degrees, minutes, seconds = (float(v) for v in values)
+    except (TypeError, ValueError):
+        return None
+    coordinate = degrees + minutes / 60 + seconds / 3600
+    return -coordinate if ref in ("S", "W") else coordinate
+
+
+def read_exif(image) -> Dict:
+    """
+    Read date, camera and GPS position from the EXIF of a PIL image
+
+    Returns:
+        Dictionary with "date", "camera", "latitude" and "longitude" when present
+    """
+    try:
+        exif = image.getexif()
+    except Exception:
+        return {}
+    if not exif:
+        return {}
+
+    info = {}
+    date = exif.get_ifd(EXIF_IFD).get(TAG_DATETIME_ORIGINAL) or exif.get(TAG_DATETIME)
+    if date:
+        # EXIF dates look like "2023:07:14 18:02:11"
+        info["date"] = str(date).replace(":", "-", 2)
+    camera = " ".join(str(exif[tag]).strip() for tag in (TAG_MAKE, TAG_MODEL) if exif.get(tag))
+    if camera:
+        info["camera"] = camera
+    gps = exif.get_ifd(GPS_IFD)
+    if gps and 2 in gps and 4 in gps:
+        latitude = _gps_coordinate(gps[2], gps.get(1))
+        longitude = _gps_coordinate(gps[4], gps.get(3))
+        if latitude is not None and longitude is not None:
+            info["latitude"] = round(latitude, 5)
+            info["longitude"] = round(longitude, 5)
+    return info
+
+
+def describe_exif(exif: Dict) -> str:
+    """Turn EXIF info into a sentence that can be appended to a summary"""
+    parts = []
+    if exif.get("date"):
+        parts.append(f"taken {exif['date']}")
+    if exif.get("camera"):
+        parts.append(f"with {exif['camera']}")
+    if "latitude" in exif:
+        parts.append(f"at {exif['latitude']}, {exif['longitude']}")
+    return (" ".join(parts).capitalize() + ".") if parts else ""
+
+
+class ImageStage:
+    """Thumbnail, EXIF and near-duplicate handling for image summaries"""
+
+    def __init__(self, thumbnail_dir: Optional[str] = None, max_size: Optional[int] = None,
+                 max_distance: Optional[int] = None, cache_size: Optional[int] = None):
+        """
+        Initialize the ImageStage
+
+        Args:
+            thumbnail_dir: Where thumbnails are cached (defaults to cache_dir/thumbnails)
+            max_size: Longest side of a thumbnail in pixels
+            max_distance: Largest hash distance still treated as the same picture
+            cache_size: Number of recent summaries kept for near-duplicate lookups
+        """
+        self.thumbnail_dir = thumbnail_dir or os.path.join(config.get("paths.cache_dir"), "thumbnails")
+        self.max_size = max_size or config.get("images.thumbnail_size", 512)
+        self.max_distance = max_distance if max_distance is not None else \
+            config.get("images.duplicate_distance", 6)
+        self.cache_size = cache_size or config.get("images.duplicate_cache_size", 512)
+        self._recent: "OrderedDict[int, str]" = OrderedDict()
+        self._inflight: Dict[int, Future] = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.thumbnail_dir, exist_ok=True)
+
+    def _thumbnail_path(self, image_path: str) -> str:
+        stat = os.stat(image_path)
+        key = f"{os.path.abspath(image_path)}:{stat.st_size}:{stat.st_mtime_ns}:{self.max_size}"
+        return os.path.join(self.thumbnail_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".jpg")
+
+    def prepare(self, image_path: str) -> Optional[Dict]:
+        """
+        Decode an image once into a thumbnail and read its EXIF and hash
+
+        Thumbnails are reused while the original is unchanged.
+
+        Args:
+            image_path: Path of the original image
+
+        Returns:
+            Dictionary with "thumbnail", "exif" and "phash", or None if the
+            image could not be processed (or Pillow is not installed)
+        """
+        if not PIL_AVAILABLE:
+            return None
+        try:
+            thumbnail_path = self._thumbnail_path(image_path)
+            with Image.open(image_path) as image:
+                exif = read_exif(image)
+                if os.path.exists(thumbnail_path):
+                    with Image.open(thumbnail_path) as thumbnail:
+                        return {"thumbnail": thumbnail_path, "exif": exif, "phash": perceptual_hash(thumbnail)}
+                # Let the JPEG decoder scale down while decoding
+                image.draft("RGB", (self.max_size, self.max_size))
+                thumbnail = ImageOps.exif_transpose(image).convert("RGB")
+                thumbnail.thumbnail((self.max_size, self.max_size))
+                tmp_path = thumbnail_path + ".tmp"
+                thumbnail.save(tmp_path, "JPEG", quality=85)
+                os.replace(tmp_path, thumbnail_path)
+                return {"thumbnail": thumbnail_path, "exif": exif, "phash": perceptual_hash(thumbnail)}
+        except Exception as e:
+            logger.warning(f"Could not pre-process image {image_path}: {e}")
+            return None
+
+    def _find(self, phash: int, candidates) -> Optional[int]:
+        for other in candidates:
+            if hamming_distance(phash, other) <= self.max_distance:
+                return other
+        return None
+
+    def begin(self, phash: int) -> Tuple[bool, Future]:
+        """
+        Claim the summary of a picture, or join an identical one already known
+
+        Args:
+            phash: Perceptual hash of the picture
+
+        Returns:
+            (owner, future). The owner must summarize the picture and call
+            `finish` (or `release`); everyone else waits on the future for the
+            shared summary.
+        """
+        with self._lock:
+            match = self._find(phash, reversed(self._recent))
+            if match is not None:
+                self._recent.move_to_end(match)
+                future = Future()
+                future.set_result(self._recent[match])
+                return False, future
+            match = self._find(phash, self._inflight)
+            if match is not None:
+                return False, self._inflight[match]
+            future = Future()
+            self._inflight[phash] = future
+            return True, future
+
+    def finish(self, phash: int, future: Future, summary: Optional[str] = None,
+               error: Optional[BaseException] = None) -> None:
+        """
+        Publish the summary (or failure) of a claimed picture
+
+        Args:
+            phash: Hash passed to `begin`
+            future: Future returned by `begin`
+            summary: Summary text on success
+            error: Exception on failure
+        """
+        with self._lock:
+            self._inflight.pop(phash, None)
+            if error is None:
+                self._recent[phash] = summary
+                while len(self._recent) > self.cache_size:
+                    self._recent.popitem(last=False)
+        if error is None:
+            future.set_result(summary)
+        else:
+            future.set_exception(error)
+
+    def release(self, phash: int, future: Future) -> None:
+        """
+        Give up a claimed picture without a summary, e.g. when the owner is cancelled
+
+        The future is cancelled, so a waiter can claim the picture again
+        with `begin` instead of failing with the owner.
+
+        Args:
+            phash: Hash passed to `begin`
+            future: Future returned by `begin`
+        """
+        with self._lock:
+            self._inflight.pop(phash, None)
+        future.cancel()
+
+
+_stage = None
+_stage_lock = threading.Lock()
+
+
+def get_image_stage() -> ImageStage:
+    """Get the shared image stage"""
+    global _stage
+    with _stage_lock:
+        if _stage is None:
+            _stage = ImageStage()
+        return _stage
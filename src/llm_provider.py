@@ -0,0 +1,600 @@
+"""
+LLM provider layer for Sorting Hat
+
+Every model call goes through a provider from `get_provider`. Providers
+keep one pooled client per process (and one async client per event loop),
+apply the configured per-call timeout and share a single retry policy
+(exponential backoff with jitter, honoring Retry-After). Async calls can
+be hedged with a second request when the first is slow (the duplicate
+waits for the provider's rate limiter like any other request), and a circuit
+breaker per provider fails calls over to the fallback provider (local
+Ollama by default) while the primary is unhealthy.
+The "fake" provider answers deterministically without network access so
+/batch and /watch throughput can be benchmarked offline.
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import weakref
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.config import config
+from src.error_handler import APIError, get_logger
+from src.rate_limiter import estimate_tokens, get_rate_limiter
+
+logger = get_logger(__name__)
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+def is_retryable(error: Exception) -> bool:
+    """Return whether a failed call is worth retrying (timeouts, connection errors, 429/5xx)"""
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    if getattr(error, "status_code", None) in RETRYABLE_STATUS_CODES:
+        return True
+    name = type(error).__name__
+    return "Timeout" in name or "Connection" in name or "Connect" in name
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Return the delay a 429/503 response asked for in its Retry-After header, if any"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    value = headers.get("retry-after") if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitOpenError(APIError):
+    """Raised instead of calling a provider whose circuit breaker is open"""
+
+    def __init__(self, provider: str, retry_in: float):
+        super().__init__(
+            f"{provider} is failing; calls are paused for {retry_in:.0f}s",
+            api_name=provider,
+            details={"retry_in": retry_in},
+        )
+
+
+class CircuitBreaker:
+    """Stops calling a provider after repeated failures and probes it again after a cooldown"""
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        """
+        Initialize the CircuitBreaker
+
+        Args:
+            failure_threshold: Consecutive retryable failures that open the circuit
+            reset_seconds: How long the circuit stays open before one trial call is let through
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """Current state: closed, open or half-open"""
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_seconds:
+                return "half-open"
+            return "open"
+
+    def allow(self) -> Tuple[float, bool]:
+        """
+        Check whether a call may go through
+
+        Returns:
+            (0, False) if the call may proceed, (0, True) if it is the trial
+            call of a half-open circuit (which must end with `end_probe`),
+            otherwise the seconds until the next trial call and False
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0, False
+            remaining = self._opened_at + self.reset_seconds - time.monotonic()
+            if remaining > 0:
+                return remaining, False
+            if self._probing:
+                return self.reset_seconds, False
+            # Half-open: let a single trial call through
+            self._probing = True
+            return 0.0, True
+
+    def end_probe(self) -> None:
+        """
+        Finish a trial call, whatever its outcome
+
+        A probe that ended without a verdict (e.g. cancelled) leaves the
+        circuit half-open, so the next call becomes the trial call.
+        """
+        with self._lock:
+            self._probing = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._probing:
+                    logger.warning(f"Circuit opened after {self._failures} consecutive failures")
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, shared by every provider"""
+
+    def __init__(self, max_attempts: int = 5, base_delay: float = 1.0, max_delay: float = 30.0):
+        """
+        Initialize the RetryPolicy
+
+        Args:
+            max_attempts: Total attempts per call, including the first
+            base_delay: Backoff before the second attempt in seconds
+            max_delay: Upper bound of a single backoff in seconds
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @classmethod
+    def from_config(cls) -> "RetryPolicy":
+        """Create the policy configured under `llm.retry`"""
+        return cls(
+            max_attempts=config.get("llm.retry.max_attempts", 5),
+            base_delay=config.get("llm.retry.base_delay_seconds", 1.0),
+            max_delay=config.get("llm.retry.max_delay_seconds", 30.0),
+        )
+
+    def backoff(self, attempt: int, error: Optional[Exception] = None) -> float:
+        """Return the delay after failed attempt number `attempt` (1-based)"""
+        requested = retry_after(error) if error is not None else None
+        if requested is not None:
+            return min(self.max_delay, requested)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def call(self, fn: Callable, description: str = "LLM call"):
+        """Run a blocking call, retrying retryable errors"""
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return fn()
+            except Exception as e:
+                if attempt == self.max_attempts or not is_retryable(e):
+                    raise
+                delay = self.backoff(attempt, e)
+                logger.warning(f"{description} failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    async def acall(self, fn: Callable, description: str = "LLM call"):
+        """Await a coroutine factory, retrying retryable errors"""
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return await fn()
+            except Exception as e:
+                if attempt == self.max_attempts or not is_retryable(e):
+                    raise
+                delay = self.backoff(attempt, e)
+                logger.warning(f"{description} failed ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+
+class LLMProvider:
+    """Base class of chat model providers"""
+
+    name = "base"
+
+    def __init__(self, model: Optional[str] = None, timeout: Optional[float] = None,
+                 retry: Optional[RetryPolicy] = None):
+        """
+        Initialize the provider
+
+        Args:
+            model: Default model (from `llm.providers.<name>.model` if not given)
+            timeout: Per-call timeout in seconds (from `llm.timeout_seconds` if not given)
+            retry: Retry policy (from `llm.retry` if not given)
+        """
+        settings = config.get(f"llm.providers.{self.name}", {}) or {}
+        self.settings = settings
+        self.model = model or settings.get("model")
+        self.image_model = settings.get("image_model", self.model)
+        self.timeout = timeout if timeout is not None else config.get("llm.timeout_seconds", 60)
+        self.retry = retry or RetryPolicy.from_config()
+        self.hedge_after = config.get("llm.hedge_after_seconds")
+        self.breaker = CircuitBreaker(
+            failure_threshold=config.get("llm.circuit_breaker.failure_threshold", 5),
+            reset_seconds=config.get("llm.circuit_breaker.reset_seconds", 30.0),
+        )
+        self._lock = threading.Lock()
+        self._client = None
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    @property
+    def available(self) -> bool:
+        """Whether the provider can be called (e.g. credentials are present)"""
+        return True
+
+    def _create_client(self):
+        raise NotImplementedError
+
+    def _create_async_client(self):
+        raise NotImplementedError
+
+    @property
+    def client(self):
+        """Blocking client, created once and reused"""
+        with self._lock:
+            if self._client is None:
+                self._client = self._create_client()
+            return self._client
+
+    @property
+    def async_client(self):
+        """Async client for the running event loop, created once per loop and reused"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = self._create_async_client()
+                self._async_clients[loop] = client
+            return client
+
+    def _complete(self, messages: List[Dict], model: str, json_mode: bool, max_tokens: Optional[int]) -> str:
+        raise NotImplementedError
+
+    async def _acomplete(self, messages: List[Dict], model: str, json_mode: bool, max_tokens: Optional[int]) -> str:
+        raise NotImplementedError
+
+    def chat(self, messages: List[Dict], model: Optional[str] = None, json_mode: bool = False,
+             max_tokens: Optional[int] = None) -> str:
+        """
+        Send a chat request and return the content of the reply
+
+        Args:
+            messages: Chat messages ({"role", "content"} and optionally "images")
+            model: Model to use instead of the provider default
+            json_mode: Ask the model for a JSON object
+            max_tokens: Optional completion length limit
+
+        Returns:
+            Reply text
+        """
+        requested_model = model
+        model = model or self.model
+
+        def attempt():
+            probe = self._check_breaker()
+            try:
+                result = self._complete(messages, model, json_mode, max_tokens)
+            except Exception as e:
+                self._record_failure(e)
+                raise
+            finally:
+                if probe:
+                    self.breaker.end_probe()
+            self.breaker.record_success()
+            return result
+
+        try:
+            return self.retry.call(attempt, f"{self.name} {model}")
+        except Exception as e:
+            fallback = self._fallback(e)
+            if fallback is None:
+                raise
+            return fallback.chat(messages, self._fallback_model(fallback, requested_model), json_mode, max_tokens)
+
+    async def achat(self, messages: List[Dict], model: Optional[str] = None, json_mode: bool = False,
+                    max_tokens: Optional[int] = None) -> str:
+        """Async version of `chat`, with optional request hedging"""
+        requested_model = model
+        model = model or self.model
+
+        async def attempt():
+            probe = self._check_breaker()
+            try:
+                result = await self._hedged(lambda: asyncio.wait_for(
+                    self._acomplete(messages, model, json_mode, max_tokens), self.timeout
+                ), lambda: self._acquire_hedge(messages, max_tokens))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._record_failure(e)
+                raise
+            finally:
+                if probe:
+                    self.breaker.end_probe()
+            self.breaker.record_success()
+            return result
+
+        try:
+            return await self.retry.acall(attempt, f"{self.name} {model}")
+        except Exception as e:
+            fallback = self._fallback(e)
+            if fallback is None:
+                raise
+            return await fallback.achat(messages, self._fallback_model(fallback, requested_model), json_mode, max_tokens)
+
+    async def _hedged(self, make: Callable, acquire: Optional[Callable] = None):
+        """
+        Await a request, sending a duplicate if the first is slower than `hedge_after`
+
+        Whichever request succeeds first wins and the other is cancelled.
+
+        Args:
+            make: Coroutine factory sending the request
+            acquire: Coroutine factory awaited before the duplicate is sent,
+                to take its share of the rate limits
+        """
+        if not self.hedge_after:
+            return await make()
+        first = asyncio.ensure_future(make())
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_after)
+        if done:
+            return first.result()
+
+        async def hedge():
+            if acquire is not None:
+                await acquire()
+            return await make()
+
+        logger.debug(f"{self.name} request slower than {self.hedge_after}s, sending a hedged request")
+        pending = {first, asyncio.ensure_future(hedge())}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.cancelled():
+                        error = error or asyncio.CancelledError()
+                    elif task.exception() is None:
+                        return task.result()
+                    else:
+                        error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _acquire_hedge(self, messages: List[Dict], max_tokens: Optional[int]) -> None:
+        """Wait for the provider's rate limiter before a hedged duplicate is sent"""
+        if self.name not in (config.get("llm.rate_limits", {}) or {}):
+            return
+        text = "".join(str(message.get("content", "")) for message in messages)
+        await get_rate_limiter(self.name).acquire(estimate_tokens(text) + (max_tokens or 256))
+
+    def _check_breaker(self) -> bool:
+        """Raise CircuitOpenError if the circuit is open; return whether this call is the trial call"""
+        retry_in, probe = self.breaker.allow()
+        if retry_in:
+            raise CircuitOpenError(self.name, retry_in)
+        return probe
+
+    def _record_failure(self, error: Exception) -> None:
+        # Only failures that say something about the provider's health count;
+        # any other error means the provider did answer
+        if is_retryable(error):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def _fallback(self, error: Exception) -> Optional["LLMProvider"]:
+        """Return the provider to fail over to after `error`, if any"""
+        if not isinstance(error, CircuitOpenError) and not is_retryable(error):
+            return None
+        name = config.get("llm.fallback_provider")
+        if not name or name == self.name or name not in PROVIDERS:
+            return None
+        logger.warning(f"{self.name} failed ({error}), failing over to {name}")
+        return get_provider(name)
+
+    def _fallback_model(self, fallback: "LLMProvider", model: Optional[str]) -> Optional[str]:
+        """Map the requested model onto the fallback provider's equivalent"""
+        if model and model == self.image_model and model != self.model:
+            return fallback.image_model
+        return None
+
+
+class GroqProvider(LLMProvider):
+    """Groq cloud models"""
+
+    name = "groq"
+
+    @property
+    def available(self) -> bool:
+        return bool(os.environ.get("GROQ_API_KEY"))
+
+    def _create_client(self):
+        from groq import Groq
+        # Retries are handled by the shared policy
+        return Groq(api_key=os.environ.get("GROQ_API_KEY"), base_url=self.settings.get("base_url"),
+                    timeout=self.timeout, max_retries=0)
+
+    def _create_async_client(self):
+        from groq import AsyncGroq
+        return AsyncGroq(api_key=os.environ.get("GROQ_API_KEY"), base_url=self.settings.get("base_url"),
+                         timeout=self.timeout, max_retries=0)
+
+    def _request(self, messages, model, json_mode, max_tokens):
+        request = {"messages": messages, "model": model, "temperature": 0}
+        if json_mode:
+            request["response_format"] = {"type": "json_object"}
+        if max_tokens:
+            request["max_tokens"] = max_tokens
+        return request
+
+    def _complete(self, messages, model, json_mode, max_tokens):
+        cmpl = self.client.chat.completions.create(**self._request(messages, model, json_mode, max_tokens))
+        return cmpl.choices[0].message.content
+
+    async def _acomplete(self, messages, model, json_mode, max_tokens):
+        cmpl = await self.async_client.chat.completions.create(
+            **self._request(messages, model, json_mode, max_tokens)
+        )
+        return cmpl.choices[0].message.content
+
+
+class OllamaProvider(LLMProvider):
+    """Local models served by Ollama (also used for images)"""
+
+    name = "ollama"
+
+    def _create_client(self):
+        import ollama
+        return ollama.Client(timeout=self.timeout)
+
+    def _create_async_client(self):
+        import ollama
+        return ollama.AsyncClient(timeout=self.timeout)
+
+    def _request(self, messages, model, json_mode, max_tokens):
+        request = {"messages": messages, "model": model}
+        if json_mode:
+            request["format"] = "json"
+        if max_tokens:
+            request["options"] = {"num_predict": max_tokens}
+        return request
+
+    def _complete(self, messages, model, json_mode, max_tokens):
+        response = self.client.chat(**self._request(messages, model, json_mode, max_tokens))
+        return response["message"]["content"]
+
+    async def _acomplete(self, messages, model, json_mode, max_tokens):
+        response = await self.async_client.chat(**self._request(messages, model, json_mode, max_tokens))
+        return response["message"]["content"]
+
+
+class FakeProvider(LLMProvider):
+    """
+    Deterministic offline stand-in for load testing
+
+    Replies are derived from the request itself: summary requests (single
+    or batched) get a summary naming the file, planning requests put every
+    file in a folder named after its extension, merge requests keep every
+    folder. Latency
+    is `latency_seconds` plus up to `jitter_seconds`, drawn from a seeded
+    generator so runs are repeatable.
+    """
+
+    name = "fake"
+
+    def __init__(self, *args, latency: Optional[float] = None, jitter: Optional[float] = None,
+                 seed: Optional[int] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.model = self.model or "fake"
+        self.image_model = self.image_model or self.model
+        self.latency = latency if latency is not None else self.settings.get("latency_seconds", 0.05)
+        self.jitter = jitter if jitter is not None else self.settings.get("jitter_seconds", 0.02)
+        self._random = random.Random(seed if seed is not None else self.settings.get("seed", 0))
+        self.calls = 0
+
+    def _delay(self) -> float:
+        with self._lock:
+            self.calls += 1
+            return self.latency + self._random.uniform(0, self.jitter)
+
+    @staticmethod
+    def _parse(content):
+        try:
+            return json.loads(content)
+        except (TypeError, ValueError):
+            return content
+
+    @staticmethod
+    def _summary(item: Dict) -> Dict:
+        file_path = item.get("file_path", "")
+        text = str(item.get("content", ""))
+        return {"file_path": file_path, "summary": f"{os.path.basename(file_path)}: {' '.join(text.split()[:30])}"}
+
+    def reply(self, messages: List[Dict], json_mode: bool) -> str:
+        """Build the reply to a request"""
+        user_messages = [m for m in messages if m.get("role") == "user"]
+        first = user_messages[0] if user_messages else {}
+        if first.get("images"):
+            return f"An image named {os.path.basename(first['images'][0])}."
+
+        data = self._parse(first.get("content"))
+        if isinstance(data, dict) and ("content" in data or "file_path" in data):
+            result = self._summary(data)
+        elif isinstance(data, dict) and data and all(isinstance(v, int) for v in data.values()):
+            result = {"folders": [{"src_folder": f, "dst_folder": f} for f in data]}
+        elif isinstance(data, list) and data and all(isinstance(item, dict) and "content" in item for item in data):
+            result = {"summaries": [self._summary(item) for item in data]}
+        elif isinstance(data, list) and all(isinstance(item, dict) and "file_path" in item for item in data):
+            files = []
+            for item in data:
+                name = os.path.basename(item["file_path"])
+                ext = os.path.splitext(name)[1].lstrip(".").lower() or "other"
+                files.append({"src_path": item["file_path"], "dst_path": os.path.join(ext, name)})
+            result = {"files": files}
+        else:
+            result = {"files": []} if json_mode else "OK"
+        return json.dumps(result) if json_mode or not isinstance(result, str) else result
+
+    def _complete(self, messages, model, json_mode, max_tokens):
+        time.sleep(self._delay())
+        return self.reply(messages, json_mode)
+
+    async def _acomplete(self, messages, model, json_mode, max_tokens):
+        await asyncio.sleep(self._delay())
+        return self.reply(messages, json_mode)
+
+
+PROVIDERS = {
+    GroqProvider.name: GroqProvider,
+    OllamaProvider.name: OllamaProvider,
+    FakeProvider.name: FakeProvider,
+}
+
+_providers: Dict[str, LLMProvider] = {}
+_providers_lock = threading.Lock()
+
+
+def get_provider(name: Optional[str] = None) -> LLMProvider:
+    """
+    Get the shared provider instance
+
+    Args:
+        name: Provider name; defaults to `llm.provider`, or "ollama" in incognito mode
+
+    Returns:
+        The pooled provider
+    """
+    if name is None:
+        name = config.get("llm.provider", "groq")
+        if config.get("system.incognito_mode", False) and name != "fake":
+            name = "ollama"
+    if name not in PROVIDERS:
+        raise APIError(f"Unknown LLM provider: {name}", api_name=name)
+    with _providers_lock:
+        if name not in _providers:
+            _providers[name] = PROVIDERS[name]()
+        return _providers[name]
+
+
+def get_image_provider() -> LLMProvider:
+    """Get the provider used for image summaries (`llm.image_provider`)"""
+    if config.get("llm.provider", "groq") == "fake":
+        return get_provider("fake")
+    return get_provider(config.get("llm.image_provider", "ollama"))
@@ -1,25 +1,91 @@
 import asyncio
 import json
 import os
-from collections import defaultdict
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
 
 import agentops
-import colorama
-import ollama
 import weave
-from groq import AsyncGroq, Groq
 from llama_index.core import Document, SimpleDirectoryReader
 from llama_index.core.schema import ImageDocument
 from llama_index.core.node_parser import TokenTextSplitter
-from termcolor import colored
 
+from src.config import config
+from src.crawler import crawl
+from src.fast_classifier import FAST_PATH_EXTENSIONS, get_fast_path
+from src.image_stage import describe_exif, get_image_stage
+from src.llm_provider import get_image_provider, get_provider
+from src.progress import ProgressReporter, logger
+from src.rate_limiter import estimate_tokens, get_provider_limiters
+from src.snapshot_index import get_snapshot_index
+from src.summary_cache import get_summary_cache, prompt_version
+from src.text_extractor import can_extract, extract_document, extract_text, file_metadata
+
+SUMMARY_PROMPT = """
+You will be provided with the contents of a file along with its metadata. Provide a summary of the contents. The purpose of the summary is to organize files based on their content. To this end provide a concise but informative summary. Make the summary as specific to the file as possible.
 
-@agentops.record_function("get directory summaries")
-async def get_dir_summaries(path: str):
-    doc_dicts = load_documents(path)
-    # metadata = process_metadata(doc_dicts)
+Write your response a JSON object with the following schema:
+
+```json
+{
+    "file_path": "path to the file including name",
+    "summary": "summary of the content"
+}
+```
+""".strip()
+
+BATCH_SUMMARY_PROMPT = """
+You will be provided with a JSON array of files, each with its contents and metadata. Provide a summary of the contents of every file. The purpose of the summaries is to organize files based on their content. To this end provide concise but informative summaries. Make each summary as specific to its file as possible.
+
+Write your response a JSON object with the following schema, with exactly one entry per file and the file paths copied exactly:
+
+```json
+{
+    "summaries": [
+        {
+            "file_path": "path to the file including name",
+            "summary": "summary of the content"
+        }
+    ]
+}
+```
+""".strip()
+
+IMAGE_SUMMARY_PROMPT = "Summarize the contents of this image."
+
+SUPPORTED_EXTENSIONS = [
+    ".pdf",
+    # ".docx",
+    # ".py",
+    ".txt",
+    # ".md",
+    ".png",
+    ".jpg",
+    ".jpeg",
+    # ".ts",
+]
+
+# Files the directory reader loads as ImageDocuments
+IMAGE_DOCUMENT_EXTENSIONS = {".png", ".jpg", ".jpeg"}
 
-    summaries = await get_summaries(doc_dicts)
+
+# Cached summaries are only reused while the prompt that produced them is unchanged
+SUMMARY_PROMPT_VERSION = prompt_version(SUMMARY_PROMPT, BATCH_SUMMARY_PROMPT)
+IMAGE_SUMMARY_PROMPT_VERSION = prompt_version(IMAGE_SUMMARY_PROMPT)
+
+_cache_checked = False
+
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+
+@agentops.record_function("get directory summaries")
+async def get_dir_summaries(path: str, policy=None):
+    input_files = await asyncio.to_thread(list_input_files, path, policy)
+    summaries, input_files = _fast_path(input_files)
+    # Documents are parsed on the process pool while earlier ones are summarized
+    summaries += await get_summaries(iter_documents(path, input_files=input_files), total=len(input_files))
 
     # Convert path to relative path
     for summary in summaries:
@@ -40,37 +106,193 @@ async def get_dir_summaries(path: str):
     # ]
 
 
+async def iter_incremental_dir_summaries(path: str):
+    """
+    Summarize a directory, reusing the summaries of files unchanged since the last run.
+
+    The directory is compared against its snapshot index. Only added and
+    modified files (and files whose cached summary is gone) are loaded and
+    sent to the LLM; renamed files keep their previous summary as long as
+    it was made by the current model and prompt. Yields one
+    `{"file_path", "summary"}` dict per file as soon as it is available,
+    reused summaries first, and updates the snapshot once all are done.
+    """
+    index = get_snapshot_index()
+    diff = await asyncio.to_thread(index.diff, path, listed_extensions())
+    cache = _get_cache()
+
+    to_load = list(diff.changed)
+    summary_ids = {}
+    for rel_path in diff.unchanged + [new for _, new in diff.renamed]:
+        record = diff.current[rel_path]
+        text = None
+        if cache is not None and record["summary_id"] and record["content_hash"]:
+            # The stored id names the model of the earlier run; look the
+            # summary up under the current model and prompt instead
+            summary_id = cache.key(record["content_hash"], *_path_cache_params(rel_path))
+            text = await asyncio.to_thread(cache.get_by_key, summary_id)
+            if text is not None:
+                summary_ids[rel_path] = summary_id
+        if text is None:
+            to_load.append(rel_path)
+        else:
+            yield {"file_path": rel_path, "summary": text}
+
+    resolved, to_load = _fast_path([os.path.join(path, rel_path) for rel_path in to_load])
+    for summary in resolved:
+        yield {**summary, "file_path": os.path.relpath(summary["file_path"], path)}
+
+    # The diff already hashed these files; the cache reuses its hashes
+    content_hashes = {
+        os.path.abspath(file_path): diff.current[os.path.relpath(file_path, path)]["content_hash"]
+        for file_path in to_load
+    }
+    documents = iter_documents(path, input_files=to_load) if to_load else []
+    # Every file is loaded as exactly one document, and iter_summaries caches its summary
+    async for _, doc, summary in iter_summaries(documents, total=len(to_load), content_hashes=content_hashes):
+        file_path, model, version = _cache_params(doc)
+        rel_path = os.path.relpath(file_path, path)
+        text = summary.get("summary", "")
+        content_hash = diff.current.get(rel_path, {}).get("content_hash")
+        # An empty summary is a failed one; leave it to be retried next run
+        if cache is not None and content_hash and text:
+            summary_ids[rel_path] = cache.key(content_hash, model, version)
+        yield {"file_path": rel_path, "summary": text}
+
+    await asyncio.to_thread(index.update, diff, summary_ids)
+
+
+@agentops.record_function("get incremental directory summaries")
+async def get_incremental_dir_summaries(path: str):
+    """Summarize a directory incrementally and return the summaries sorted by path."""
+    summaries = [summary async for summary in iter_incremental_dir_summaries(path)]
+    return sorted(summaries, key=lambda summary: summary["file_path"])
+
+
+def listed_extensions():
+    """Extensions that are summarized, plus those the fast path can resolve"""
+    if not config.get("fast_path.enabled", True):
+        return SUPPORTED_EXTENSIONS
+    return SUPPORTED_EXTENSIONS + [ext for ext in FAST_PATH_EXTENSIONS if ext not in SUPPORTED_EXTENSIONS]
+
+
+def list_input_files(path: str, policy=None):
+    """
+    List the supported files under a directory without reading them
+
+    Only the ignore patterns apply unless a path policy is given.
+    """
+    return sorted(record.path for record in crawl(path, extensions=listed_extensions(), policy=policy))
+
+
+def _fast_path(input_files):
+    """
+    Resolve files that can be classified from their name, type or metadata.
+
+    Returns:
+        (summaries of resolved files, files that still need the LLM)
+    """
+    classifier = get_fast_path()
+    if classifier is None:
+        return [], list(input_files)
+    resolved, remaining = classifier.partition(input_files)
+    if resolved:
+        # The classifier is shared, so its own stats span every run
+        tiers = dict(Counter(summary["tier"] for summary in resolved), llm=len(remaining))
+        logger.info(f"Fast path resolved {len(resolved)} of {len(resolved) + len(remaining)} files: {tiers}")
+    return resolved, remaining
+
+
+def _get_parse_pool():
+    """Return the shared process pool documents are parsed on"""
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=config.get("extraction.max_workers") or os.cpu_count()
+            )
+        return _parse_pool
+
+
+async def iter_documents(path: str, input_files=None, max_pending=None):
+    """
+    Parse documents on a process pool, yielding each one as soon as it is ready.
+
+    PDF, DOCX and text files are extracted on all cores with at most
+    `max_pending` files in flight; since the consumer pulls documents
+    through a bounded queue, parsing stays just ahead of summarization
+    instead of finishing before it starts. Images and other formats are
+    loaded with SimpleDirectoryReader on a thread.
+    """
+    if input_files is None:
+        input_files = await asyncio.to_thread(list_input_files, path)
+    extractable = [file for file in input_files if can_extract(file)]
+    other_files = [file for file in input_files if not can_extract(file)]
+
+    if other_files:
+        for doc in await asyncio.to_thread(load_documents, path, other_files):
+            yield doc
+    if not extractable:
+        return
+
+    loop = asyncio.get_running_loop()
+    pool = _get_parse_pool()
+    max_pending = max_pending or config.get("extraction.max_pending", 32)
+    files = iter(extractable)
+    pending = set()
+    try:
+        while True:
+            for file in files:
+                pending.add(loop.run_in_executor(pool, extract_document, file))
+                if len(pending) >= max_pending:
+                    break
+            if not pending:
+                return
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                try:
+                    text, metadata = future.result()
+                except Exception as e:
+                    logger.warning(f"Error extracting text: {e}")
+                    continue
+                yield Document(text=text, metadata=metadata)
+    finally:
+        for future in pending:
+            future.cancel()
+
+
 @agentops.record_function("load documents")
-def load_documents(path: str):
-    reader = SimpleDirectoryReader(
-        input_dir=path,
-        recursive=True,
-        required_exts=[
-            ".pdf",
-            # ".docx",
-            # ".py",
-            ".txt",
-            # ".md",
-            ".png",
-            ".jpg",
-            ".jpeg",
-            # ".ts",
-        ],
-    )
-    splitter = TokenTextSplitter(chunk_size=6144)
+def load_documents(path: str, input_files=None):
+    if input_files is None:
+        input_files = list_input_files(path)
+
+    # Text formats are read lazily and stop at the token budget
     documents = []
+    other_files = []
+    for file in input_files:
+        if not can_extract(file):
+            other_files.append(file)
+            continue
+        try:
+            documents.append(Document(text=extract_text(file), metadata=file_metadata(file)))
+        except Exception as e:
+            logger.warning(f"Error extracting text from {file}: {e}")
+    if not other_files:
+        return documents
+
+    reader = SimpleDirectoryReader(input_files=other_files)
+    splitter = TokenTextSplitter(chunk_size=config.get("extraction.max_tokens", 6144))
     for docs in reader.iter_data():
         # By default, llama index split files into multiple "documents"
         if len(docs) > 1:
             # So we first join all the document contexts, then truncate by token count
-            for d in docs:
-                # Some files will not have text and need to be handled
-                contents = splitter.split_text("\n".join(d.text))
-                if len(contents) > 0:
-                    text = contents[0]
-                else:
-                    text = ""
-                documents.append(Document(text=text, metadata=docs[0].metadata))
+            # Some files will not have text and need to be handled
+            contents = splitter.split_text("\n".join(d.text for d in docs))
+            if len(contents) > 0:
+                text = contents[0]
+            else:
+                text = ""
+            documents.append(Document(text=text, metadata=docs[0].metadata))
         else:
             documents.append(docs[0])
     return documents
@@ -87,113 +309,342 @@ def process_metadata(doc_dicts):
     return metadata_list
 
 
-async def summarize_document(doc, client):
-    PROMPT = """
-You will be provided with the contents of a file along with its metadata. Provide a summary of the contents. The purpose of the summary is to organize files based on their content. To this end provide a concise but informative summary. Make the summary as specific to the file as possible.
+async def summarize_document(doc, provider, limiter=None):
+    user_content = json.dumps(doc)
+    if limiter:
+        await limiter.acquire(estimate_tokens(SUMMARY_PROMPT + user_content) + 256)
+    content = await provider.achat(
+        [
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": user_content},
+        ],
+        json_mode=True,
+    )
 
-Write your response a JSON object with the following schema:
+    summary = json.loads(content)
+    if "file_path" not in summary or "summary" not in summary:
+        logger.warning(f"Malformed summary response for {doc.get('file_path')}: {summary}")
+    return summary
 
-```json
-{
-    "file_path": "path to the file including name",
-    "summary": "summary of the content"
-}
-```
-""".strip()
 
-    max_retries = 5
-    attempt = 0
-    while attempt < max_retries:
+async def summarize_document_batch(docs, provider, limiter=None):
+    """
+    Summarize several small documents with one request.
+
+    Each returned entry is checked and matched back to its document by
+    `file_path`; documents whose entry is missing or malformed (or all of
+    them, if the response is not valid JSON) are summarized on their own.
+
+    Returns:
+        One summary per document, in the order of `docs`
+    """
+    payload = [{"content": doc.text, **doc.metadata} for doc in docs]
+    user_content = json.dumps(payload)
+    if limiter:
+        await limiter.acquire(estimate_tokens(BATCH_SUMMARY_PROMPT + user_content) + 256 * len(docs))
+    content = await provider.achat(
+        [
+            {"role": "system", "content": BATCH_SUMMARY_PROMPT},
+            {"role": "user", "content": user_content},
+        ],
+        json_mode=True,
+    )
+
+    try:
+        entries = json.loads(content).get("summaries", [])
+    except (ValueError, AttributeError):
+        logger.warning(f"Malformed batch summary response for {len(docs)} files, summarizing them one by one")
+        entries = []
+    by_path = {}
+    for entry in entries if isinstance(entries, list) else []:
+        if (
+            isinstance(entry, dict)
+            and isinstance(entry.get("file_path"), str)
+            and isinstance(entry.get("summary"), str)
+            and entry["summary"].strip()
+        ):
+            by_path[entry["file_path"]] = entry
+
+    summaries = []
+    for doc, item in zip(docs, payload):
+        entry = by_path.get(item.get("file_path"))
+        if entry is None:
+            summaries.append(await summarize_document(item, provider, limiter))
+            continue
+        summaries.append({"file_path": item["file_path"], "summary": entry["summary"]})
+    return summaries
+
+
+def _image_summary(image_path, content, info):
+    """Build an image summary, adding the EXIF date, camera and position if known"""
+    exif = describe_exif(info["exif"]) if info else ""
+    return {
+        "file_path": image_path,
+        "summary": f"{content} {exif}".strip(),
+    }
+
+
+async def summarize_image_document(doc: ImageDocument, provider, limiter=None):
+    # Only a cached thumbnail is sent, and near-duplicates share one summary
+    stage = get_image_stage()
+    info = await asyncio.to_thread(stage.prepare, doc.image_path)
+    owner, future = stage.begin(info["phash"]) if info else (True, None)
+    content = None
+    while not owner:
+        try:
+            # Shielded, so cancelling this waiter leaves the shared future alone
+            content = await asyncio.shield(asyncio.wrap_future(future))
+            break
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise
+            # The owner was cancelled and released the picture: claim it again
+            owner, future = stage.begin(info["phash"])
+        except Exception:
+            owner, future = True, None
+
+    if owner:
         try:
-            chat_completion = client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": PROMPT},
-                    {"role": "user", "content": json.dumps(doc)},
+            if limiter:
+                await limiter.acquire()
+            content = await provider.achat(
+                [
+                    # {"role": "system", "content": "Respond with one short sentence."},
+                    {
+                        "role": "user",
+                        "content": IMAGE_SUMMARY_PROMPT,
+                        "images": [info["thumbnail"] if info else doc.image_path],
+                    },
                 ],
-                model="llama-3.1-70b-versatile",
-                response_format={"type": "json_object"},
-                temperature=0,
+                model=provider.image_model,
+                max_tokens=128,
             )
-            break
         except Exception as e:
-            print("Error status {}".format(e.status_code))
-            attempt += 1
-
-    summary = json.loads(chat_completion.choices[0].message.content)
-
-    try:
-        # Print the filename in green
-        print(colored(summary["file_path"], "green"))
-        print(summary["summary"])  # Print the summary of the contents
-        # Print a separator line with spacing for readability
-        print("-" * 80 + "\n")
-    except KeyError as e:
-        print(e)
-        print(summary)
+            if future is not None:
+                stage.finish(info["phash"], future, error=e)
+            raise
+        except BaseException:
+            # Cancelled: let a waiting near-duplicate summarize the picture instead
+            if future is not None:
+                stage.release(info["phash"], future)
+            raise
+        if future is not None:
+            stage.finish(info["phash"], future, content)
+
+    return _image_summary(doc.image_path, content, info)
+
+
+async def dispatch_summarize_document(doc, provider=None, image_provider=None, limiters=None):
+    limiters = limiters or {}
+    if isinstance(doc, ImageDocument):
+        image_provider = image_provider or get_image_provider()
+        return await summarize_image_document(
+            doc, image_provider, limiters.get(image_provider.name)
+        )
+    elif isinstance(doc, Document):
+        provider = provider or get_provider()
+        return await summarize_document(
+            {"content": doc.text, **doc.metadata}, provider, limiters.get(provider.name)
+        )
+    else:
+        raise ValueError("Document type not supported")
 
-    return summary
 
+def _get_cache():
+    """Return the summary cache, dropping entries from outdated prompts on first use"""
+    global _cache_checked
+    cache = get_summary_cache()
+    if cache is not None and not _cache_checked:
+        cache.invalidate_prompt_versions(
+            [SUMMARY_PROMPT_VERSION, IMAGE_SUMMARY_PROMPT_VERSION]
+        )
+        _cache_checked = True
+    return cache
 
-async def summarize_image_document(doc: ImageDocument, client):
-    PROMPT = """
-You will be provided with an image along with its metadata. Provide a summary of the image contents. The purpose of the summary is to organize files based on their content. To this end provide a concise but informative summary. Make the summary as specific to the file as possible.
 
-Write your response a JSON object with the following schema:
+def _cache_params(doc):
+    """Return the (file_path, model, prompt_version) a document is cached under"""
+    if isinstance(doc, ImageDocument):
+        return doc.image_path, get_image_provider().image_model, IMAGE_SUMMARY_PROMPT_VERSION
+    return doc.metadata.get("file_path"), get_provider().model, SUMMARY_PROMPT_VERSION
 
-```json
-{
-    "file_path": "path to the file including name",
-    "summary": "summary of the content"
-}
-```
-""".strip()
 
-    client = ollama.AsyncClient()
-    chat_completion = await client.chat(
-        messages=[
-            # {"role": "system", "content": "Respond with one short sentence."},
-            {
-                "role": "user",
-                "content": "Summarize the contents of this image.",
-                "images": [doc.image_path],
-            },
-        ],
-        model="moondream",
-        # format="json",
-        # stream=True,
-        options={"num_predict": 128},
-    )
+def _path_cache_params(path):
+    """Return the (model, prompt_version) a file would be cached under, without loading it"""
+    if os.path.splitext(path)[1].lower() in IMAGE_DOCUMENT_EXTENSIONS:
+        return get_image_provider().image_model, IMAGE_SUMMARY_PROMPT_VERSION
+    return get_provider().model, SUMMARY_PROMPT_VERSION
 
-    summary = {
-        "file_path": doc.image_path,
-        "summary": chat_completion["message"]["content"],
-    }
 
-    # Print the filename in green
-    print(colored(summary["file_path"], "green"))
-    print(summary["summary"])  # Print the summary of the contents
-    # Print a separator line with spacing for readability
-    print("-" * 80 + "\n")
-    return summary
+async def iter_summaries(documents, max_concurrency=None, total=None, content_hashes=None):
+    """
+    Summarize documents on a bounded pool of async workers, yielding each result as it lands.
+
+    Documents are fed through a bounded queue so only a few are waiting at
+    any time, at most `max_concurrency` requests are in flight, and every
+    request waits for its provider's rate limiter before it is sent.
+    `documents` may be a list or an async iterable such as `iter_documents`,
+    in which case summarization starts as soon as the first document is parsed.
+    Yields `(index, document, summary)` in completion order, where `index` is
+    the position of the document in `documents`. A document that can't be
+    summarized is counted as failed and yields an empty summary. Progress is
+    logged with a rate and an ETA against `total` (the length of a list by default).
+    `content_hashes` maps absolute file paths to hashes already computed
+    (e.g. by the snapshot diff), so the cache doesn't hash those files again.
+    """
+    if isinstance(documents, list) and not documents:
+        return
+
+    max_concurrency = max_concurrency or config.get("llm.max_concurrency", 8)
+    provider = get_provider()
+    image_provider = get_image_provider()
+    limiters = get_provider_limiters()
+    cache = _get_cache()
+    content_hashes = content_hashes or {}
+    if total is None and isinstance(documents, list):
+        total = len(documents)
+    progress = ProgressReporter(total)
+
+    queue = asyncio.Queue(maxsize=max_concurrency * 2)
+    results = asyncio.Queue()
+    if isinstance(documents, list):
+        num_workers = max(1, min(max_concurrency, len(documents)))
+    else:
+        num_workers = max_concurrency
 
+    batching = config.get("llm.batch.enabled", True)
+    batch_tokens = config.get("llm.batch.max_tokens", 4000)
+    batch_files = config.get("llm.batch.max_files", 20)
+    small_tokens = config.get("llm.batch.small_file_tokens", 500)
 
-async def dispatch_summarize_document(doc, client):
-    if isinstance(doc, ImageDocument):
-        return await summarize_image_document(doc, client)
-    elif isinstance(doc, Document):
-        return await summarize_document({"content": doc.text, **doc.metadata}, client)
+    async def produce():
+        # Small text documents are grouped into batches; everything else goes alone
+        batch = []
+        batch_used = 0
+        try:
+            async for index, doc in _enumerate_documents(documents):
+                tokens = estimate_tokens(doc.text) if isinstance(doc, Document) and \
+                    not isinstance(doc, ImageDocument) else None
+                if not batching or tokens is None or tokens > small_tokens:
+                    await queue.put([(index, doc)])
+                    continue
+                if batch and (batch_used + tokens > batch_tokens or len(batch) >= batch_files):
+                    await queue.put(batch)
+                    batch = []
+                    batch_used = 0
+                batch.append((index, doc))
+                batch_used += tokens
+            if batch:
+                await queue.put(batch)
+        finally:
+            for _ in range(num_workers):
+                await queue.put(None)
+
+    async def lookup(doc):
+        file_path, model, version = _cache_params(doc)
+        if cache is None or not file_path:
+            return None
+        content_hash = content_hashes.get(os.path.abspath(file_path))
+        if content_hash is None:
+            return await asyncio.to_thread(cache.lookup, file_path, model, version)
+        text = await asyncio.to_thread(cache.get, content_hash, model, version)
+        return {"file_path": file_path, "summary": text} if text is not None else None
+
+    async def store(doc, summary):
+        file_path, model, version = _cache_params(doc)
+        if cache is None or not file_path:
+            return
+        content_hash = content_hashes.get(os.path.abspath(file_path))
+        if content_hash is None:
+            await asyncio.to_thread(cache.store, file_path, model, version, summary)
+        elif summary.get("summary"):
+            await asyncio.to_thread(cache.put, content_hash, model, version, summary["summary"])
+
+    async def summarize(items):
+        done = []
+        missing = []
+        for index, doc in items:
+            cached = await lookup(doc)
+            if cached is not None:
+                progress.advance(_cache_params(doc)[0], cached.get("summary"), cached=True)
+                done.append((index, doc, cached))
+            else:
+                missing.append((index, doc))
+
+        if len(missing) > 1:
+            try:
+                summaries = await summarize_document_batch(
+                    [doc for _, doc in missing], provider, limiters.get(provider.name)
+                )
+            except Exception as e:
+                logger.warning(f"Error summarizing a batch of {len(missing)} files: {e}")
+                summaries = [e] * len(missing)
+        else:
+            summaries = []
+            for _, doc in missing:
+                try:
+                    summaries.append(await dispatch_summarize_document(doc, provider, image_provider, limiters))
+                except Exception as e:
+                    logger.warning(f"Error summarizing {_cache_params(doc)[0]}: {e}")
+                    summaries.append(e)
+        for (index, doc), summary in zip(missing, summaries):
+            if isinstance(summary, Exception):
+                # Failed files get an empty summary, which is not cached
+                summary = {"file_path": _cache_params(doc)[0], "summary": ""}
+                progress.advance(summary["file_path"], failed=True)
+            else:
+                await store(doc, summary)
+                progress.advance(summary.get("file_path"), summary.get("summary"))
+            done.append((index, doc, summary))
+        return done
+
+    async def work():
+        try:
+            while True:
+                items = await queue.get()
+                if items is None:
+                    return
+                for result in await summarize(items):
+                    await results.put(result)
+        finally:
+            await results.put(None)
+
+    tasks = [asyncio.create_task(produce())]
+    tasks += [asyncio.create_task(work()) for _ in range(num_workers)]
+    try:
+        finished = 0
+        while finished < num_workers:
+            item = await results.get()
+            if item is None:
+                finished += 1
+                continue
+            yield item
+        # Surface the first worker error, if any
+        await asyncio.gather(*tasks)
+        progress.finish()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _enumerate_documents(documents):
+    """Enumerate a list or an async iterable of documents"""
+    if hasattr(documents, "__aiter__"):
+        index = 0
+        async for doc in documents:
+            yield index, doc
+            index += 1
     else:
-        raise ValueError("Document type not supported")
+        for index, doc in enumerate(documents):
+            yield index, doc
 
 
-async def get_summaries(documents):
-    client = Groq(
-        api_key=os.environ.get("GROQ_API_KEY"),
-    )
-    summaries = await asyncio.gather(
-        *[dispatch_summarize_document(doc, client) for doc in documents]
-    )
-    return summaries
+async def get_summaries(documents, max_concurrency=None, total=None):
+    """Summarize documents concurrently and return the results in document order."""
+    summaries = {}
+    async for index, _, summary in iter_summaries(documents, max_concurrency, total):
+        summaries[index] = summary
+    return [summaries[index] for index in sorted(summaries)]
 
 
 @agentops.record_function("merge")
@@ -214,225 +665,35 @@ def merge_summary_documents(summaries, metadata_list):
     return file_list
 
 
-################################################################################################
-# Non-async versions of the functions                                                        #
-################################################################################################
-
-
-def get_file_summary(path: str):
-    client = Groq(
-        api_key=os.environ.get("GROQ_API_KEY"),
-    )
-    reader = SimpleDirectoryReader(input_files=[path]).iter_data()
-
-    docs = next(reader)
-    splitter = TokenTextSplitter(chunk_size=6144)
-    text = splitter.split_text("\n".join([d.text for d in docs]))[0]
-    doc = Document(text=text, metadata=docs[0].metadata)
-    summary = dispatch_summarize_document_sync(doc, client)
-    return summary
-
-
-def dispatch_summarize_document_sync(doc, client):
-    if isinstance(doc, ImageDocument):
-        return summarize_image_document_sync(doc, client)
-    elif isinstance(doc, Document):
-        return summarize_document_sync({"content": doc.text, **doc.metadata}, client)
-    else:
-        raise ValueError("Document type not supported")
-
-
-def summarize_document_sync(doc, client):
-    PROMPT = """
-You will be provided with the contents of a file along with its metadata. Provide a summary of the contents. The purpose of the summary is to organize files based on their content. To this end provide a concise but informative summary. Make the summary as specific to the file as possible.
-
-Write your response a JSON object with the following schema:
-    
-```json 
-{
-    "file_path": "path to the file including name",
-    "summary": "summary of the content"
-}
-```
-""".strip()
-
-    chat_completion = client.chat.completions.create(
-        messages=[
-            {"role": "system", "content": PROMPT},
-            {"role": "user", "content": json.dumps(doc)},
-        ],
-        model="llama-3.1-70b-versatile",
-        response_format={"type": "json_object"},
-        temperature=0,
-    )
-    summary = json.loads(chat_completion.choices[0].message.content)
-
-    try:
-        # Print the filename in green
-        print(colored(summary["file_path"], "green"))
-        print(summary["summary"])  # Print the summary of the contents
-        # Print a separator line with spacing for readability
-        print("-" * 80 + "\n")
-    except KeyError as e:
-        print(e)
-        print(summary)
-
-    return summary
-
-
-def summarize_image_document_sync(doc: ImageDocument, client):
-    client = ollama.Client()
-    chat_completion = client.chat(
-        messages=[
-            {
-                "role": "user",
-                "content": "Summarize the contents of this image.",
-                "images": [doc.image_path],
-            },
-        ],
-        model="moondream",
-        # format="json",
-        # stream=True,
-        options={"num_predict": 128},
-    )
-
-    summary = {
-        "file_path": doc.image_path,
-        "summary": chat_completion["message"]["content"],
-    }
-
-    # Print the filename in green
-    print(colored(summary["file_path"], "green"))
-    print(summary["summary"])  # Print the summary of the contents
-    # Print a separator line with spacing for readability
-    print("-" * 80 + "\n")
-
-    return summary
-
-
-"""
-File loader and summarizer for Sorting Hat
-"""
-import os
-import asyncio
-from pathlib import Path
-
-async def get_file_summary(file_path):
+async def get_file_summary(path: str):
     """
-    Get summary information about a file.
-    
-    Args:
-        file_path: Path to the file to summarize
-        
-    Returns:
-        Dictionary with file information
-    """
-    if not os.path.exists(file_path):
-        return {"file_path": file_path, "summary": "File not found"}
-    
-    try:
-        file_size = os.path.getsize(file_path)
-        is_binary = _is_binary(file_path)
-        extension = os.path.splitext(file_path)[1].lower()
-        
-        # For text files, extract a sample
-        sample_text = ""
-        if not is_binary and file_size < 1024 * 1024:  # Skip files larger than 1MB
-            try:
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    sample_text = f.read(2000)  # First 2000 chars as sample
-            except Exception:
-                sample_text = "Error extracting file content"
-        
-        rel_path = os.path.basename(file_path)
-        
-        return {
-            "file_path": rel_path,
-            "size": file_size,
-            "is_binary": is_binary,
-            "extension": extension,
-            "summary": _generate_summary(rel_path, file_size, extension, is_binary, sample_text)
-        }
-    except Exception as e:
-        return {"file_path": file_path, "summary": f"Error processing file: {str(e)}"}
+    Summarize a single file.
 
-async def get_dir_summaries(directory):
+    Runs the fast path, the summary cache, text extraction (on the parse
+    pool) and the model call without blocking the event loop, so callers
+    can cancel the task when the file changes again before it finishes.
     """
-    Get summaries for all files in a directory.
-    
-    Args:
-        directory: Directory to scan
-        
-    Returns:
-        List of file summaries
-    """
-    files = []
-    for root, _, filenames in os.walk(directory):
-        for filename in filenames:
-            file_path = os.path.join(root, filename)
-            rel_path = os.path.relpath(file_path, directory)
-            if _should_process_file(file_path, rel_path):
-                files.append(file_path)
-    
-    # Process files concurrently
-    tasks = [get_file_summary(file) for file in files]
-    return await asyncio.gather(*tasks)
-
-def _is_binary(file_path):
-    """Check if a file is binary by looking at the first few bytes."""
-    try:
-        with open(file_path, 'rb') as f:
-            chunk = f.read(1024)
-            return b'\0' in chunk
-    except:
-        return True
-
-def _should_process_file(file_path, rel_path):
-    """Determine if a file should be processed based on its path."""
-    # Skip hidden files and folders
-    if rel_path.startswith('.') or '/.git/' in rel_path:
-        return False
-    
-    # Skip common system files
-    if rel_path in ['.DS_Store', 'Thumbs.db']:
-        return False
-        
-    try:
-        # Skip files we can't access
-        if not os.access(file_path, os.R_OK):
-            return False
-    except:
-        return False
-        
-    return True
-
-def _generate_summary(file_path, file_size, extension, is_binary, sample_text):
-    """Generate a human-readable summary of the file."""
-    summary = []
-    
-    # Basic file info
-    summary.append(f"Filename: {os.path.basename(file_path)}")
-    
-    # Size with appropriate unit
-    if file_size < 1024:
-        summary.append(f"Size: {file_size} bytes")
-    elif file_size < 1024 * 1024:
-        summary.append(f"Size: {file_size / 1024:.2f} KB")
+    classifier = get_fast_path()
+    if classifier is not None:
+        resolved = await asyncio.to_thread(classifier.classify, path)
+        if resolved is not None:
+            return resolved
+
+    cache = _get_cache()
+    model, version = _path_cache_params(path)
+    if cache is not None:
+        cached = await asyncio.to_thread(cache.lookup, path, model, version)
+        if cached is not None:
+            return cached
+
+    if can_extract(path):
+        text, metadata = await asyncio.get_running_loop().run_in_executor(
+            _get_parse_pool(), extract_document, path
+        )
+        doc = Document(text=text, metadata=metadata)
     else:
-        summary.append(f"Size: {file_size / (1024 * 1024):.2f} MB")
-    
-    # File type info
-    summary.append(f"Type: {extension[1:].upper() if extension else 'Unknown'}")
-    
-    # Content type
-    if is_binary:
-        summary.append("Content: Binary file")
-    else:
-        # For text files, add first line as a hint
-        if sample_text:
-            first_line = sample_text.strip().split('\n')[0][:50]
-            if first_line:
-                summary.append(f"First line: {first_line}")
-    
-    # Join all parts with spaces
-    return ". ".join(summary)
+        doc = (await asyncio.to_thread(load_documents, os.path.dirname(path), [path]))[0]
+    summary = await dispatch_summarize_document(doc)
+    if cache is not None:
+        await asyncio.to_thread(cache.store, path, model, version, summary)
+    return summary
@@ -0,0 +1,220 @@
+"""
+File move engine
+
+Moves within one filesystem are a single `os.rename`. Moves across
+filesystems (e.g. from ~/Downloads to a NAS-backed OrganizeFolder share)
+are copied with the kernel's zero-copy paths (`os.copy_file_range`, then
+`os.sendfile`, then plain reads and writes), written to a temporary
+name, verified by checksum, and only then renamed into place and the
+source deleted. Copy throughput can be capped, with a separate cap
+during working hours, so bulk reorganizations don't saturate the disk
+or the network.
+"""
+import errno
+import hashlib
+import os
+import shutil
+import threading
+import time
+from typing import Optional
+
+from src.config import config
+from src.error_handler import get_logger
+
+logger = get_logger(__name__)
+
+PARTIAL_SUFFIX = ".sortinghat-partial"
+
+# Errors after which a zero-copy call is abandoned for the next method
+_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF, errno.ENOTSUP}
+
+
+class Throttle:
+    """Byte rate limit shared by all copy workers"""
+
+    def __init__(self, bytes_per_second: Optional[float] = None,
+                 work_hours_bytes_per_second: Optional[float] = None, work_hours=None):
+        """
+        Initialize the Throttle
+
+        Args:
+            bytes_per_second: Cap outside working hours (None for unlimited)
+            work_hours_bytes_per_second: Cap during working hours (None to use `bytes_per_second`)
+            work_hours: (start hour, end hour) in local time, or None
+        """
+        self.bytes_per_second = bytes_per_second
+        self.work_hours_bytes_per_second = work_hours_bytes_per_second
+        self.work_hours = tuple(work_hours) if work_hours else None
+        self._allowance = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def rate(self) -> Optional[float]:
+        """Cap that applies right now"""
+        if self.work_hours and self.work_hours_bytes_per_second:
+            start, end = self.work_hours
+            if start <= time.localtime().tm_hour < end:
+                return self.work_hours_bytes_per_second
+        return self.bytes_per_second
+
+    def consume(self, amount: int) -> None:
+        """Account for `amount` bytes copied, sleeping to stay under the cap"""
+        rate = self.rate()
+        if not rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            # Up to one second of unused allowance can be carried over
+            self._allowance = min(rate, self._allowance + (now - self._updated) * rate) - amount
+            self._updated = now
+            delay = -self._allowance / rate if self._allowance < 0 else 0.0
+        if delay > 0:
+            time.sleep(delay)
+
+
+def checksum(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _copy_data(src_fd: int, dst_fd: int, size: int, chunk_size: int, throttle: Throttle) -> None:
+    """Copy `size` bytes between file descriptors, in kernel space when possible"""
+    copied = 0
+    for method in ("copy_file_range", "sendfile"):
+        function = getattr(os, method, None)
+        if function is None:
+            continue
+        try:
+            while copied < size:
+                if method == "copy_file_range":
+                    count = function(src_fd, dst_fd, min(chunk_size, size - copied))
+                else:
+                    count = function(dst_fd, src_fd, copied, min(chunk_size, size - copied))
+                if count == 0:
+                    break
+                copied += count
+                throttle.consume(count)
+            return
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED or copied:
+                raise
+    # Portable fallback
+    while True:
+        data = os.read(src_fd, chunk_size)
+        if not data:
+            return
+        view = memoryview(data)
+        while view:
+            # os.write may write less than it was given
+            view = view[os.write(dst_fd, view):]
+        throttle.consume(len(data))
+
+
+class MoveEngine:
+    """Renames in place or copies, verifies and deletes across filesystems"""
+
+    def __init__(self, verify: Optional[bool] = None, chunk_size: Optional[int] = None,
+                 throttle: Optional[Throttle] = None):
+        """
+        Initialize the MoveEngine
+
+        Args:
+            verify: Compare checksums before deleting a source (defaults to `move_engine.verify`)
+            chunk_size: Bytes per copy call
+            throttle: Byte rate limit (defaults to the configured caps)
+        """
+        self.verify = verify if verify is not None else config.get("move_engine.verify", True)
+        self.chunk_size = chunk_size or config.get("move_engine.chunk_mb", 8) * 1024 * 1024
+        self.throttle = throttle or Throttle(
+            config.get("move_engine.bytes_per_second"),
+            config.get("move_engine.work_hours_bytes_per_second"),
+            config.get("move_engine.work_hours"),
+        )
+
+    @staticmethod
+    def same_device(src: str, dst: str) -> bool:
+        """Whether `src` can be renamed to `dst` (whose directory must exist)"""
+        return os.stat(src).st_dev == os.stat(os.path.dirname(os.path.abspath(dst))).st_dev
+
+    def copy_file(self, src: str, dst: str) -> str:
+        """
+        Copy one file through a temporary name, verifying it before it appears at `dst`
+
+        Returns:
+            `dst`
+        """
+        partial = dst + PARTIAL_SUFFIX
+        try:
+            with open(src, "rb") as fsrc, open(partial, "wb") as fdst:
+                _copy_data(fsrc.fileno(), fdst.fileno(), os.fstat(fsrc.fileno()).st_size,
+                           self.chunk_size, self.throttle)
+                fdst.flush()
+                os.fsync(fdst.fileno())
+            shutil.copystat(src, partial)
+            if self.verify and checksum(src) != checksum(partial):
+                raise OSError(errno.EIO, f"Checksum mismatch copying {src}", dst)
+            os.replace(partial, dst)
+        except BaseException:
+            try:
+                os.unlink(partial)
+            except OSError:
+                pass
+            raise
+        return dst
+
+    def move(self, src: str, dst: str) -> str:
+        """
+        Move a file or directory; the destination's parent must exist
+
+        Returns:
+            "renamed" or "copied"
+        """
+        if self.same_device(src, dst):
+            os.rename(src, dst)
+            return "renamed"
+        if os.path.isdir(src) and not os.path.islink(src):
+            shutil.copytree(src, dst, symlinks=True, copy_function=self.copy_file)
+            shutil.rmtree(src)
+        elif os.path.islink(src):
+            os.symlink(os.readlink(src), dst)
+            os.unlink(src)
+        else:
+            self.copy_file(src, dst)
+            os.unlink(src)
+        logger.debug(f"Copied across devices: {src} -> {dst}")
+        return "copied"
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_move_engine() -> MoveEngine:
+    """Get the shared move engine"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = MoveEngine()
+        return _engine
+
+
+def move_file(src: str, dst: str) -> str:
+    """
+    Move a file like `shutil.move`, through the shared engine
+
+    A file moved onto an existing directory goes inside it, and the
+    destination directory is created if needed.
+
+    Returns:
+        The final destination path
+    """
+    if os.path.isdir(dst) and not os.path.isdir(src):
+        dst = os.path.join(dst, os.path.basename(src))
+    directory = os.path.dirname(os.path.abspath(dst))
+    os.makedirs(directory, exist_ok=True)
+    get_move_engine().move(src, dst)
+    return dst
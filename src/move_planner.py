@@ -0,0 +1,551 @@
+"""
+Journaled bulk moves
+
+Applies a whole reorganization plan (a list of src_path -> dst_path moves)
+as one transaction instead of one request per file:
+
+- the plan is validated up front (sources exist, destinations are unique,
+  stay inside the base directory and don't overwrite files the plan
+  doesn't move away);
+- moves are ordered so a destination is vacated before it is reused;
+  chains are followed and swaps or longer cycles are broken through a
+  temporary name;
+- every destination directory is created once, before any file moves;
+- files are renamed with `os.rename` when source and destination share a
+  filesystem; cross-device moves are copied, verified and deleted by the
+  move engine on a worker pool, concurrently with later steps that don't
+  touch the same paths;
+- an append-only JSON Lines journal records the plan and each finished
+  step, so after a crash the transaction can be rolled forward or back
+  with `recover`. The journal is deleted once the transaction has
+  committed or been fully rolled back.
+
+Run `python -m src.move_planner` to measure apply time and recovery on a
+synthetic tree.
+"""
+import json
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+import time
+import uuid
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from src.config import config
+from src.error_handler import FileOperationError, get_logger
+from src.move_engine import MoveEngine, get_move_engine
+
+logger = get_logger(__name__)
+
+TEMP_SUFFIX = ".sortinghat-tmp"
+
+
+class Step(NamedTuple):
+    """One rename of the ordered plan (absolute paths)"""
+    src: str
+    dst: str
+
+
+class PlanError(ValueError):
+    """The plan cannot be applied as given"""
+
+    def __init__(self, problems: List[Dict]):
+        super().__init__(f"{len(problems)} problem(s) in move plan")
+        self.problems = problems
+
+
+def _inside(path: str, base: str) -> bool:
+    return path == base or path.startswith(os.path.join(base, ""))
+
+
+def plan_moves(base_path: str, moves: Iterable[Dict]) -> Dict:
+    """
+    Validate and order a move plan
+
+    Args:
+        base_path: Directory the paths are relative to
+        moves: Dictionaries with "src_path" and "dst_path" relative to base_path.
+            A file moved onto an existing directory goes inside it.
+
+    Returns:
+        Dictionary with "steps" (ordered Step list) and "directories" (the
+        destination directories that don't exist yet, parents first)
+
+    Raises:
+        PlanError: Listing every problem found
+    """
+    base = os.path.abspath(base_path)
+    problems = []
+    pairs = []
+    for move in moves:
+        src = os.path.abspath(os.path.join(base, move["src_path"]))
+        dst = os.path.abspath(os.path.join(base, move["dst_path"]))
+        if not _inside(src, base) or not _inside(dst, base):
+            problems.append({"move": move, "error": "Path is outside the base directory"})
+            continue
+        if not os.path.lexists(src):
+            problems.append({"move": move, "error": "Source path does not exist"})
+            continue
+        if os.path.isdir(dst) and not os.path.isdir(src):
+            dst = os.path.join(dst, os.path.basename(src))
+        if src != dst:
+            pairs.append((src, dst, move))
+
+    by_src = {}
+    by_dst = {}
+    for src, dst, move in pairs:
+        if src in by_src:
+            problems.append({"move": move, "error": "Source path is moved twice"})
+        elif dst in by_dst:
+            problems.append({"move": move, "error": f"Destination is also the target of {by_dst[dst][2]['src_path']}"})
+        else:
+            # [current source, destination, move, original source]
+            by_src[src] = [src, dst, move, src]
+            by_dst[dst] = by_src[src]
+    for src, dst, move, _ in list(by_src.values()):
+        # A destination may only exist if the plan moves it away first
+        if os.path.lexists(dst) and dst not in by_src:
+            problems.append({"move": move, "error": "Destination already exists"})
+        if os.path.isdir(src) and any(_inside(other, src) and other != src for other in by_src):
+            problems.append({"move": move, "error": "Directory is moved together with its contents"})
+    if problems:
+        raise PlanError(problems)
+
+    # Each move waits for the move that vacates its destination; since
+    # destinations are unique every move has at most one such blocker, so
+    # the dependencies form chains and simple cycles.
+    steps = []
+    state = {}
+    for start in list(by_src):
+        # Follow the chain of blockers, then emit it from its far end
+        chain = []
+        key = start
+        while key not in state:
+            state[key] = "visiting"
+            chain.append(key)
+            blocker = by_src.get(by_src[key][1])
+            if blocker is None:
+                break
+            if state.get(blocker[3]) == "visiting":
+                # Cycle: park the blocking file under a temporary name
+                temp = _temp_name(blocker[0])
+                steps.append(Step(blocker[0], temp))
+                blocker[0] = temp
+                break
+            key = blocker[3]
+        for key in reversed(chain):
+            entry = by_src[key]
+            steps.append(Step(entry[0], entry[1]))
+            state[key] = "done"
+
+    # Every missing directory, ancestors included, so a rollback can remove them all
+    directories = set()
+    for step in steps:
+        directory = os.path.dirname(step.dst)
+        while directory not in directories and not os.path.isdir(directory):
+            directories.add(directory)
+            directory = os.path.dirname(directory)
+    return {"steps": steps, "directories": sorted(directories)}
+
+
+def _temp_name(path: str) -> str:
+    return f"{path}.{uuid.uuid4().hex[:8]}{TEMP_SUFFIX}"
+
+
+def journal_dir() -> str:
+    """Directory holding the move journals"""
+    path = os.path.join(config.get("paths.data_dir"), "move_journals")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class MoveTransaction:
+    """Applies an ordered plan and journals its progress"""
+
+    def __init__(self, base_path: str, steps: List[Step], directories: List[str],
+                 journal_path: Optional[str] = None, transaction_id: Optional[str] = None,
+                 engine: Optional[MoveEngine] = None, max_workers: Optional[int] = None):
+        """
+        Initialize the MoveTransaction
+
+        Args:
+            base_path: Directory the plan was made for
+            steps: Ordered steps from `plan_moves`
+            directories: Directories to create before moving
+            journal_path: Journal file (defaults to data_dir/move_journals/<id>.jsonl);
+                set to None once the transaction is settled and it is deleted
+            transaction_id: Identifier of the transaction
+            engine: Engine for cross-device moves (defaults to the shared one)
+            max_workers: Concurrent cross-device copies (defaults to `move_engine.max_workers`)
+        """
+        self.base_path = os.path.abspath(base_path)
+        self.steps = list(steps)
+        self.directories = list(directories)
+        self.id = transaction_id or time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:8]
+        self.journal_path = journal_path or os.path.join(journal_dir(), f"{self.id}.jsonl")
+        self.done = set()
+        self.created = []
+        self.stats = {"renamed": 0, "copied": 0, "directories_created": 0}
+        self.engine = engine or get_move_engine()
+        self.max_workers = max_workers or config.get("move_engine.max_workers", 4)
+        self._devices = {}
+        self._journal = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_plan(cls, base_path: str, moves: Iterable[Dict]) -> "MoveTransaction":
+        """Validate and order `moves` (see `plan_moves`)"""
+        plan = plan_moves(base_path, moves)
+        return cls(base_path, plan["steps"], plan["directories"])
+
+    def _write(self, record: Dict, sync: bool = False) -> None:
+        with self._lock:
+            if self._journal is None:
+                self._journal = open(self.journal_path, "a", encoding="utf-8")
+            self._journal.write(json.dumps(record) + "\n")
+            self._journal.flush()
+            if sync:
+                os.fsync(self._journal.fileno())
+
+    def _close(self) -> None:
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+    def _discard_journal(self) -> None:
+        """Delete the journal of a committed or fully rolled back transaction"""
+        self._close()
+        if self.journal_path is None:
+            return
+        try:
+            os.remove(self.journal_path)
+        except OSError as e:
+            logger.warning(f"Could not delete move journal {self.journal_path}: {e}")
+            return
+        self.journal_path = None
+
+    def _same_device(self, src: str, dst: str) -> bool:
+        directory = os.path.dirname(dst)
+        device = self._devices.get(directory)
+        if device is None:
+            device = self._devices[directory] = os.stat(directory).st_dev
+        return os.stat(src).st_dev == device
+
+    def _move(self, src: str, dst: str) -> None:
+        """Move one file, renaming in place when both sides share a filesystem"""
+        if self._same_device(src, dst):
+            os.rename(src, dst)
+            kind = "renamed"
+        else:
+            kind = self.engine.move(src, dst)
+        with self._lock:
+            self.stats[kind] += 1
+
+    def _finish(self, index: int) -> None:
+        with self._lock:
+            self.done.add(index)
+        self._write({"type": "done", "step": index})
+
+    def _run_step(self, index: int, step: Step) -> None:
+        self._move(step.src, step.dst)
+        self._finish(index)
+
+    def _run_steps(self) -> None:
+        """
+        Run the steps in order, copying across devices in the background
+
+        A step waits only for in-flight copies that read or write one of its
+        paths, which covers every ordering constraint of the plan.
+        """
+        inflight = {}
+        executor = None
+        try:
+            for index, step in enumerate(self.steps):
+                for path in (step.src, step.dst):
+                    future = inflight.pop(path, None)
+                    if future is not None:
+                        future.result()
+                if self._same_device(step.src, step.dst):
+                    self._run_step(index, step)
+                    continue
+                if executor is None:
+                    executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="move")
+                future = executor.submit(self._run_step, index, step)
+                inflight[step.src] = inflight[step.dst] = future
+            for future in set(inflight.values()):
+                future.result()
+        finally:
+            # Let every copy settle before a rollback looks at the tree
+            wait(set(inflight.values()))
+            if executor is not None:
+                executor.shutdown()
+
+    def apply(self, rollback_on_error: bool = True) -> Dict:
+        """
+        Apply the plan
+
+        The plan is written (and synced) to the journal before anything is
+        touched, then each step is journaled as it finishes. The journal is
+        deleted once the plan is committed or rolled back; it is only kept
+        for `recover` when the transaction is left unfinished.
+
+        Args:
+            rollback_on_error: Undo the steps already applied if one fails;
+                otherwise stop and leave the journal for `recover`
+
+        Returns:
+            Result dictionary with the status, counts and elapsed time
+
+        Raises:
+            FileOperationError: If a step fails (after rolling back, if requested)
+        """
+        started = time.perf_counter()
+        self._write({
+            "type": "plan",
+            "id": self.id,
+            "base_path": self.base_path,
+            "timestamp": time.time(),
+            "directories": self.directories,
+            "steps": [list(step) for step in self.steps],
+        }, sync=True)
+        try:
+            for directory in self.directories:
+                if not os.path.isdir(directory):
+                    os.makedirs(directory, exist_ok=True)
+                    self.created.append(directory)
+            self.stats["directories_created"] = len(self.created)
+            self._run_steps()
+        except Exception as e:
+            logger.error(f"Move {self.id} failed after {len(self.done)} of {len(self.steps)} steps: {e}")
+            if rollback_on_error:
+                self.rollback()
+            else:
+                self._close()
+            raise FileOperationError(
+                message=f"Move failed after {len(self.done)} of {len(self.steps)} steps: {e}",
+                operation="commit",
+                path=self.journal_path or self.base_path,
+            ) from e
+        self._write({"type": "commit", "timestamp": time.time()}, sync=True)
+        self._discard_journal()
+        return self.result("committed", started)
+
+    def rollback(self) -> None:
+        """
+        Undo the applied steps in reverse order and remove the directories created
+
+        The journal is kept if a step could not be undone.
+        """
+        for index in sorted(self.done, reverse=True):
+            step = self.steps[index]
+            try:
+                self._move(step.dst, step.src)
+                self.done.discard(index)
+                self._write({"type": "undone", "step": index})
+            except Exception as e:
+                logger.error(f"Could not undo {step.dst} -> {step.src}: {e}")
+        for directory in reversed(self.created):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
+        if not self.done:
+            self._write({"type": "rolled_back", "timestamp": time.time()}, sync=True)
+            self._discard_journal()
+        else:
+            self._close()
+
+    def result(self, status: str, started: float) -> Dict:
+        return {
+            "status": status,
+            "id": self.id,
+            "moved": len(self.done),
+            **self.stats,
+            "elapsed_seconds": round(time.perf_counter() - started, 4),
+            "journal": self.journal_path,
+        }
+
+
+def read_journal(journal_path: str) -> Dict:
+    """
+    Load a journal
+
+    Returns:
+        Dictionary with "plan" (the plan record), "done" (set of finished
+        step indices) and "state" ("pending", "committed" or "rolled_back")
+    """
+    plan = None
+    done = set()
+    state = "pending"
+    with open(journal_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A torn last line from a crash
+                continue
+            kind = record.get("type")
+            if kind == "plan":
+                plan = record
+            elif kind == "done":
+                done.add(record["step"])
+            elif kind == "undone":
+                done.discard(record["step"])
+            elif kind == "commit":
+                state = "committed"
+            elif kind == "rolled_back":
+                state = "rolled_back"
+    return {"plan": plan, "done": done, "state": state}
+
+
+def pending_journals() -> List[str]:
+    """Journals of transactions that neither committed nor rolled back"""
+    paths = []
+    for name in sorted(os.listdir(journal_dir())):
+        path = os.path.join(journal_dir(), name)
+        if name.endswith(".jsonl") and read_journal(path)["state"] == "pending":
+            paths.append(path)
+    return paths
+
+
+def recover(journal_path: str, direction: str = "back") -> Dict:
+    """
+    Finish or undo an interrupted transaction
+
+    A step missing from the journal may still have happened just before
+    the crash, so each step's state is taken from the filesystem: it is
+    applied if its source is gone and its destination exists.
+
+    The journal is deleted once the transaction is settled, as is the
+    journal of a transaction that had already settled.
+
+    Args:
+        journal_path: Journal of the transaction
+        direction: "forward" to apply the remaining steps, "back" to undo the applied ones
+
+    Returns:
+        Result dictionary (see `MoveTransaction.apply`)
+    """
+    if direction not in ("forward", "back"):
+        raise ValueError(f"Unknown recovery direction: {direction}")
+    journal = read_journal(journal_path)
+    plan = journal["plan"]
+    if plan is None:
+        raise FileOperationError(message="Journal has no plan", operation="recover", path=journal_path)
+    started = time.perf_counter()
+    transaction = MoveTransaction(
+        plan["base_path"],
+        [Step(*step) for step in plan["steps"]],
+        plan["directories"],
+        journal_path=journal_path,
+        transaction_id=plan["id"],
+    )
+    if journal["state"] != "pending":
+        transaction._discard_journal()
+        return transaction.result(journal["state"], started)
+
+    for index, step in enumerate(transaction.steps):
+        if index in journal["done"] or (not os.path.lexists(step.src) and os.path.lexists(step.dst)):
+            transaction.done.add(index)
+    logger.info(f"Recovering move {transaction.id} {direction}: "
+                f"{len(transaction.done)} of {len(transaction.steps)} steps applied")
+
+    if direction == "back":
+        # Directories that are empty once the files are back were created by the plan
+        transaction.created = [d for d in plan["directories"] if os.path.isdir(d)]
+        transaction.rollback()
+        return transaction.result("rolled_back", started)
+
+    for directory in transaction.directories:
+        os.makedirs(directory, exist_ok=True)
+    for index, step in enumerate(transaction.steps):
+        if index in transaction.done:
+            continue
+        transaction._move(step.src, step.dst)
+        transaction._finish(index)
+    transaction._write({"type": "commit", "timestamp": time.time()}, sync=True)
+    transaction._discard_journal()
+    return transaction.result("committed", started)
+
+
+def benchmark(files: int = 3000, directories: int = 30) -> Dict:
+    """
+    Measure apply time, rollback after a failure and crash recovery on a temporary tree
+
+    Returns:
+        Timings in seconds
+    """
+    import tempfile
+
+    class FailingTransaction(MoveTransaction):
+        fail_at = None
+
+        def _move(self, src, dst):
+            if self.fail_at is not None and len(self.done) == self.fail_at:
+                self.fail_at = None
+                raise OSError("Injected failure")
+            super()._move(src, dst)
+
+    results = {"files": files}
+    with tempfile.TemporaryDirectory() as root:
+        names = [f"file{i}.txt" for i in range(files)]
+        for name in names:
+            with open(os.path.join(root, name), "w") as f:
+                f.write(name)
+        moves = [{"src_path": name, "dst_path": f"dir{i % directories}/{name}"} for i, name in enumerate(names)]
+        # A swap and a three-file cycle
+        moves[:2] = [{"src_path": names[0], "dst_path": names[1]}, {"src_path": names[1], "dst_path": names[0]}]
+        moves[2:5] = [{"src_path": names[2], "dst_path": names[3]}, {"src_path": names[3], "dst_path": names[4]},
+                      {"src_path": names[4], "dst_path": names[2]}]
+
+        start = time.perf_counter()
+        plan = plan_moves(root, moves)
+        results["plan_seconds"] = time.perf_counter() - start
+
+        transaction = FailingTransaction(root, plan["steps"], plan["directories"],
+                                         journal_path=os.path.join(root, "failed.jsonl"))
+        transaction.fail_at = files // 2
+        start = time.perf_counter()
+        try:
+            transaction.apply()
+        except FileOperationError:
+            pass
+        results["failed_apply_and_rollback_seconds"] = time.perf_counter() - start
+        results["rollback_restored_tree"] = sorted(os.listdir(root)) == sorted(names)
+
+        transaction = FailingTransaction(root, plan["steps"], plan["directories"],
+                                         journal_path=os.path.join(root, "crashed.jsonl"))
+        transaction.fail_at = files // 2
+        try:
+            transaction.apply(rollback_on_error=False)
+        except FileOperationError:
+            pass
+        start = time.perf_counter()
+        recover(transaction.journal_path, "forward")
+        results["recover_forward_seconds"] = time.perf_counter() - start
+
+        with open(os.path.join(root, names[0])) as f:
+            results["swap_applied"] = f.read() == names[1]
+        results["recovered_tree_complete"] = sum(len(files) for _, _, files in os.walk(root)) == len(names)
+
+        # Fresh tree for a clean end-to-end apply
+        for directory in {os.path.dirname(step.dst) for step in plan["steps"]} - {root}:
+            shutil.rmtree(directory)
+        for name in os.listdir(root):
+            os.remove(os.path.join(root, name))
+        for name in names:
+            with open(os.path.join(root, name), "w") as f:
+                f.write(name)
+        start = time.perf_counter()
+        transaction = MoveTransaction.from_plan(root, moves)
+        transaction.journal_path = os.path.join(root, "apply.jsonl")
+        transaction.apply()
+        results["apply_seconds"] = time.perf_counter() - start
+    return results
+
+
+if __name__ == "__main__":
+    for key, value in benchmark().items():
+        print(f"{key}: {round(value, 4) if isinstance(value, float) else value}")
@@ -0,0 +1,196 @@
+"""
+Collision-free destination names
+
+When a destination name is taken, files get a counter suffix
+(`IMG_0001.jpg`, `IMG_0001_1.jpg`, `IMG_0001_2.jpg`, ...). Probing
+`base_1`, `base_2`, ... with a stat call each is quadratic when hundreds of
+files share a name. `NameAllocator` lists each destination directory once,
+remembers the names it has handed out and keeps the next free counter per
+(directory, base name, extension), so each allocation is O(1) amortized.
+
+A planning allocator (`verify=False`) works purely in memory, so a whole
+reorganization can be computed and previewed before anything moves. The
+shared allocator (`verify=True`) also confirms each name with one stat, so
+files created by other programs since the directory was listed are still
+never overwritten. Names handed out stay taken until they are handed
+back with `release`, e.g. after a failed move.
+
+Run `python -m src.name_allocator` for a microbenchmark against probing.
+"""
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Set, Tuple, Union
+
+
+class NameAllocator:
+    """Hands out unique file paths, listing each directory at most once"""
+
+    def __init__(self, verify: bool = True, max_directories: int = 1024):
+        """
+        Initialize the NameAllocator
+
+        Args:
+            verify: Confirm each name on disk before handing it out; set to
+                False to plan against the listings alone
+            max_directories: Directory listings kept before the memo is cleared
+        """
+        self.verify = verify
+        self.max_directories = max_directories
+        self._names: Dict[str, Set[str]] = {}
+        self._reserved: Dict[str, Set[str]] = {}
+        self._counters: Dict[Tuple[str, str, str], int] = {}
+        # Counter each suffixed name was handed out with, so release can rewind it
+        self._suffixes: Dict[Tuple[str, str], Tuple[Tuple[str, str, str], int]] = {}
+        self._lock = threading.Lock()
+
+    def _listing(self, directory: str) -> Set[str]:
+        """Names in a directory (normcased), listed on first use"""
+        names = self._names.get(directory)
+        if names is None:
+            if len(self._names) >= self.max_directories:
+                self._names.clear()
+                self._reserved.clear()
+                self._counters.clear()
+                self._suffixes.clear()
+            try:
+                with os.scandir(directory) as entries:
+                    names = {os.path.normcase(entry.name) for entry in entries}
+            except OSError:
+                names = set()
+            self._names[directory] = names
+            self._reserved[directory] = set()
+        return names
+
+    def _take(self, directory: str, name: str) -> None:
+        key = os.path.normcase(name)
+        self._names[directory].add(key)
+        self._reserved[directory].add(key)
+
+    def reserve(self, path: Union[str, Path]) -> None:
+        """Mark a path as taken, e.g. a destination chosen elsewhere"""
+        directory, name = os.path.split(os.path.abspath(path))
+        with self._lock:
+            self._listing(directory)
+            self._take(directory, name)
+
+    def release(self, path: Union[str, Path]) -> None:
+        """Hand back a reserved path that was not used, e.g. after a failed move"""
+        directory, name = os.path.split(os.path.abspath(path))
+        key = os.path.normcase(name)
+        with self._lock:
+            reserved = self._reserved.get(directory)
+            if reserved is None or key not in reserved:
+                return
+            reserved.discard(key)
+            self._names[directory].discard(key)
+            suffix = self._suffixes.pop((directory, key), None)
+            if suffix is not None:
+                counter_key, counter = suffix
+                self._counters[counter_key] = min(self._counters.get(counter_key, counter), counter)
+
+    def allocate(self, path: Union[str, Path], reserve: bool = True) -> str:
+        """
+        Get `path`, or `path` with the next free counter suffix
+
+        Counters only move forward: a suffix below the current counter is
+        handed out again only after `release` rewinds to it, not when its
+        file is later moved away or deleted. Reserved names count as taken
+        even in verify mode, since a planned destination doesn't exist on
+        disk until its move runs.
+
+        Args:
+            path: Wanted destination path
+            reserve: Reserve the name returned, so it is not handed out
+                again until it is released
+
+        Returns:
+            Unique path (absolute if `path` was)
+        """
+        path = str(path)
+        directory, name = os.path.split(os.path.abspath(path))
+        prefix = path[:len(path) - len(name)]
+        base, ext = os.path.splitext(name)
+        with self._lock:
+            names = self._listing(directory)
+            key = os.path.normcase(name)
+            if self.verify:
+                # A listed name may have been removed since; only names
+                # handed out here are trusted without a stat
+                free = key not in self._reserved[directory] and not os.path.lexists(path)
+            else:
+                free = key not in names
+            if free:
+                if reserve:
+                    self._take(directory, name)
+                return path
+
+            counter_key = (directory, os.path.normcase(base), os.path.normcase(ext))
+            counter = self._counters.get(counter_key, 1)
+            while True:
+                candidate = f"{base}_{counter}{ext}"
+                counter += 1
+                if os.path.normcase(candidate) in names:
+                    continue
+                if self.verify and os.path.lexists(os.path.join(directory, candidate)):
+                    names.add(os.path.normcase(candidate))
+                    continue
+                break
+            if reserve:
+                self._counters[counter_key] = counter
+                self._take(directory, candidate)
+                self._suffixes[(directory, os.path.normcase(candidate))] = (counter_key, counter - 1)
+            return prefix + candidate
+
+
+_allocator = None
+_allocator_lock = threading.Lock()
+
+
+def get_name_allocator() -> NameAllocator:
+    """Get the shared allocator, which verifies names on disk"""
+    global _allocator
+    with _allocator_lock:
+        if _allocator is None:
+            _allocator = NameAllocator()
+        return _allocator
+
+
+def _probe_unique_path(path: str) -> str:
+    """The per-file probing loop the allocator replaces, for the benchmark"""
+    if not os.path.exists(path):
+        return path
+    base, ext = os.path.splitext(path)
+    counter = 1
+    while os.path.exists(f"{base}_{counter}{ext}"):
+        counter += 1
+    return f"{base}_{counter}{ext}"
+
+
+def benchmark(files: int = 500) -> Dict[str, float]:
+    """
+    Time placing `files` files of the same name into one directory
+
+    Returns:
+        Time in seconds per implementation, and the speedup
+    """
+    import tempfile
+    import time
+
+    results = {"files": files}
+    for label, unique_path in (("probe", _probe_unique_path), ("allocator", NameAllocator().allocate)):
+        with tempfile.TemporaryDirectory() as root:
+            start = time.perf_counter()
+            for _ in range(files):
+                # Create each file, as a sorter moving it in would
+                open(unique_path(os.path.join(root, "IMG_0001.jpg")), "w").close()
+            results[f"{label}_seconds"] = time.perf_counter() - start
+            assert len(os.listdir(root)) == files
+    results["speedup"] = results["probe_seconds"] / results["allocator_seconds"]
+    return results
+
+
+if __name__ == "__main__":
+    results = benchmark()
+    print(f"{results['files']} colliding names: probing {results['probe_seconds'] * 1000:.1f} ms, "
+          f"allocator {results['allocator_seconds'] * 1000:.1f} ms ({results['speedup']:.1f}x)")
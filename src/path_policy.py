@@ -0,0 +1,256 @@
+"""
+Compiled path policy
+
+Decides whether a path may be touched: GitHub checkouts, tool directories
+(.git, node_modules, __pycache__, venv, .env), protected system folders
+(`ignore_folders`) and the `file_watching.ignore_patterns` globs are
+compiled once (a combined regex per rule kind, and a lowercase substring
+table for folder names) and matched one path component at a time. A
+verdict is memoized per directory, so checking a file costs one lookup
+of its parent plus one match of its name, and the crawler prunes
+rejected directories instead of testing every file below them.
+
+`get_path_policy` applies all of these and is for code that moves files;
+`get_ignore_policy` applies only the ignore patterns and is what the
+crawler uses by default.
+
+Run `python -m src.path_policy` for a microbenchmark against the
+uncompiled per-pattern checks.
+"""
+import fnmatch
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Union
+
+from src.config import config
+
+# Tool and repository directories that are never organized
+UNSAFE_PATTERNS = [
+    r"(^|/)\.git(/|$)",  # Git repositories
+    r"(^|/)node_modules(/|$)",  # Node.js modules
+    r"(^|/)__pycache__(/|$)",  # Python cache
+    r"(^|/)venv(/|$)",  # Python virtual environments
+    r"(^|/)\.env(/|$)",  # Environment files
+]
+
+# Verdicts
+GITHUB = "github"
+UNSAFE = "unsafe"
+SYSTEM = "system"
+IGNORED = "ignored"
+
+
+def _compile_globs(patterns) -> Optional["re.Pattern"]:
+    translated = [fnmatch.translate(p) for p in patterns]
+    return re.compile("|".join(translated)) if translated else None
+
+
+class PathPolicy:
+    """Precompiled safety and ignore rules, memoized per directory"""
+
+    def __init__(self, unsafe_patterns: Optional[Iterable[str]] = None,
+                 system_folders: Optional[Iterable[str]] = None,
+                 ignore_patterns: Optional[Iterable[str]] = None, cache_size: int = 65536,
+                 safety: bool = True):
+        """
+        Initialize the PathPolicy
+
+        Args:
+            unsafe_patterns: Regexes of unsafe path components, matched from the
+                start of each component (defaults to UNSAFE_PATTERNS)
+            system_folders: Protected folder names, matched as substrings of a
+                component ignoring case (defaults to `ignore_folders`)
+            ignore_patterns: Glob patterns; those containing "/" match the whole
+                path, the others a file or directory name (defaults to
+                `file_watching.ignore_patterns`)
+            cache_size: Directory verdicts kept before the memo is cleared
+            safety: Set to False to apply only the ignore patterns, without
+                the GitHub, unsafe and system folder rules
+        """
+        if safety:
+            unsafe_patterns = UNSAFE_PATTERNS if unsafe_patterns is None else list(unsafe_patterns)
+            system_folders = config.get("ignore_folders", []) if system_folders is None else list(system_folders)
+        else:
+            unsafe_patterns = system_folders = []
+        if ignore_patterns is None:
+            ignore_patterns = config.get("file_watching.ignore_patterns", [])
+        ignore_patterns = list(ignore_patterns)
+
+        # A few substring tests beat a regex alternation searched at every position
+        self.substrings = ((GITHUB, "github"),) if safety else ()
+        self.substrings += tuple((SYSTEM, f.lower()) for f in system_folders)
+        self.unsafe_regex = re.compile("|".join(f"(?:{p})" for p in unsafe_patterns), re.IGNORECASE) \
+            if unsafe_patterns else None
+        self.name_regex = _compile_globs(p for p in ignore_patterns if "/" not in p)
+        self.path_regex = _compile_globs(p for p in ignore_patterns if "/" in p)
+
+        self.cache_size = cache_size
+        self._dirs: Dict[tuple, Optional[str]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(path: Union[str, Path]) -> str:
+        return str(path).replace("\\", "/").rstrip("/")
+
+    def _component(self, name: str, ignore: bool) -> Optional[str]:
+        """Verdict for one file or directory name"""
+        if self.unsafe_regex is not None and self.unsafe_regex.match(name):
+            return UNSAFE
+        lowered = name.lower()
+        for verdict, substring in self.substrings:
+            if substring in lowered:
+                return verdict
+        if ignore and self.name_regex is not None and self.name_regex.match(name):
+            return IGNORED
+        return None
+
+    def directory_verdict(self, directory: str, ignore: bool = True) -> Optional[str]:
+        """
+        Verdict for a normalized directory path, memoized
+
+        Returns:
+            None if the directory is allowed, otherwise why it is not
+            ("github", "unsafe", "system" or "ignored")
+        """
+        key = (directory, ignore)
+        try:
+            return self._dirs[key]
+        except KeyError:
+            pass
+        parent, _, name = directory.rpartition("/")
+        verdict = self.directory_verdict(parent, ignore) if parent else None
+        if verdict is None and name:
+            verdict = self._component(name, ignore)
+        if verdict is None and ignore and self.path_regex is not None and self.path_regex.match(directory + "/"):
+            verdict = IGNORED
+        with self._lock:
+            if len(self._dirs) >= self.cache_size:
+                self._dirs.clear()
+            self._dirs[key] = verdict
+        return verdict
+
+    def verdict(self, path: Union[str, Path], is_dir: bool = False, ignore: bool = True) -> Optional[str]:
+        """
+        Check a path
+
+        Args:
+            path: File or directory path (absolute or relative)
+            is_dir: Whether the path is a directory
+            ignore: Whether the ignore patterns apply, besides the safety rules
+
+        Returns:
+            None if the path is allowed, otherwise why it is not
+        """
+        path = self._normalize(path)
+        if is_dir:
+            return self.directory_verdict(path, ignore)
+        parent, _, name = path.rpartition("/")
+        verdict = self.directory_verdict(parent, ignore) if parent else None
+        if verdict is None:
+            verdict = self._component(name, ignore)
+        if verdict is None and ignore and self.path_regex is not None and self.path_regex.match(path):
+            verdict = IGNORED
+        return verdict
+
+    def allows_child(self, path: str, name: str, is_dir: bool = False) -> bool:
+        """
+        Check an entry whose parent directory is already known to be allowed
+
+        Used while walking, where every listed directory has passed the
+        policy, so only the entry's own name and path need checking.
+
+        Args:
+            path: Path of the entry with "/" separators; a path relative to
+                the walk's root needs a leading "/" for globs such as
+                "*/venv/*" to match its first component
+            name: Its file or directory name
+            is_dir: Whether the entry is a directory
+        """
+        if self._component(name, True) is not None:
+            return False
+        if self.path_regex is not None:
+            return not self.path_regex.match(path + "/" if is_dir else path)
+        return True
+
+    def allows(self, path: Union[str, Path], is_dir: bool = False, ignore: bool = True) -> bool:
+        """Return whether a path passes the policy"""
+        return self.verdict(path, is_dir, ignore) is None
+
+    def is_safe(self, path: Union[str, Path]) -> bool:
+        """Return whether a path passes the safety rules (ignore patterns aside)"""
+        return bool(path) and self.verdict(path, ignore=False) is None
+
+
+_policy = None
+_ignore_policy = None
+_policy_lock = threading.Lock()
+
+
+def get_path_policy() -> PathPolicy:
+    """Get the shared policy built from the configuration"""
+    global _policy
+    with _policy_lock:
+        if _policy is None:
+            _policy = PathPolicy()
+        return _policy
+
+
+def get_ignore_policy() -> PathPolicy:
+    """Get the shared policy that applies only `file_watching.ignore_patterns`"""
+    global _ignore_policy
+    with _policy_lock:
+        if _ignore_policy is None:
+            _ignore_policy = PathPolicy(safety=False)
+        return _ignore_policy
+
+
+def _legacy_is_safe(path: str, system_folders) -> bool:
+    """The per-pattern checks the policy replaces, for the benchmark"""
+    path_str = str(path).lower()
+    if "github" in path_str:
+        return False
+    for pattern in UNSAFE_PATTERNS:
+        if re.search(pattern, path_str, re.IGNORECASE):
+            return False
+    for folder in system_folders:
+        if folder.lower() in path_str.lower():
+            return False
+    return True
+
+
+def benchmark(files_per_dir: int = 200, dirs: int = 500, repeat: int = 3) -> Dict[str, float]:
+    """
+    Time the policy against the legacy checks on synthetic paths
+
+    Returns:
+        Best time in seconds per implementation, and the speedup
+    """
+    import time
+
+    paths = []
+    for d in range(dirs):
+        directory = f"/home/user/OrganizeFolder/project{d % 50}/{'node_modules/' if d % 17 == 0 else ''}dir{d}"
+        paths.extend(f"{directory}/file{f}.txt" for f in range(files_per_dir))
+    system_folders = config.get("ignore_folders", [])
+
+    def best(fn):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    legacy = best(lambda: [_legacy_is_safe(p, system_folders) for p in paths])
+    policy = PathPolicy()
+    compiled = best(lambda: [policy.is_safe(p) for p in paths])
+    assert [_legacy_is_safe(p, system_folders) for p in paths] == [policy.is_safe(p) for p in paths]
+    return {"paths": len(paths), "legacy_seconds": legacy, "policy_seconds": compiled,
+            "speedup": legacy / compiled if compiled else float("inf")}
+
+
+if __name__ == "__main__":
+    results = benchmark()
+    print(f"{results['paths']} paths: legacy {results['legacy_seconds'] * 1000:.1f} ms, "
+          f"policy {results['policy_seconds'] * 1000:.1f} ms ({results['speedup']:.1f}x)")
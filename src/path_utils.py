@@ -5,13 +5,15 @@ This module provides utilities for path validation, safety checks,
 and common path operations.
 """
 import os
-import re
 import shutil
 from pathlib import Path
 from typing import List, Optional, Set, Tuple, Union
 
 from src.config import config, get_safe_path
 from src.error_handler import PathError, get_logger, safe_path_operation
+from src.move_engine import move_file
+from src.name_allocator import get_name_allocator
+from src.path_policy import UNSAFE_PATTERNS, get_path_policy
 
 # Get logger
 logger = get_logger(__name__)
@@ -20,13 +22,7 @@ class SafePath:
     """Utility class for safe path operations"""
     
     # Patterns for unsafe paths
-    UNSAFE_PATTERNS = [
-        r"(^|/)\.git(/|$)",  # Git repositories
-        r"(^|/)node_modules(/|$)",  # Node.js modules
-        r"(^|/)__pycache__(/|$)",  # Python cache
-        r"(^|/)venv(/|$)",  # Python virtual environments
-        r"(^|/)\.env(/|$)",  # Environment files
-    ]
+    UNSAFE_PATTERNS = UNSAFE_PATTERNS
     
     # System folders to protect
     SYSTEM_FOLDERS = config.get("ignore_folders", [])
@@ -45,25 +41,11 @@ class SafePath:
         if not path:
             return False
             
-        # Convert to string if it's a Path object
-        path_str = str(path).lower()
-        
-        # Check for GitHub repositories
-        if "github" in path_str:
-            logger.warning(f"Skipping GitHub path: {path}")
+        # Compiled once and memoized per directory, so this is cheap in loops
+        verdict = get_path_policy().verdict(path, ignore=False)
+        if verdict is not None:
+            logger.debug(f"Skipping {verdict} path: {path}")
             return False
-            
-        # Check for unsafe patterns
-        for pattern in SafePath.UNSAFE_PATTERNS:
-            if re.search(pattern, path_str, re.IGNORECASE):
-                logger.warning(f"Skipping unsafe path matching pattern {pattern}: {path}")
-                return False
-                
-        # Check for system folders
-        for folder in SafePath.SYSTEM_FOLDERS:
-            if folder.lower() in path_str.lower():
-                logger.warning(f"Skipping system folder: {path}")
-                return False
                 
         return True
     
@@ -224,12 +206,8 @@ class SafePath:
                 path=f"{src} -> {dst}"
             )
             
-        # Create destination directory if it doesn't exist
-        dst_dir = os.path.dirname(dst)
-        os.makedirs(dst_dir, exist_ok=True)
-        
-        # Move the file
-        shutil.move(src, dst)
+        # Move the file (renamed in place, or copied and verified across devices)
+        move_file(str(src), str(dst))
         logger.info(f"Moved file: {src} -> {dst}")
     
     @staticmethod
@@ -264,22 +242,17 @@ class SafePath:
         """
         Get a unique path by appending a counter if the path already exists
         
+        Names come from the shared allocator, so the directory is listed
+        once. The name is not reserved; code that moves a file there should
+        allocate it at the move site instead.
+        
         Args:
             path: Original path
             
         Returns:
             Unique path
         """
-        if not os.path.exists(path):
-            return str(path)
-            
-        base, ext = os.path.splitext(path)
-        counter = 1
-        
-        while os.path.exists(f"{base}_{counter}{ext}"):
-            counter += 1
-            
-        return f"{base}_{counter}{ext}"
+        return get_name_allocator().allocate(path, reserve=False)
     
     @staticmethod
     def is_binary_file(path: Union[str, Path]) -> bool:
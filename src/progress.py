@@ -0,0 +1,112 @@
+"""
+Level-gated progress reporting for long summarization runs
+
+Per-file results are logged at DEBUG; at INFO a run only logs a periodic
+progress line (done/total, failures, cache hits, rate and ETA) and a final
+summary, so large batches don't pay for per-file terminal output. Records
+go through the central log manager when it is available.
+"""
+import logging
+import threading
+import time
+from typing import Optional
+
+try:
+    from log_manager import get_logger
+except ImportError:
+    from src.error_handler import get_logger
+
+logger = get_logger("summaries")
+
+
+def _format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+class ProgressReporter:
+    """Counts finished files and periodically logs the rate and ETA"""
+
+    def __init__(self, total: Optional[int] = None, description: str = "Summarized",
+                 interval: float = 5.0, log: Optional[logging.Logger] = None):
+        """
+        Initialize the ProgressReporter
+
+        Args:
+            total: Number of files expected, if known
+            description: Verb shown in progress lines
+            interval: Minimum seconds between progress lines
+            log: Logger to report to (defaults to the "summaries" logger)
+        """
+        self.total = total
+        self.description = description
+        self.interval = interval
+        self.logger = log or logger
+        self.done = 0
+        self.failed = 0
+        self.cached = 0
+        self.started = time.monotonic()
+        self._last_report = self.started
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        """Files finished per second so far"""
+        elapsed = time.monotonic() - self.started
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> Optional[float]:
+        """Estimated seconds until all files are done, if the total is known"""
+        rate = self.rate
+        if not self.total or not rate:
+            return None
+        return max(0, self.total - self.done) / rate
+
+    def advance(self, file_path: Optional[str] = None, summary: Optional[str] = None,
+                cached: bool = False, failed: bool = False) -> None:
+        """
+        Record one finished file
+
+        Args:
+            file_path: Path of the file, for the DEBUG record
+            summary: Its summary, for the DEBUG record
+            cached: Whether the summary came from the cache
+            failed: Whether summarizing the file failed
+        """
+        with self._lock:
+            self.done += 1
+            self.cached += cached
+            self.failed += failed
+            now = time.monotonic()
+            due = now - self._last_report >= self.interval
+            if due:
+                self._last_report = now
+
+        if file_path and self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(f"{file_path}: {summary}" if summary is not None else file_path)
+        if due and self.logger.isEnabledFor(logging.INFO):
+            self.logger.info(self.status())
+
+    def status(self) -> str:
+        """One line describing the progress so far"""
+        done = f"{self.done}/{self.total}" if self.total else str(self.done)
+        line = f"{self.description} {done} files ({self.rate:.1f}/s"
+        if self.cached:
+            line += f", {self.cached} cached"
+        if self.failed:
+            line += f", {self.failed} failed"
+        eta = self.eta
+        if eta is not None and self.done < self.total:
+            line += f", ETA {_format_duration(eta)}"
+        return line + ")"
+
+    def finish(self) -> None:
+        """Log the final totals"""
+        if self.done and self.logger.isEnabledFor(logging.INFO):
+            elapsed = time.monotonic() - self.started
+            self.logger.info(f"{self.status()} in {_format_duration(elapsed)}")
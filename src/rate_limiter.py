@@ -0,0 +1,134 @@
+"""
+Rate limiting for LLM providers
+
+This module provides an asyncio-aware token bucket limiter that keeps
+summarization requests within a provider's requests-per-minute and
+tokens-per-minute quotas. There is one limiter per provider for the whole
+process, so concurrent runs (e.g. /batch and /watch) share its quota.
+"""
+import asyncio
+import threading
+import time
+import weakref
+from typing import Dict, Optional
+
+from src.config import config
+
+
+class _Bucket:
+    """A single refilling token bucket measured per minute"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = float(per_minute) / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay_for(self, amount: float) -> float:
+        """Return how long to wait before `amount` tokens are available"""
+        self._refill()
+        # Requests larger than the whole bucket are allowed once it is full
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """Limits request and token throughput for one provider"""
+
+    def __init__(self, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None):
+        """
+        Initialize a RateLimiter
+
+        Args:
+            requests_per_minute: Maximum requests per minute (None for unlimited)
+            tokens_per_minute: Maximum prompt+completion tokens per minute (None for unlimited)
+        """
+        self._requests = _Bucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = _Bucket(tokens_per_minute) if tokens_per_minute else None
+        # The buckets may be shared by several event loops (threads); callers
+        # on one loop queue behind each other on that loop's lock
+        self._bucket_lock = threading.Lock()
+        self._queues = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def for_provider(cls, provider: str) -> "RateLimiter":
+        """
+        Create a limiter from the configured limits of a provider
+
+        Args:
+            provider: Provider name (e.g. "groq", "ollama")
+
+        Returns:
+            RateLimiter configured from `llm.rate_limits.<provider>`
+        """
+        limits = config.get(f"llm.rate_limits.{provider}", {}) or {}
+        return cls(
+            requests_per_minute=limits.get("requests_per_minute"),
+            tokens_per_minute=limits.get("tokens_per_minute"),
+        )
+
+    async def acquire(self, tokens: int = 0) -> None:
+        """
+        Wait until one request of `tokens` estimated tokens may be sent
+
+        Callers queue on an internal lock, so a caller that is waiting for
+        quota holds back everyone behind it instead of letting them race.
+
+        Args:
+            tokens: Estimated number of tokens the request will use
+        """
+        loop = asyncio.get_running_loop()
+        with self._bucket_lock:
+            queue = self._queues.get(loop)
+            if queue is None:
+                queue = self._queues[loop] = asyncio.Lock()
+        async with queue:
+            while True:
+                with self._bucket_lock:
+                    delay = 0.0
+                    if self._requests:
+                        delay = max(delay, self._requests.delay_for(1))
+                    if self._tokens and tokens:
+                        delay = max(delay, self._tokens.delay_for(tokens))
+                    if delay <= 0:
+                        if self._requests:
+                            self._requests.consume(1)
+                        if self._tokens and tokens:
+                            self._tokens.consume(tokens)
+                        return
+                await asyncio.sleep(delay)
+
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimate the token count of a text (about 4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str) -> RateLimiter:
+    """Get the process-wide limiter of a provider"""
+    with _limiters_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            limiter = _limiters[provider] = RateLimiter.for_provider(provider)
+        return limiter
+
+
+def get_provider_limiters() -> Dict[str, RateLimiter]:
+    """Get the process-wide limiter of every configured provider"""
+    providers = config.get("llm.rate_limits", {}) or {}
+    return {name: get_rate_limiter(name) for name in providers}
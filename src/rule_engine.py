@@ -0,0 +1,260 @@
+"""
+Compiled rule evaluation for natural language organization
+
+Applying parsed rules one at a time walks each source folder once per rule
+and stats every file again per rule. `RuleEngine` instead compiles all
+rules up front and makes one crawler pass per source root (a root inside
+another recursively walked root is served by that walk), using the size
+and mtime the crawler already has.
+
+Each rule becomes a predicate vector ordered by cost:
+
+1. extension, resolved by a per-directory dispatch table so a file is only
+   tested against rules that can take its extension;
+2. size and date bounds, compared against the crawler record (date
+   filters become mtime bounds computed once);
+3. content, read at most once per file however many rules need it.
+
+Candidate rules are tried in priority order (higher `priority` first, then
+the order the rules were given), so the first full match is the winning
+rule and the remaining predicates are never evaluated.
+
+Run `python -m src.rule_engine` for a benchmark against per-rule walks.
+"""
+import os
+import time
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from src.crawler import FileRecord, crawl
+from src.error_handler import get_logger
+from src.path_policy import PathPolicy
+
+logger = get_logger(__name__)
+
+# Only these files are read for content filters
+TEXT_EXTENSIONS = frozenset({".txt", ".md", ".py", ".js", ".html", ".css", ".json", ".xml", ".csv"})
+
+
+class CompiledRule(NamedTuple):
+    """A rule reduced to precomputed bounds"""
+    index: int  # Position in the rule list
+    priority: int
+    root: str
+    recursive: bool
+    extensions: Optional[frozenset]  # None matches every extension
+    min_size: Optional[int]
+    max_size: Optional[int]
+    min_mtime: Optional[float]
+    max_mtime: Optional[float]
+    content: Optional[str]  # Lowercase substring
+
+
+def compile_rule(index: int, rule, root: str, now: Optional[float] = None) -> CompiledRule:
+    """
+    Compile one rule
+
+    Args:
+        index: Position of the rule
+        rule: Object with file_types, date_filter, size_filter,
+            content_filter, priority and recursive attributes
+        root: Absolute folder the rule applies to
+        now: Reference time for date filters (defaults to now)
+    """
+    now = time.time() if now is None else now
+    file_types = rule.file_types or ()
+    extensions = None if "*" in file_types else frozenset(file_types)
+
+    size_filter = rule.size_filter or {}
+    date_filter = rule.date_filter or {}
+    min_mtime = max_mtime = None
+    if "newer_than_days" in date_filter:
+        min_mtime = now - date_filter["newer_than_days"] * 86400
+    elif "older_than_days" in date_filter:
+        max_mtime = now - date_filter["older_than_days"] * 86400
+
+    return CompiledRule(
+        index=index,
+        priority=rule.priority or 0,
+        root=os.path.abspath(root),
+        recursive=bool(rule.recursive),
+        extensions=extensions,
+        min_size=size_filter.get("min_bytes"),
+        max_size=size_filter.get("max_bytes"),
+        min_mtime=min_mtime,
+        max_mtime=max_mtime,
+        content=rule.content_filter.lower() if rule.content_filter else None,
+    )
+
+
+def _inside(path: str, root: str) -> bool:
+    return path == root or path.startswith(os.path.join(root, ""))
+
+
+class RuleEngine:
+    """Evaluates compiled rules against one crawl per source root"""
+
+    def __init__(self, rules: Iterable[Tuple[object, str]], now: Optional[float] = None,
+                 policy: Optional[PathPolicy] = None):
+        """
+        Initialize the RuleEngine
+
+        Args:
+            rules: (rule, absolute source folder) pairs, in order
+            now: Reference time for date filters (defaults to now)
+            policy: Path policy for the crawl (defaults to the crawler's)
+        """
+        now = time.time() if now is None else now
+        self.policy = policy
+        self.rules = [compile_rule(index, rule, root, now) for index, (rule, root) in enumerate(rules)]
+        # Tried in this order; the first rule that matches wins
+        self._ordered = sorted(self.rules, key=lambda r: (-r.priority, r.index))
+        self._dispatch: Dict[str, Tuple[Dict[str, Tuple[CompiledRule, ...]], Tuple[CompiledRule, ...]]] = {}
+        self.stats = {"files": 0, "matched": 0, "content_reads": 0}
+
+    def crawl_roots(self) -> List[Tuple[str, bool]]:
+        """
+        Folders to walk, with whether each walk is recursive
+
+        A root inside another root that is walked recursively is not walked
+        again.
+        """
+        roots = {}
+        for rule in self.rules:
+            roots[rule.root] = roots.get(rule.root, False) or rule.recursive
+        walks = []
+        for root in sorted(roots):
+            if any(recursive and _inside(root, outer) for outer, recursive in walks):
+                continue
+            # Nested roots need the walk to descend even if this root's own rules don't
+            recursive = roots[root] or any(other != root and _inside(other, root) for other in roots)
+            walks.append((root, recursive))
+        return walks
+
+    def _table(self, directory: str):
+        """Rules that apply in a directory, by extension, memoized"""
+        table = self._dispatch.get(directory)
+        if table is None:
+            applicable = [
+                rule for rule in self._ordered
+                if directory == rule.root or (rule.recursive and _inside(directory, rule.root))
+            ]
+            wildcard = tuple(rule for rule in applicable if rule.extensions is None)
+            by_ext = {}
+            for ext in {ext for rule in applicable if rule.extensions for ext in rule.extensions}:
+                by_ext[ext] = tuple(rule for rule in applicable
+                                    if rule.extensions is None or ext in rule.extensions)
+            table = self._dispatch[directory] = (by_ext, wildcard)
+        return table
+
+    def _content(self, record: FileRecord) -> Optional[str]:
+        self.stats["content_reads"] += 1
+        try:
+            with open(record.path, "r", encoding="utf-8", errors="ignore") as f:
+                return f.read().lower()
+        except Exception:
+            return None
+
+    def match(self, record: FileRecord) -> Optional[CompiledRule]:
+        """The winning rule for a file, or None if no rule takes it"""
+        by_ext, wildcard = self._table(os.path.dirname(record.path))
+        content = None
+        for rule in by_ext.get(record.ext, wildcard):
+            if rule.min_size is not None and record.size < rule.min_size:
+                continue
+            if rule.max_size is not None and record.size > rule.max_size:
+                continue
+            if rule.min_mtime is not None and record.mtime <= rule.min_mtime:
+                continue
+            if rule.max_mtime is not None and record.mtime >= rule.max_mtime:
+                continue
+            if rule.content is not None:
+                if record.ext not in TEXT_EXTENSIONS:
+                    continue
+                if content is None:
+                    content = self._content(record) or ""
+                if rule.content not in content:
+                    continue
+            return rule
+        return None
+
+    def matches(self) -> Iterator[Tuple[FileRecord, CompiledRule]]:
+        """
+        Walk every source root once and yield each file with its winning rule
+
+        Files are yielded sorted by path, so plans built from them are
+        deterministic.
+        """
+        for root, recursive in self.crawl_roots():
+            for record in sorted(crawl(root, recursive=recursive, policy=self.policy)):
+                self.stats["files"] += 1
+                rule = self.match(record)
+                if rule is not None:
+                    self.stats["matched"] += 1
+                    yield record, rule
+
+
+def benchmark(files: int = 20000, rules: int = 10) -> Dict[str, float]:
+    """
+    Time the engine against one walk and per-file stats per rule
+
+    Returns:
+        Best time in seconds per implementation, and the speedup
+    """
+    import tempfile
+    from types import SimpleNamespace
+
+    extensions = [".txt", ".pdf", ".jpg", ".png", ".docx", ".mp4", ".zip", ".py", ".csv", ".mp3"]
+    rule_list = [
+        SimpleNamespace(file_types={extensions[i % len(extensions)]}, recursive=True, priority=1,
+                        size_filter={"min_bytes": 1} if i % 3 == 0 else None,
+                        date_filter={"older_than_days": 1} if i % 4 == 0 else None,
+                        content_filter=None)
+        for i in range(rules)
+    ]
+
+    def legacy(root):
+        # One walk per rule, stat-ing each candidate again
+        matched = set()
+        for rule in rule_list:
+            for record in crawl(root):
+                if record.path in matched or record.ext not in rule.file_types:
+                    continue
+                if rule.size_filter and os.path.getsize(record.path) < rule.size_filter["min_bytes"]:
+                    continue
+                if rule.date_filter and time.time() - os.path.getmtime(record.path) <= 86400:
+                    continue
+                matched.add(record.path)
+        return matched
+
+    def engine(root):
+        return {record.path for record, _ in RuleEngine((rule, root) for rule in rule_list).matches()}
+
+    results = {"files": files, "rules": rules}
+    with tempfile.TemporaryDirectory() as root:
+        for i in range(files):
+            directory = os.path.join(root, f"dir{i % 100}")
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"file{i}{extensions[i % len(extensions)]}")
+            with open(path, "w") as f:
+                f.write("x" * (i % 2))
+            if i % 2:
+                os.utime(path, (time.time() - 2 * 86400,) * 2)
+
+        timings = {}
+        for label, fn in (("legacy", legacy), ("engine", engine)):
+            times = []
+            for _ in range(2):
+                start = time.perf_counter()
+                found = fn(root)
+                times.append(time.perf_counter() - start)
+            timings[label] = min(times)
+            results[f"{label}_matched"] = len(found)
+    results["legacy_seconds"] = timings["legacy"]
+    results["engine_seconds"] = timings["engine"]
+    results["speedup"] = timings["legacy"] / timings["engine"]
+    return results
+
+
+if __name__ == "__main__":
+    for key, value in benchmark().items():
+        print(f"{key}: {round(value, 4) if isinstance(value, float) else value}")
@@ -0,0 +1,249 @@
+"""
+Directory snapshot index for incremental batch runs
+
+This module remembers what a directory looked like the last time it was
+summarized (path, size, mtime, inode, content hash and the id of the
+summary produced for it) so the next run only has to load and summarize
+files that were added or modified. Renamed files are recognised by inode
+or content hash and keep their existing summary.
+"""
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.config import config
+from src.crawler import crawl
+from src.error_handler import get_logger
+from src.summary_cache import hash_file
+
+logger = get_logger(__name__)
+
+_lock = threading.RLock()
+_snapshot_index = None
+
+
+class SnapshotDiff:
+    """Changes to a directory since its last snapshot"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.added: List[str] = []
+        self.removed: List[str] = []
+        self.modified: List[str] = []
+        self.renamed: List[Tuple[str, str]] = []  # (old path, new path)
+        self.unchanged: List[str] = []
+        # Current record of every file, keyed by path relative to root
+        self.current: Dict[str, Dict] = {}
+
+    @property
+    def changed(self) -> List[str]:
+        """Paths whose contents must be summarized again"""
+        return self.added + self.modified
+
+    def to_dict(self) -> Dict:
+        """Convert the diff to a dictionary"""
+        return {
+            "root": self.root,
+            "added": self.added,
+            "removed": self.removed,
+            "modified": self.modified,
+            "renamed": [{"src_path": old, "dst_path": new} for old, new in self.renamed],
+            "unchanged": len(self.unchanged),
+        }
+
+
+class SnapshotIndex:
+    """Persistent per-directory file snapshot stored next to evolution.db"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        Initialize the SnapshotIndex
+
+        Args:
+            db_path: Path to the SQLite database (defaults to the data directory)
+        """
+        self.db_path = db_path or os.path.join(config.get("paths.data_dir"), "snapshot_index.db")
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._init_db()
+
+    def _init_db(self):
+        """Create the snapshot table if it doesn't exist"""
+        with _lock:
+            self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS snapshot (
+                root TEXT NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                content_hash TEXT,
+                summary_id TEXT,
+                PRIMARY KEY (root, path)
+            )
+            ''')
+            self._conn.commit()
+
+    def load(self, root: str) -> Dict[str, Dict]:
+        """
+        Load the last snapshot of a directory
+
+        Args:
+            root: Directory the snapshot was taken of
+
+        Returns:
+            Dictionary of file records keyed by relative path
+        """
+        root = os.path.abspath(root)
+        with _lock:
+            rows = self._conn.execute(
+                "SELECT path, size, mtime_ns, inode, content_hash, summary_id FROM snapshot WHERE root = ?",
+                (root,)
+            ).fetchall()
+        return {
+            row[0]: {
+                "path": row[0],
+                "size": row[1],
+                "mtime_ns": row[2],
+                "inode": row[3],
+                "content_hash": row[4],
+                "summary_id": row[5],
+            }
+            for row in rows
+        }
+
+    @staticmethod
+    def scan(root: str, extensions: Optional[Iterable[str]] = None) -> Dict[str, Dict]:
+        """
+        Stat every file under a directory without reading it
+
+        Hidden files and anything matching `file_watching.ignore_patterns` are skipped.
+
+        Args:
+            root: Directory to scan
+            extensions: Optional file extensions to include (lowercase, with dot)
+
+        Returns:
+            Dictionary of file records keyed by relative path
+        """
+        return {
+            record.rel_path: {
+                "path": record.rel_path,
+                "size": record.size,
+                "mtime_ns": record.mtime_ns,
+                "inode": record.inode,
+                "content_hash": None,
+                "summary_id": None,
+            }
+            for record in crawl(root, extensions=extensions)
+        }
+
+    def diff(self, root: str, extensions: Optional[Iterable[str]] = None) -> SnapshotDiff:
+        """
+        Compare a directory against its last snapshot
+
+        Only files whose size or mtime changed, and new files, are hashed.
+
+        Args:
+            root: Directory to compare
+            extensions: Optional file extensions to include
+
+        Returns:
+            SnapshotDiff describing added, removed, modified, renamed and unchanged files
+        """
+        result = SnapshotDiff(os.path.abspath(root))
+        previous = self.load(root)
+        current = self.scan(root, extensions)
+
+        new_paths = []
+        for rel_path, record in current.items():
+            old = previous.get(rel_path)
+            if old is None:
+                new_paths.append(rel_path)
+            elif old["size"] == record["size"] and old["mtime_ns"] == record["mtime_ns"]:
+                record["content_hash"] = old["content_hash"]
+                record["summary_id"] = old["summary_id"]
+                result.unchanged.append(rel_path)
+            else:
+                record["content_hash"] = hash_file(os.path.join(root, rel_path))
+                if record["content_hash"] and record["content_hash"] == old["content_hash"]:
+                    # Touched but not changed
+                    record["summary_id"] = old["summary_id"]
+                    result.unchanged.append(rel_path)
+                else:
+                    result.modified.append(rel_path)
+
+        vanished = {path: old for path, old in previous.items() if path not in current}
+        by_inode = {(old["inode"], old["size"]): path for path, old in vanished.items()}
+        by_hash = {old["content_hash"]: path for path, old in vanished.items() if old["content_hash"]}
+
+        for rel_path in new_paths:
+            record = current[rel_path]
+            old_path = by_inode.get((record["inode"], record["size"]))
+            if old_path is not None and old_path in vanished and \
+                    vanished[old_path]["mtime_ns"] != record["mtime_ns"]:
+                # A rename keeps the mtime; otherwise the inode may have been
+                # reused by a new file, so only the contents can tell
+                record["content_hash"] = hash_file(os.path.join(root, rel_path))
+                if not record["content_hash"] or record["content_hash"] != vanished[old_path]["content_hash"]:
+                    old_path = None
+            if old_path is None:
+                if record["content_hash"] is None:
+                    record["content_hash"] = hash_file(os.path.join(root, rel_path))
+                old_path = by_hash.get(record["content_hash"])
+            if old_path is not None and old_path in vanished:
+                old = vanished.pop(old_path)
+                record["content_hash"] = record["content_hash"] or old["content_hash"]
+                record["summary_id"] = old["summary_id"]
+                result.renamed.append((old_path, rel_path))
+            else:
+                if record["content_hash"] is None:
+                    record["content_hash"] = hash_file(os.path.join(root, rel_path))
+                result.added.append(rel_path)
+
+        result.removed = sorted(vanished)
+        result.current = current
+        logger.info(
+            f"Snapshot diff for {root}: {len(result.added)} added, {len(result.modified)} modified, "
+            f"{len(result.renamed)} renamed, {len(result.removed)} removed, {len(result.unchanged)} unchanged"
+        )
+        return result
+
+    def update(self, diff: SnapshotDiff, summary_ids: Optional[Dict[str, str]] = None) -> None:
+        """
+        Replace the stored snapshot of a directory with the state in `diff`
+
+        Args:
+            diff: Diff returned by `diff`, whose `current` records become the new snapshot
+            summary_ids: Summary ids of files summarized in this run, keyed by relative path
+        """
+        summary_ids = summary_ids or {}
+        rows = []
+        for rel_path, record in diff.current.items():
+            rows.append((
+                diff.root,
+                rel_path,
+                record["size"],
+                record["mtime_ns"],
+                record["inode"],
+                record["content_hash"],
+                summary_ids.get(rel_path, record["summary_id"]),
+            ))
+        with _lock:
+            self._conn.execute("DELETE FROM snapshot WHERE root = ?", (diff.root,))
+            self._conn.executemany(
+                "INSERT INTO snapshot (root, path, size, mtime_ns, inode, content_hash, summary_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+
+
+def get_snapshot_index() -> SnapshotIndex:
+    """Get or create the shared SnapshotIndex"""
+    global _snapshot_index
+    with _lock:
+        if _snapshot_index is None:
+            _snapshot_index = SnapshotIndex()
+        return _snapshot_index
@@ -0,0 +1,291 @@
+"""
+Persistent summary cache for Sorting Hat
+
+This module stores LLM file summaries on disk keyed by the file's content
+hash, the model that produced the summary and the version of the prompt
+used. Unchanged files are recognised from their size and mtime without
+being read again, and the cache is kept under a size limit by evicting
+the least recently used entries.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from src.config import config
+from src.error_handler import get_logger
+
+logger = get_logger(__name__)
+
+_lock = threading.RLock()
+_summary_cache = None
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(file_path: str) -> Optional[str]:
+    """Return the SHA-256 hex digest of a file's contents, or None if it cannot be read"""
+    digest = hashlib.sha256()
+    try:
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+    except OSError as e:
+        logger.warning(f"Could not hash {file_path}: {e}")
+        return None
+    return digest.hexdigest()
+
+
+def prompt_version(*prompts: str) -> str:
+    """Derive a short version string from the text of one or more prompts"""
+    digest = hashlib.sha256()
+    for prompt in prompts:
+        digest.update(prompt.encode("utf-8"))
+    return digest.hexdigest()[:12]
+
+
+class SummaryCache:
+    """Content-addressed, size-bounded LRU cache of file summaries"""
+
+    def __init__(self, db_path: Optional[str] = None, max_size_mb: Optional[float] = None):
+        """
+        Initialize the SummaryCache
+
+        Args:
+            db_path: Path to the SQLite database (defaults to the cache directory)
+            max_size_mb: Maximum total size of stored summaries in megabytes
+        """
+        self.db_path = db_path or os.path.join(config.get("paths.cache_dir"), "summaries.db")
+        if max_size_mb is None:
+            max_size_mb = config.get("summary_cache.max_size_mb", 256)
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._init_db()
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM summaries"
+        ).fetchone()[0]
+
+    def _init_db(self):
+        """Create cache tables if they don't exist"""
+        with _lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS summaries (
+                key TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+            ''')
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_summaries_access ON summaries (last_access)"
+            )
+            # Remembers the hash of each file so unchanged files are not re-read
+            self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS file_hashes (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                content_hash TEXT NOT NULL
+            )
+            ''')
+            self._conn.commit()
+
+    def content_hash(self, file_path: str) -> Optional[str]:
+        """
+        Get the SHA-256 of a file, reusing the stored hash if size and mtime are unchanged
+
+        Args:
+            file_path: Path to the file
+
+        Returns:
+            Hex digest of the file contents, or None if the file cannot be read
+        """
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+
+        path = os.path.abspath(file_path)
+        with _lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, content_hash FROM file_hashes WHERE path = ?",
+                (path,)
+            ).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+
+        content_hash = hash_file(file_path)
+        if content_hash is None:
+            return None
+
+        with _lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO file_hashes (path, size, mtime_ns, content_hash) VALUES (?, ?, ?, ?)",
+                (path, stat.st_size, stat.st_mtime_ns, content_hash)
+            )
+            self._conn.commit()
+        return content_hash
+
+    @staticmethod
+    def key(content_hash: str, model: str, version: str) -> str:
+        """Return the id a summary is stored under"""
+        return f"{content_hash}:{model}:{version}"
+
+    def get_by_key(self, key: str) -> Optional[str]:
+        """
+        Look up a cached summary by its id
+
+        Args:
+            key: Summary id as returned by `key`
+
+        Returns:
+            The cached summary text, or None on a miss
+        """
+        with _lock:
+            row = self._conn.execute(
+                "SELECT summary FROM summaries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE summaries SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+        return row[0]
+
+    def get(self, content_hash: str, model: str, version: str) -> Optional[str]:
+        """
+        Look up a cached summary
+
+        Args:
+            content_hash: Hash of the file contents
+            model: Model that produced the summary
+            version: Prompt version the summary was produced with
+
+        Returns:
+            The cached summary text, or None on a miss
+        """
+        return self.get_by_key(self.key(content_hash, model, version))
+
+    def put(self, content_hash: str, model: str, version: str, summary: str) -> None:
+        """
+        Store a summary and evict old entries if the cache grew past its limit
+
+        Args:
+            content_hash: Hash of the file contents
+            model: Model that produced the summary
+            version: Prompt version the summary was produced with
+            summary: Summary text
+        """
+        key = self.key(content_hash, model, version)
+        size = len(summary.encode("utf-8"))
+        with _lock:
+            old = self._conn.execute(
+                "SELECT size FROM summaries WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (key, content_hash, model, prompt_version, summary, size, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, content_hash, model, version, summary, size, time.time())
+            )
+            self._total_bytes += size - (old[0] if old else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """Drop least recently used entries until the cache is at 90% of its limit"""
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM summaries ORDER BY last_access ASC"
+        ).fetchall():
+            if self._total_bytes <= target:
+                break
+            self._conn.execute("DELETE FROM summaries WHERE key = ?", (key,))
+            self._total_bytes -= size
+            removed += 1
+        logger.debug(f"Evicted {removed} cached summaries")
+
+    def lookup(self, file_path: str, model: str, version: str) -> Optional[Dict]:
+        """
+        Get the cached summary of a file on disk
+
+        Args:
+            file_path: Path to the file
+            model: Model that would produce the summary
+            version: Current prompt version
+
+        Returns:
+            Summary dictionary with file_path and summary, or None on a miss
+        """
+        content_hash = self.content_hash(file_path)
+        if content_hash is None:
+            return None
+        summary = self.get(content_hash, model, version)
+        if summary is None:
+            return None
+        return {"file_path": file_path, "summary": summary}
+
+    def store(self, file_path: str, model: str, version: str, summary: Dict) -> Optional[str]:
+        """
+        Cache the summary of a file on disk
+
+        Args:
+            file_path: Path to the file
+            model: Model that produced the summary
+            version: Prompt version the summary was produced with
+            summary: Summary dictionary as returned by the summarizer
+
+        Returns:
+            The id the summary was stored under, or None if it was not stored
+        """
+        text = summary.get("summary") if isinstance(summary, dict) else None
+        if not text:
+            return None
+        content_hash = self.content_hash(file_path)
+        if content_hash is None:
+            return None
+        self.put(content_hash, model, version, text)
+        return self.key(content_hash, model, version)
+
+    def invalidate_prompt_versions(self, current_versions) -> int:
+        """
+        Delete summaries produced by prompts other than the current ones
+
+        Args:
+            current_versions: Iterable of prompt versions still in use
+
+        Returns:
+            Number of entries removed
+        """
+        versions = list(current_versions)
+        placeholders = ",".join("?" for _ in versions)
+        with _lock:
+            cursor = self._conn.execute(
+                f"DELETE FROM summaries WHERE prompt_version NOT IN ({placeholders})", versions
+            )
+            self._total_bytes = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM summaries"
+            ).fetchone()[0]
+            self._conn.commit()
+        return cursor.rowcount
+
+
+def get_summary_cache() -> Optional[SummaryCache]:
+    """Get or create the shared SummaryCache, or None if caching is disabled"""
+    global _summary_cache
+    if not config.get("summary_cache.enabled", True):
+        return None
+    with _lock:
+        if _summary_cache is None:
+            _summary_cache = SummaryCache()
+        return _summary_cache
@@ -0,0 +1,251 @@
+"""
+Streaming, size-capped text extraction
+
+Summaries only ever see the first few thousand tokens of a file, so this
+module reads documents lazily (PDF page by page, DOCX paragraph by
+paragraph, text files in fixed-size blocks) and stops as soon as the
+token budget is spent. Long documents can instead be sampled from the
+head, middle and tail. Work and memory per file are bounded by the
+budget, not by the size of the file.
+"""
+import mimetypes
+import os
+import zipfile
+from collections import deque
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+from xml.etree.ElementTree import iterparse
+
+from src.config import config
+from src.error_handler import get_logger
+
+logger = get_logger(__name__)
+
+# Rough size of a token, matching src.rate_limiter.estimate_tokens
+CHARS_PER_TOKEN = 4
+
+TEXT_BLOCK_SIZE = 64 * 1024
+
+TEXT_EXTENSIONS = {
+    ".txt", ".md", ".rst", ".csv", ".tsv", ".json", ".log", ".xml", ".html", ".htm",
+    ".py", ".js", ".ts", ".java", ".c", ".cpp", ".h", ".go", ".rs", ".rb", ".sh", ".yaml", ".yml",
+}
+
+SAMPLE_SEPARATOR = "\n[...]\n"
+
+W_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+def can_extract(path: str) -> bool:
+    """Return whether the extractor handles this file type"""
+    ext = os.path.splitext(path)[1].lower()
+    return ext in TEXT_EXTENSIONS or ext in (".pdf", ".docx")
+
+
+def file_metadata(path: str) -> Dict:
+    """Build the metadata SimpleDirectoryReader attaches to a document"""
+    stat = os.stat(path)
+
+    def date(timestamp):
+        return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d")
+
+    return {
+        "file_path": path,
+        "file_name": os.path.basename(path),
+        "file_type": mimetypes.guess_type(path)[0],
+        "file_size": stat.st_size,
+        "creation_date": date(stat.st_ctime),
+        "last_modified_date": date(stat.st_mtime),
+    }
+
+
+def _pdf_pages(path: str):
+    """Return the lazily parsed page list of a PDF"""
+    from pypdf import PdfReader
+    return PdfReader(path).pages
+
+
+def _page_text(page) -> str:
+    try:
+        return page.extract_text() or ""
+    except Exception as e:
+        logger.debug(f"Could not extract PDF page text: {e}")
+        return ""
+
+
+def iter_docx_paragraphs(path: str) -> Iterator[str]:
+    """Yield the paragraphs of a DOCX file without loading the whole document tree"""
+    with zipfile.ZipFile(path) as archive:
+        with archive.open("word/document.xml") as xml:
+            for _, element in iterparse(xml, events=("end",)):
+                if element.tag == f"{W_NAMESPACE}p":
+                    text = "".join(node.text or "" for node in element.iter(f"{W_NAMESPACE}t"))
+                    element.clear()
+                    if text:
+                        yield text
+
+
+def iter_text_blocks(path: str, block_size: int = TEXT_BLOCK_SIZE) -> Iterator[str]:
+    """Yield a text file in fixed-size blocks"""
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                return
+            yield block
+
+
+def iter_blocks(path: str) -> Iterator[str]:
+    """Yield the text of a file lazily, one page, paragraph or block at a time"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".pdf":
+        for page in _pdf_pages(path):
+            yield _page_text(page)
+    elif ext == ".docx":
+        yield from iter_docx_paragraphs(path)
+    else:
+        yield from iter_text_blocks(path)
+
+
+def _take(blocks, budget: int) -> str:
+    """Join blocks until `budget` characters are collected"""
+    parts: List[str] = []
+    used = 0
+    for block in blocks:
+        part = block[:budget - used]
+        parts.append(part)
+        used += len(part)
+        if used >= budget:
+            # Stop before the next block is read or parsed
+            break
+    return "\n".join(parts)
+
+
+def _take_tail(blocks, budget: int) -> str:
+    """Keep the last `budget` characters of a stream of blocks"""
+    tail = deque()
+    used = 0
+    for block in blocks:
+        tail.append(block)
+        used += len(block)
+        while tail and used - len(tail[0]) >= budget:
+            used -= len(tail.popleft())
+    return "\n".join(tail)[-budget:] if tail else ""
+
+
+def _read_at(path: str, offset: int, length: int) -> str:
+    """Read about `length` characters of a text file starting near a byte offset"""
+    with open(path, "rb") as f:
+        f.seek(max(0, offset))
+        data = f.read(length)
+    return data.decode("utf-8", errors="ignore")
+
+
+def _sample_text_file(path: str, budget: int) -> str:
+    size = os.path.getsize(path)
+    if size <= budget:
+        return _read_at(path, 0, budget)
+    share = budget // 3
+    return SAMPLE_SEPARATOR.join([
+        _read_at(path, 0, share),
+        _read_at(path, size // 2 - share // 2, share),
+        _read_at(path, size - share, share),
+    ])
+
+
+def _take_pages(pages, indices, budget: int):
+    """Extract pages in `indices` order until `budget` characters are collected"""
+    parts = []
+    used = 0
+    last = None
+    for i in indices:
+        text = _page_text(pages[i])
+        parts.append(text)
+        used += len(text)
+        last = i
+        if used >= budget:
+            break
+    return parts, last
+
+
+def _sample_pdf(path: str, budget: int) -> str:
+    pages = _pdf_pages(path)
+    count = len(pages)
+    share = budget // 3
+
+    head, head_end = _take_pages(pages, range(count), share)
+    if head_end is None or head_end >= count - 1:
+        return "\n".join(head)[:budget]
+
+    middle_start = max(head_end + 1, count // 2)
+    middle, middle_end = _take_pages(pages, range(middle_start, count), share)
+    if middle_end is None or middle_end >= count - 1:
+        return SAMPLE_SEPARATOR.join(["\n".join(head)[:share], "\n".join(middle)[:budget - share]])
+
+    # Walk back from the last page until the tail share is filled
+    tail, _ = _take_pages(pages, range(count - 1, middle_end, -1), share)
+    return SAMPLE_SEPARATOR.join([
+        "\n".join(head)[:share],
+        "\n".join(middle)[:share],
+        "\n".join(reversed(tail))[-share:],
+    ])
+
+
+def _sample_sequential(path: str, budget: int) -> str:
+    """Head and tail of a stream that can only be read front to back"""
+    blocks = iter_blocks(path)
+    share = budget // 2
+    head_parts = []
+    used = 0
+    for block in blocks:
+        head_parts.append(block)
+        used += len(block)
+        if used >= share:
+            break
+    head = "\n".join(head_parts)
+    tail = _take_tail(blocks, budget - min(len(head), share))
+    if not tail:
+        return head[:budget]
+    return SAMPLE_SEPARATOR.join([head[:share], tail])
+
+
+def extract_text(path: str, max_tokens: Optional[int] = None, sampling: Optional[str] = None) -> str:
+    """
+    Extract at most `max_tokens` tokens of text from a file
+
+    Args:
+        path: File to read
+        max_tokens: Token budget (defaults to `extraction.max_tokens`)
+        sampling: "head" to read from the start, or "head_middle_tail" to sample
+            long documents from three places (defaults to `extraction.sampling`)
+
+    Returns:
+        The extracted text
+    """
+    max_tokens = max_tokens or config.get("extraction.max_tokens", 6144)
+    sampling = sampling or config.get("extraction.sampling", "head")
+    budget = max_tokens * CHARS_PER_TOKEN
+    ext = os.path.splitext(path)[1].lower()
+
+    if sampling == "head_middle_tail":
+        if ext == ".pdf":
+            return _sample_pdf(path, budget)
+        if ext in TEXT_EXTENSIONS:
+            return _sample_text_file(path, budget)
+        return _sample_sequential(path, budget)
+    return _take(iter_blocks(path), budget)
+
+
+def extract_document(path: str) -> Tuple[str, Dict]:
+    """
+    Extract the text and metadata of one file
+
+    Top-level and picklable so it can run on a process pool.
+
+    Args:
+        path: File to read
+
+    Returns:
+        (text, metadata) tuple
+    """
+    return extract_text(path), file_metadata(path)
@@ -6,7 +6,11 @@ based on file summaries.
 """
 import json
 import os
-from groq import Groq
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from src.config import config
+from src.llm_provider import get_provider
+from src.rate_limiter import estimate_tokens
 
 DEFAULT_PROMPT = """
 You will be provided with list of source files and a summary of their contents. For each file, propose a new path and filename, using a directory structure that optimally organizes the files using known conventions and best practices.
@@ -26,6 +30,60 @@ Your response must be a JSON object with the following schema:
 ```
 """
 
+MERGE_PROMPT = """
+You will be provided with a list of folders that were proposed independently for different parts of one directory, with the number of files proposed for each folder. Reconcile them into a single coherent folder taxonomy: merge folders that mean the same thing, use consistent naming and nesting, and keep folders that are genuinely distinct.
+
+Your response must be a JSON object with the following schema:
+```json
+{
+    "folders": [
+        {
+            "src_folder": "proposed folder exactly as given",
+            "dst_folder": "folder in the reconciled taxonomy"
+        }
+    ]
+}
+```
+"""
+
+# Default folder for each file type, used when no model is available
+EXTENSION_FOLDERS = {
+    ".pdf": "Documents/PDFs",
+    ".docx": "Documents/Word",
+    ".xlsx": "Documents/Excel",
+    ".pptx": "Documents/PowerPoint",
+    ".txt": "Documents/Text",
+    ".jpg": "Images",
+    ".jpeg": "Images",
+    ".png": "Images",
+    ".gif": "Images",
+    ".mp3": "Audio",
+    ".wav": "Audio",
+    ".flac": "Audio",
+    ".m4a": "Audio",
+    ".mp4": "Video",
+    ".mov": "Video",
+    ".mkv": "Video",
+    ".avi": "Video",
+    ".py": "Code/Python",
+    ".js": "Code/JavaScript",
+    ".ts": "Code/TypeScript",
+    ".html": "Code/HTML",
+    ".css": "Code/CSS",
+    ".zip": "Archives",
+    ".rar": "Archives",
+    ".7z": "Archives",
+    ".tar": "Archives",
+    ".gz": "Archives",
+    ".exe": "Installers",
+    ".msi": "Installers",
+    ".dmg": "Installers",
+    ".pkg": "Installers",
+    ".deb": "Installers",
+    ".apk": "Installers",
+}
+
+
 def create_file_tree(summaries, session=None):
     """
     Create a suggested file tree based on file summaries
@@ -38,57 +96,193 @@ def create_file_tree(summaries, session=None):
         Dictionary with suggested file organization
     """
     try:
-        api_key = os.getenv("GROQ_API_KEY")
-        if not api_key:
-            # Use mock response for testing if no API key
-            print("No GROQ_API_KEY found. Using mock response.")
-            return _mock_file_tree(summaries)
+        files = []
+        folders = {}
+        for update in iter_file_tree(summaries, session):
+            if update["type"] == "files":
+                files.extend(update["files"])
+            else:
+                folders = update["folders"]
+        return _apply_folders(files, folders)
         
-        client = Groq(api_key=api_key)
+    except Exception as e:
+        print(f"Error in create_file_tree: {e}")
+        return _mock_file_tree(summaries)
+
+def iter_file_tree(summaries, session=None):
+    """
+    Propose destinations shard by shard, as soon as each shard is planned
+    
+    Args:
+        summaries: List of file summary dictionaries
+        session: Optional session for tracking
         
-        summaries_json = json.dumps(summaries)
+    Yields:
+        {"type": "files", "files": [...]} with the proposals of each shard,
+        then, if there were several shards, {"type": "folders", "folders": {...}}
+        mapping proposed folders to the reconciled taxonomy
+    """
+    provider = get_provider()
+    if not provider.available:
+        # Use mock response for testing if no API key
+        print(f"No credentials for {provider.name}. Using mock response.")
+        yield {"type": "files", "files": _mock_file_tree(summaries)}
+        return
+    
+    shards = _partition_summaries(
+        summaries, config.get("llm.tree_shard_tokens", 6000)
+    )
+    if len(shards) == 1:
+        yield {"type": "files", "files": _plan_shard(provider, shards[0])}
+        return
+    
+    # Map: plan every shard concurrently
+    files = []
+    workers = min(len(shards), config.get("llm.max_concurrency", 8))
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = [executor.submit(_plan_shard, provider, shard) for shard in shards]
+        for future in as_completed(futures):
+            plan = future.result()
+            files.extend(plan)
+            yield {"type": "files", "files": plan}
+    finally:
+        # A consumer that stops early doesn't wait for the remaining shards
+        executor.shutdown(wait=False, cancel_futures=True)
+    
+    # Reduce: reconcile the folders proposed by each shard
+    folders = _folder_mapping(provider, files)
+    if folders:
+        yield {"type": "folders", "folders": folders}
+
+def _partition_summaries(summaries, token_budget):
+    """
+    Split summaries into shards that each fit in the token budget
+    
+    Summaries are sorted by path first so files from the same folder
+    are planned together.
+    
+    Args:
+        summaries: List of file summary dictionaries
+        token_budget: Maximum estimated prompt tokens per shard
+        
+    Returns:
+        List of shards (lists of summaries)
+    """
+    budget = max(1, token_budget - estimate_tokens(DEFAULT_PROMPT))
+    shards = []
+    current = []
+    used = 0
+    for summary in sorted(summaries, key=lambda s: s["file_path"]):
+        tokens = estimate_tokens(json.dumps(summary))
+        if current and used + tokens > budget:
+            shards.append(current)
+            current = []
+            used = 0
+        current.append(summary)
+        used += tokens
+    if current or not shards:
+        shards.append(current)
+    return shards
+
+def _plan_shard(provider, summaries, attempts=2):
+    """
+    Propose destinations for one shard, one per file sent
+
+    Proposals for paths that were not sent are dropped. Files the model
+    left out are requested again, up to `attempts` requests in all, and any
+    still missing (or all of them, if a request fails) are placed with the
+    extension map.
+
+    Args:
+        provider: LLM provider
+        summaries: Summaries of the shard's files
+        attempts: Maximum number of requests
+
+    Returns:
+        One src_path/dst_path proposal per summary, in the same order
+    """
+    wanted = {summary["file_path"]: summary for summary in summaries}
+    files = {}
+    for _ in range(attempts):
+        missing = [summary for path, summary in wanted.items() if path not in files]
+        if not missing:
+            break
+        try:
+            content = provider.chat(
+                [
+                    {"content": DEFAULT_PROMPT, "role": "system"},
+                    {"content": json.dumps(missing), "role": "user"},
+                ],
+                json_mode=True,
+            )
+
+            result = json.loads(content)
+            for file in result["files"]:
+                src_path = file.get("src_path")
+                if isinstance(src_path, str) and src_path in wanted and src_path not in files and file.get("dst_path"):
+                    files[src_path] = {"src_path": src_path, "dst_path": file["dst_path"]}
+        except Exception as e:
+            print(f"Error planning shard of {len(missing)} files: {e}")
+            break
+
+    missing = [summary for path, summary in wanted.items() if path not in files]
+    if missing:
+        print(f"No proposal for {len(missing)} of {len(wanted)} files, placing them by extension: "
+              f"{', '.join(summary['file_path'] for summary in missing[:10])}")
+        files.update((file["src_path"], file) for file in _mock_file_tree(missing))
+    return [files[path] for path in wanted]
+
+def _folder_mapping(provider, files):
+    """
+    Reconcile the folders proposed by independent shards into one taxonomy
+    
+    Only the distinct folder names and their file counts are sent, so the
+    merge request stays small regardless of how many files there are.
+    
+    Args:
+        provider: LLM provider
+        files: Combined src_path/dst_path proposals of all shards
         
-        cmpl = client.chat.completions.create(
-            messages=[
-                {"content": DEFAULT_PROMPT, "role": "system"},
-                {"content": summaries_json, "role": "user"},
+    Returns:
+        Dictionary mapping each proposed folder that changes to its folder
+        in the merged taxonomy (empty if the merge fails)
+    """
+    folder_counts = {}
+    for file in files:
+        folder = os.path.dirname(file["dst_path"])
+        folder_counts[folder] = folder_counts.get(folder, 0) + 1
+    
+    try:
+        content = provider.chat(
+            [
+                {"content": MERGE_PROMPT, "role": "system"},
+                {"content": json.dumps(folder_counts), "role": "user"},
             ],
-            model="llama-3.1-70b-versatile",
-            response_format={"type": "json_object"},
-            temperature=0,
+            json_mode=True,
         )
-        
-        result = json.loads(cmpl.choices[0].message.content)
-        return result["files"]
-        
+        result = json.loads(content)
+        return {
+            item["src_folder"]: item["dst_folder"]
+            for item in result.get("folders", [])
+            if "src_folder" in item and "dst_folder" in item and item["src_folder"] != item["dst_folder"]
+        }
     except Exception as e:
-        print(f"Error in create_file_tree: {e}")
-        return _mock_file_tree(summaries)
+        print(f"Error merging folder taxonomy, keeping shard folders: {e}")
+        return {}
+
+def _apply_folders(files, folders):
+    """Rewrite the destination folders of proposals with a mapping from `_folder_mapping`"""
+    for file in files:
+        folder, name = os.path.split(file["dst_path"])
+        if folder in folders:
+            file["dst_path"] = os.path.join(folders[folder], name)
+    return files
 
 def _mock_file_tree(summaries):
     """Create a mock file tree for testing or when API calls fail"""
     files = []
-    file_types = {
-        ".pdf": "Documents/PDFs",
-        ".docx": "Documents/Word",
-        ".xlsx": "Documents/Excel",
-        ".pptx": "Documents/PowerPoint",
-        ".txt": "Documents/Text",
-        ".jpg": "Images",
-        ".jpeg": "Images",
-        ".png": "Images",
-        ".gif": "Images",
-        ".mp3": "Audio",
-        ".wav": "Audio",
-        ".mp4": "Video",
-        ".mov": "Video",
-        ".py": "Code/Python",
-        ".js": "Code/JavaScript",
-        ".html": "Code/HTML",
-        ".css": "Code/CSS",
-        ".zip": "Archives",
-        ".rar": "Archives",
-    }
+    file_types = EXTENSION_FOLDERS
     
     for summary in summaries:
         src_path = summary["file_path"]
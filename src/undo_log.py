@@ -0,0 +1,495 @@
+"""
+Undo log for organization runs
+
+Every code path that moves files on its own (`/commit`, the natural
+language organizer, the PhotoPrism sorter and the watchdog FastSorter)
+records its moves here as one run: the source, the destination and a
+fingerprint of what landed there (inode, size, mtime and a hash of the
+first few kilobytes), plus the directories it created. Runs are kept in
+SQLite next to the other indexes.
+
+`UndoLog.rollback` replays a run in reverse. Each file's moves are
+collapsed into one move back to where it started, files that were changed,
+replaced or removed since the run (or whose original location is taken
+again) are reported as conflicts and left alone, and the rest are applied
+as a single move transaction, so the reversal is ordered, journaled and
+renamed in place wherever possible. Directories the run created are
+removed once they are empty.
+
+Usage:
+    python -m src.undo_log list
+    python -m src.undo_log show RUN_ID
+    python -m src.undo_log rollback RUN_ID [--dry-run]
+    python -m src.undo_log bench [--files N]
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional
+
+from src.config import config
+from src.error_handler import get_logger
+from src.move_engine import move_file
+from src.move_planner import MoveTransaction, plan_moves
+
+logger = get_logger(__name__)
+
+_lock = threading.RLock()
+
+# Rows buffered by a run before they are written
+FLUSH_EVERY = 500
+
+
+def fingerprint(path: str, hash_bytes: Optional[int] = None) -> Dict:
+    """
+    Identify what is at a path without reading all of it
+
+    Returns:
+        Dictionary with "inode", "size", "mtime_ns" and "hash_prefix" (a
+        SHA-256 prefix of the first `hash_bytes` bytes; None for
+        directories), all None if the path doesn't exist
+    """
+    try:
+        stat = os.stat(path, follow_symlinks=False)
+    except OSError:
+        return {"inode": None, "size": None, "mtime_ns": None, "hash_prefix": None}
+    hash_prefix = None
+    if os.path.isfile(path) and not os.path.islink(path):
+        hash_bytes = hash_bytes or config.get("undo_log.hash_bytes", 4096)
+        try:
+            with open(path, "rb") as f:
+                hash_prefix = hashlib.sha256(f.read(hash_bytes)).hexdigest()[:16]
+        except OSError:
+            pass
+    return {"inode": stat.st_ino, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "hash_prefix": hash_prefix}
+
+
+class UndoRun:
+    """Records the moves of one run; obtained from `UndoLog.start_run`"""
+
+    def __init__(self, log: "UndoLog", run_id: str, autoflush: bool = False):
+        self.log = log
+        self.id = run_id
+        self.autoflush = autoflush
+        self.count = 0
+        self._rows = []
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "UndoRun":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.finish("finished" if exc_type is None else "failed")
+
+    def _add(self, kind: str, src: Optional[str], dst: str, identity: Optional[Dict] = None) -> None:
+        identity = identity or {"inode": None, "size": None, "mtime_ns": None, "hash_prefix": None}
+        with self._lock:
+            self._rows.append((self.id, self.count, kind, src, dst, identity["inode"], identity["size"],
+                               identity["mtime_ns"], identity["hash_prefix"]))
+            self.count += 1
+            due = self.autoflush or len(self._rows) >= FLUSH_EVERY
+        if due:
+            self.flush()
+
+    def record(self, src: str, dst: str) -> None:
+        """Record a finished move of `src` to `dst`"""
+        dst = os.path.abspath(dst)
+        self._add("move", os.path.abspath(src), dst, fingerprint(dst))
+
+    def record_directory(self, path: str) -> None:
+        """Record a directory the run created"""
+        self._add("mkdir", None, os.path.abspath(path))
+
+    def makedirs(self, path: str) -> None:
+        """Create a directory and its missing parents, recording each one"""
+        missing = []
+        path = os.path.abspath(path)
+        while not os.path.isdir(path):
+            missing.append(path)
+            parent = os.path.dirname(path)
+            if parent == path:
+                break
+            path = parent
+        for directory in reversed(missing):
+            try:
+                os.mkdir(directory)
+            except FileExistsError:
+                continue
+            self.record_directory(directory)
+
+    def move_file(self, src: str, dst: str) -> str:
+        """
+        Move a file with `move_engine.move_file` and record it
+
+        Returns:
+            The final destination path
+        """
+        if not (os.path.isdir(dst) and not os.path.isdir(src)):
+            self.makedirs(os.path.dirname(os.path.abspath(dst)))
+        dst = move_file(src, dst)
+        self.record(src, dst)
+        return dst
+
+    def flush(self) -> None:
+        """Write the buffered records"""
+        with self._lock:
+            rows, self._rows = self._rows, []
+        if rows:
+            self.log._insert(self.id, rows)
+
+    def finish(self, status: str = "finished") -> None:
+        """Write the buffered records and close the run"""
+        self.flush()
+        self.log._finish(self.id, status)
+
+
+class UndoLog:
+    """Persistent per-run operation log stored next to evolution.db"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        Initialize the UndoLog
+
+        Args:
+            db_path: Path to the SQLite database (defaults to the data directory)
+        """
+        self.db_path = db_path or os.path.join(config.get("paths.data_dir"), "undo_log.db")
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._init_db()
+
+    def _init_db(self):
+        """Create the run and operation tables if they don't exist"""
+        with _lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS runs (
+                id TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                base_path TEXT,
+                started REAL NOT NULL,
+                finished REAL,
+                status TEXT NOT NULL,
+                operations INTEGER NOT NULL DEFAULT 0
+            )
+            ''')
+            self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS operations (
+                run_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                src TEXT,
+                dst TEXT NOT NULL,
+                inode INTEGER,
+                size INTEGER,
+                mtime_ns INTEGER,
+                hash_prefix TEXT,
+                undone INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (run_id, seq)
+            ) WITHOUT ROWID
+            ''')
+            self._conn.commit()
+
+    def start_run(self, source: str, base_path: Optional[str] = None, autoflush: bool = False) -> UndoRun:
+        """
+        Open a run
+
+        Args:
+            source: What is moving files ("commit", "natural_language", ...)
+            base_path: Directory the run organizes, if any
+            autoflush: Write every record immediately, for long-lived runs
+                such as file watchers
+
+        Returns:
+            UndoRun to record moves with
+        """
+        run_id = time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:8]
+        with _lock:
+            self._conn.execute(
+                "INSERT INTO runs (id, source, base_path, started, status) VALUES (?, ?, ?, ?, 'open')",
+                (run_id, source, os.path.abspath(base_path) if base_path else None, time.time())
+            )
+            self._conn.commit()
+        return UndoRun(self, run_id, autoflush)
+
+    def _insert(self, run_id: str, rows: List[tuple]) -> None:
+        with _lock:
+            self._conn.executemany(
+                "INSERT INTO operations (run_id, seq, kind, src, dst, inode, size, mtime_ns, hash_prefix) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            self._conn.execute("UPDATE runs SET operations = operations + ? WHERE id = ?", (len(rows), run_id))
+            self._conn.commit()
+
+    def _finish(self, run_id: str, status: str) -> None:
+        with _lock:
+            self._conn.execute("UPDATE runs SET finished = ?, status = ? WHERE id = ? AND status = 'open'",
+                               (time.time(), status, run_id))
+            self._conn.commit()
+
+    def record_transaction(self, transaction: MoveTransaction, source: str = "commit") -> str:
+        """
+        Record a committed move transaction as one run
+
+        Returns:
+            The run id
+        """
+        with self.start_run(source, transaction.base_path) as run:
+            for directory in transaction.created:
+                run.record_directory(directory)
+            for step in transaction.steps:
+                run.record(step.src, step.dst)
+        return run.id
+
+    def runs(self, limit: int = 50) -> List[Dict]:
+        """The most recent runs, newest first"""
+        with _lock:
+            rows = self._conn.execute(
+                "SELECT id, source, base_path, started, finished, status, operations FROM runs "
+                "ORDER BY started DESC LIMIT ?", (limit,)
+            ).fetchall()
+        keys = ("id", "source", "base_path", "started", "finished", "status", "operations")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def get_run(self, run_id: str) -> Optional[Dict]:
+        """One run, or None if it doesn't exist"""
+        with _lock:
+            row = self._conn.execute(
+                "SELECT id, source, base_path, started, finished, status, operations FROM runs WHERE id = ?",
+                (run_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("id", "source", "base_path", "started", "finished", "status", "operations"), row))
+
+    def operations(self, run_id: str, include_undone: bool = False) -> List[Dict]:
+        """The recorded operations of a run, in order"""
+        query = ("SELECT seq, kind, src, dst, inode, size, mtime_ns, hash_prefix, undone FROM operations "
+                 "WHERE run_id = ?" + ("" if include_undone else " AND undone = 0") + " ORDER BY seq")
+        with _lock:
+            rows = self._conn.execute(query, (run_id,)).fetchall()
+        keys = ("seq", "kind", "src", "dst", "inode", "size", "mtime_ns", "hash_prefix", "undone")
+        return [dict(zip(keys, row)) for row in rows]
+
+    @staticmethod
+    def _conflict(op: Dict, path: str) -> Optional[str]:
+        """Why the file recorded by `op` can't be moved back from `path`, if it can't"""
+        try:
+            stat = os.stat(path, follow_symlinks=False)
+        except OSError:
+            return "File no longer exists"
+        if op["inode"] is None:
+            return None
+        if os.path.isdir(path):
+            return None if stat.st_ino == op["inode"] else "Directory was replaced"
+        if stat.st_size != op["size"] or stat.st_mtime_ns != op["mtime_ns"]:
+            return "File was modified"
+        if stat.st_ino != op["inode"] and fingerprint(path)["hash_prefix"] != op["hash_prefix"]:
+            return "File was replaced"
+        return None
+
+    def plan_rollback(self, run_id: str) -> Dict:
+        """
+        Work out how to reverse a run
+
+        Returns:
+            Dictionary with "moves" (absolute src_path/dst_path pairs back to
+            the original locations, with the operation seqs they undo),
+            "conflicts" (files that are left alone, with the reason) and
+            "directories" (created directories, deepest first)
+        """
+        ops = self.operations(run_id)
+        # Follow each file from its first source to where it is now
+        current = {}
+        directories = []
+        for op in ops:
+            if op["kind"] == "mkdir":
+                directories.append(op)
+                continue
+            origin, seqs, _ = current.pop(op["src"], (op["src"], [], None))
+            current[op["dst"]] = (origin, seqs + [op["seq"]], op)
+
+        moves = []
+        conflicts = []
+        for path, (origin, seqs, op) in current.items():
+            if path == origin:
+                moves.append({"src_path": path, "dst_path": origin, "seqs": seqs})
+                continue
+            reason = self._conflict(op, path)
+            if reason is None and os.path.lexists(origin) and origin not in current:
+                reason = "Original location is taken"
+            if reason:
+                conflicts.append({"path": path, "original_path": origin, "reason": reason})
+            else:
+                moves.append({"src_path": path, "dst_path": origin, "seqs": seqs})
+
+        # A file that stays put also blocks whoever would move back onto it
+        staying = {conflict["path"] for conflict in conflicts}
+        blocked = True
+        while blocked:
+            blocked = [move for move in moves if move["dst_path"] in staying and move["src_path"] != move["dst_path"]]
+            for move in blocked:
+                moves.remove(move)
+                staying.add(move["src_path"])
+                conflicts.append({"path": move["src_path"], "original_path": move["dst_path"],
+                                  "reason": "Original location is taken"})
+        directories.sort(key=lambda op: op["dst"].count(os.sep), reverse=True)
+        return {"moves": moves, "conflicts": conflicts, "directories": directories}
+
+    def rollback(self, run_id: str, dry_run: bool = False) -> Dict:
+        """
+        Move the files of a run back where they came from
+
+        Conflicting files are skipped; rolling back again after resolving
+        them moves the rest.
+
+        Args:
+            run_id: Run to reverse
+            dry_run: Only report what would be moved
+
+        Returns:
+            Dictionary with the status, counts, conflicts and elapsed time
+
+        Raises:
+            KeyError: If the run doesn't exist
+            PlanError: If the reversal can't be ordered
+            FileOperationError: If a move fails (the reversal is rolled back)
+        """
+        run = self.get_run(run_id)
+        if run is None:
+            raise KeyError(run_id)
+        started = time.perf_counter()
+        plan = self.plan_rollback(run_id)
+        moves = [move for move in plan["moves"] if move["src_path"] != move["dst_path"]]
+        result = {
+            "id": run_id,
+            "status": "dry_run" if dry_run else None,
+            "restored": len(moves),
+            "conflicts": plan["conflicts"],
+            "moves": [{"src_path": m["src_path"], "dst_path": m["dst_path"]} for m in moves] if dry_run else None,
+        }
+        if dry_run:
+            result["elapsed_seconds"] = round(time.perf_counter() - started, 4)
+            return result
+
+        if moves:
+            paths = [path for move in moves for path in (move["src_path"], move["dst_path"])]
+            base = os.path.commonpath(paths)
+            steps = plan_moves(base, moves)
+            transaction = MoveTransaction(base, steps["steps"], steps["directories"])
+            transaction.apply()
+            result["renamed"] = transaction.stats["renamed"]
+            result["copied"] = transaction.stats["copied"]
+
+        undone = [seq for move in plan["moves"] for seq in move["seqs"]]
+        removed = []
+        for op in plan["directories"]:
+            try:
+                os.rmdir(op["dst"])
+            except OSError:
+                continue
+            undone.append(op["seq"])
+            removed.append(op["dst"])
+        status = "partially_rolled_back" if plan["conflicts"] else "rolled_back"
+        with _lock:
+            self._conn.executemany("UPDATE operations SET undone = 1 WHERE run_id = ? AND seq = ?",
+                                   [(run_id, seq) for seq in undone])
+            self._conn.execute("UPDATE runs SET status = ? WHERE id = ?", (status, run_id))
+            self._conn.commit()
+        result["status"] = status
+        result["directories_removed"] = len(removed)
+        result["elapsed_seconds"] = round(time.perf_counter() - started, 4)
+        logger.info(f"Rolled back run {run_id}: {len(moves)} files restored, {len(plan['conflicts'])} conflicts")
+        return result
+
+
+_undo_log = None
+_undo_log_lock = threading.Lock()
+
+
+def get_undo_log() -> UndoLog:
+    """Get the shared undo log"""
+    global _undo_log
+    with _undo_log_lock:
+        if _undo_log is None:
+            _undo_log = UndoLog()
+        return _undo_log
+
+
+def benchmark(files: int = 10000, directories: int = 100) -> Dict:
+    """
+    Measure recording and rolling back a run on a temporary tree
+
+    Returns:
+        Timings in seconds
+    """
+    import tempfile
+
+    results = {"files": files}
+    with tempfile.TemporaryDirectory() as root:
+        log = UndoLog(os.path.join(root, "undo.db"))
+        tree = os.path.join(root, "tree")
+        os.makedirs(tree)
+        names = [f"file{i}.txt" for i in range(files)]
+        for name in names:
+            with open(os.path.join(tree, name), "w") as f:
+                f.write(name)
+
+        start = time.perf_counter()
+        with log.start_run("benchmark", tree) as run:
+            for i, name in enumerate(names):
+                run.move_file(os.path.join(tree, name), os.path.join(tree, f"dir{i % directories}", name))
+        results["move_and_record_seconds"] = time.perf_counter() - start
+
+        # One file changed after the run must be left where it is
+        with open(os.path.join(tree, "dir0", names[0]), "a") as f:
+            f.write("changed")
+
+        start = time.perf_counter()
+        rollback = log.rollback(run.id)
+        results["rollback_seconds"] = time.perf_counter() - start
+        results["restored"] = rollback["restored"]
+        results["conflicts"] = len(rollback["conflicts"])
+        results["directories_removed"] = rollback["directories_removed"]
+        os.remove(os.path.join(tree, "dir0", names[0]))
+        results["tree_restored"] = sorted(os.listdir(tree)) == sorted(set(names[1:]) | {"dir0"})
+    return results
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    parser = argparse.ArgumentParser(description="List and roll back organization runs")
+    commands = parser.add_subparsers(dest="command", required=True)
+    list_parser = commands.add_parser("list", help="List recent runs")
+    list_parser.add_argument("--limit", type=int, default=20)
+    show_parser = commands.add_parser("show", help="Show the operations of a run")
+    show_parser.add_argument("run_id")
+    rollback_parser = commands.add_parser("rollback", help="Move a run's files back")
+    rollback_parser.add_argument("run_id")
+    rollback_parser.add_argument("--dry-run", action="store_true", help="Only report what would be moved")
+    bench_parser = commands.add_parser("bench", help="Time a rollback on a temporary tree")
+    bench_parser.add_argument("--files", type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        for key, value in benchmark(args.files).items():
+            print(f"{key}: {round(value, 4) if isinstance(value, float) else value}")
+        return
+    log = get_undo_log()
+    if args.command == "list":
+        for run in log.runs(args.limit):
+            print(f"{run['id']}  {run['source']:<18} {run['status']:<22} {run['operations']:>7}  "
+                  f"{run['base_path'] or ''}")
+    elif args.command == "show":
+        print(json.dumps({"run": log.get_run(args.run_id), "operations": log.operations(args.run_id, True)},
+                         indent=2))
+    else:
+        print(json.dumps(log.rollback(args.run_id, dry_run=args.dry_run), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Delta-only prompt context for watch mode
+
+Instead of sending every summary in the watched tree on each event, the
+watch planner sends the files affected by the event, a handful of their
+nearest neighbours (same folder, same extension, similar summary) and a
+compact digest of the existing folder taxonomy. The indexes are updated
+incrementally as summaries change, so building the context costs the
+same however large the tree grows.
+"""
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Set
+
+WORD_RE = re.compile(r"[a-z0-9]{4,}")
+
+# Words shared by more files than this carry no signal for similarity
+MAX_POSTING_SIZE = 200
+
+
+def _summary_text(summary) -> str:
+    if isinstance(summary, dict):
+        return str(summary.get("summary", ""))
+    return str(summary or "")
+
+
+class WatchPlanner:
+    """Incremental indexes over watch summaries for building small prompts"""
+
+    def __init__(self, max_neighbours: int = 8, max_folders: int = 40):
+        """
+        Initialize the WatchPlanner
+
+        Args:
+            max_neighbours: Maximum related files sent per request
+            max_folders: Maximum folders included in the taxonomy digest
+        """
+        self.max_neighbours = max_neighbours
+        self.max_folders = max_folders
+        self._reset()
+
+    def _reset(self) -> None:
+        self._by_folder: Dict[str, Set[str]] = defaultdict(set)
+        self._by_ext: Dict[str, Set[str]] = defaultdict(set)
+        self._by_word: Dict[str, Set[str]] = defaultdict(set)
+        self._words: Dict[str, Set[str]] = {}
+        self._folder_counts: Counter = Counter()
+
+    def rebuild(self, summaries_cache: Dict[str, Dict]) -> None:
+        """Index every summary in the cache from scratch"""
+        self._reset()
+        for file_path, summary in summaries_cache.items():
+            self.add(file_path, summary)
+
+    def add(self, file_path: str, summary) -> None:
+        """Index (or re-index) the summary of one file"""
+        self.remove(file_path)
+        folder = os.path.dirname(file_path)
+        self._by_folder[folder].add(file_path)
+        self._by_ext[os.path.splitext(file_path)[1].lower()].add(file_path)
+        self._folder_counts[folder] += 1
+
+        words = set(WORD_RE.findall(_summary_text(summary).lower()))
+        self._words[file_path] = words
+        for word in words:
+            self._by_word[word].add(file_path)
+
+    def remove(self, file_path: str) -> None:
+        """Drop a file from the indexes"""
+        words = self._words.pop(file_path, None)
+        if words is None:
+            return
+        folder = os.path.dirname(file_path)
+        self._by_folder[folder].discard(file_path)
+        self._by_ext[os.path.splitext(file_path)[1].lower()].discard(file_path)
+        self._folder_counts[folder] -= 1
+        if self._folder_counts[folder] <= 0:
+            del self._folder_counts[folder]
+        for word in words:
+            self._by_word[word].discard(file_path)
+
+    def folder_digest(self) -> Dict[str, int]:
+        """Return the most populated folders with their file counts"""
+        return dict(self._folder_counts.most_common(self.max_folders))
+
+    def neighbours(self, file_path: str, exclude: Iterable[str] = ()) -> List[str]:
+        """
+        Find files related to one file
+
+        Similar summaries are ranked first, then files from the same folder,
+        then files with the same extension.
+
+        Args:
+            file_path: File to find neighbours for
+            exclude: Paths that must not be returned
+
+        Returns:
+            Up to `max_neighbours` related paths
+        """
+        excluded = set(exclude) | {file_path}
+        scores = Counter()
+        for word in self._words.get(file_path, ()):
+            posting = self._by_word.get(word, ())
+            if len(posting) > MAX_POSTING_SIZE:
+                continue
+            for other in posting:
+                if other not in excluded:
+                    scores[other] += 1
+
+        result = [path for path, _ in scores.most_common(self.max_neighbours)]
+        for group in (self._by_folder.get(os.path.dirname(file_path), ()),
+                      self._by_ext.get(os.path.splitext(file_path)[1].lower(), ())):
+            for other in sorted(group):
+                if len(result) >= self.max_neighbours:
+                    return result
+                if other not in excluded and other not in result:
+                    result.append(other)
+        return result
+
+    def build_context(self, summaries_cache: Dict[str, Dict], affected_paths: Iterable[str]) -> Dict:
+        """
+        Build the prompt context for a batch of changed files
+
+        Args:
+            summaries_cache: Summaries keyed by path relative to the watched directory
+            affected_paths: Paths that need a placement proposal
+
+        Returns:
+            Dictionary with the affected "files", their "related_files" and the "folders" digest
+        """
+        affected = [path for path in dict.fromkeys(affected_paths) if path in summaries_cache]
+
+        related: List[str] = []
+        for path in affected:
+            for other in self.neighbours(path, exclude=affected):
+                if other not in related:
+                    related.append(other)
+        related = related[:self.max_neighbours * 2]
+
+        def entry(path):
+            return {"file_path": path, "summary": _summary_text(summaries_cache.get(path))}
+
+        return {
+            "files": [entry(path) for path in affected],
+            "related_files": [entry(path) for path in related if path in summaries_cache],
+            "folders": self.folder_digest(),
+        }
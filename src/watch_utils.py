@@ -1,14 +1,22 @@
 import asyncio
+import concurrent.futures
+import hashlib
 import json
 import os
 import time
 import threading
 
-from groq import Groq
 from watchdog.events import FileSystemEvent, FileSystemEventHandler
 from watchdog.observers import Observer
 
+from src.config import config
+from src.embedding_index import EmbeddingIndex, index_path_for
+from src.event_log import EventLog
+from src.event_pipeline import EventPipeline, PendingEvent
+from src.llm_provider import get_provider
 from src.loader import get_dir_summaries, get_file_summary
+from src.path_policy import get_path_policy
+from src.watch_planner import WatchPlanner
 
 # Add nest_asyncio for Jupyter compatibility
 try:
@@ -63,16 +71,55 @@ class Handler(FileSystemEventHandler):
         self.base_path = SafePathManager.get_safe_path(base_path)
         self.callback = callback
         self.queue = queue
-        self.events = []
-        self.summaries = []
+        self.events = EventLog(spill_path=self._event_spill_path())
         self.summaries_cache = {}
+        self.planner = WatchPlanner()
+        self.embeddings = EmbeddingIndex(
+            index_path_for(self.base_path), config.get("embedding_index.dimensions", 1024)
+        ) if config.get("embedding_index.enabled", True) else None
         self.active = True
         
         # Initialize evolutionary system if available
         self.evolution = EvolutionaryPrompt() if has_evolution else None
         
+        # Single-file summaries run on a dedicated event loop so stale ones can be cancelled
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = threading.Thread(target=self.loop.run_forever, name="watch-summaries", daemon=True)
+        self.loop_thread.start()
+        self.summary_tasks = {}
+        self.summary_lock = threading.Lock()
+        
+        # Coalesce event bursts and process them off the observer thread
+        self.pipeline = EventPipeline(self.process_events)
+        self.pipeline.start()
+        
         print(f"🔍 Watching directory: {self.base_path}")
         
+    def _event_spill_path(self):
+        """Return the file that receives events dropped from memory, if spilling is enabled"""
+        if not config.get("file_watching.event_history_spill", False):
+            return None
+        digest = hashlib.sha1(os.path.abspath(self.base_path).encode("utf-8")).hexdigest()[:12]
+        return os.path.join(config.get("paths.data_dir"), f"watch_events_{digest}.jsonl")
+        
+    @property
+    def summaries(self):
+        """All known file summaries"""
+        return list(self.summaries_cache.values())
+        
+    def stop(self, flush: bool = True):
+        """
+        Stop processing events
+
+        Args:
+            flush: Whether to process events that are still pending; this
+                blocks until their summaries and recommendations are done
+        """
+        if self.active:
+            self.pipeline.stop(flush=flush)
+            self.active = False
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        
     async def set_summaries(self):
         """Initialize file summaries asynchronously with Jupyter compatibility"""
         if not self.active:
@@ -80,9 +127,11 @@ class Handler(FileSystemEventHandler):
             
         print(f"📄 Getting summaries for {self.base_path}")
         try:
-            self.summaries = await get_dir_summaries(self.base_path)
-            self.summaries_cache = {s["file_path"]: s for s in self.summaries}
-            print(f"✅ Loaded {len(self.summaries)} file summaries")
+            summaries = await get_dir_summaries(self.base_path, get_path_policy())
+            self.summaries_cache = {s["file_path"]: s for s in summaries}
+            self.planner.rebuild(self.summaries_cache)
+            await asyncio.to_thread(self._sync_embeddings)
+            print(f"✅ Loaded {len(self.summaries_cache)} file summaries")
         except RuntimeError as e:
             # Handle async issues in Jupyter environments
             if "This event loop is already running" in str(e):
@@ -91,16 +140,25 @@ class Handler(FileSystemEventHandler):
             else:
                 raise
 
+    def _sync_embeddings(self):
+        """Bring the embedding index up to date with the summaries and persist it"""
+        if self.embeddings is None:
+            return
+        embedded, removed = self.embeddings.sync(self.summaries)
+        if embedded or removed:
+            self.embeddings.save()
+
     def _set_summaries_threaded(self):
         """Alternative method to get summaries in a separate thread"""
         def run_in_thread():
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
-            summaries = loop.run_until_complete(get_dir_summaries(self.base_path))
+            summaries = loop.run_until_complete(get_dir_summaries(self.base_path, get_path_policy()))
             loop.close()
-            self.summaries = summaries
-            self.summaries_cache = {s["file_path"]: s for s in self.summaries}
-            print(f"✅ Loaded {len(self.summaries)} file summaries (via thread)")
+            self.summaries_cache = {s["file_path"]: s for s in summaries}
+            self.planner.rebuild(self.summaries_cache)
+            self._sync_embeddings()
+            print(f"✅ Loaded {len(self.summaries_cache)} file summaries (via thread)")
             
         thread = threading.Thread(target=run_in_thread)
         thread.daemon = True
@@ -118,20 +176,61 @@ class Handler(FileSystemEventHandler):
             return False
         return True
 
-    def update_summary(self, file_path):
-        """Update summary for a single file"""
+    def cancel_summary(self, file_path):
+        """Cancel the in-flight summary of a file whose contents just changed"""
+        with self.summary_lock:
+            future = self.summary_tasks.pop(file_path, None)
+        if future is not None and future.cancel():
+            print(f"⏹️ Cancelled stale summary for {file_path}")
+
+    def start_summary(self, file_path):
+        """Start summarizing a file on the summary loop, replacing any in-flight summary of it"""
+        self.cancel_summary(file_path)
+        future = asyncio.run_coroutine_threadsafe(
+            get_file_summary(os.path.join(self.base_path, file_path)), self.loop
+        )
+        with self.summary_lock:
+            self.summary_tasks[file_path] = future
+        return future
+
+    def update_summary(self, file_path, future=None):
+        """
+        Update summary for a single file
+        
+        Args:
+            file_path: Path relative to the watched directory
+            future: Summary already started with `start_summary`, if any
+        """
         if not self.is_safe_operation(file_path):
             return
             
-        print(f"🔄 Updating summary for {file_path}")
         path = os.path.join(self.base_path, file_path)
         if not os.path.exists(path):
+            if future is not None:
+                future.cancel()
             if file_path in self.summaries_cache:
                 self.summaries_cache.pop(file_path)
+                self.planner.remove(file_path)
+                if self.embeddings is not None:
+                    self.embeddings.remove(file_path)
             return
             
-        self.summaries_cache[file_path] = get_file_summary(path)
-        self.summaries = list(self.summaries_cache.values())
+        print(f"🔄 Updating summary for {file_path}")
+        future = future or self.start_summary(file_path)
+        try:
+            summary = future.result()
+        except concurrent.futures.CancelledError:
+            # The file changed again; its next event brings a fresh summary
+            return
+        finally:
+            with self.summary_lock:
+                if self.summary_tasks.get(file_path) is future:
+                    del self.summary_tasks[file_path]
+            
+        self.summaries_cache[file_path] = summary
+        self.planner.add(file_path, self.summaries_cache[file_path])
+        if self.embeddings is not None:
+            self.embeddings.add(file_path, self.summaries_cache[file_path]["summary"])
         self.queue.put(
             {
                 "files": [
@@ -144,33 +243,98 @@ class Handler(FileSystemEventHandler):
             }
         )
 
+    def place_by_similarity(self, paths):
+        """
+        Place files next to their most similar organized neighbours
+
+        Args:
+            paths: Paths relative to the watched directory
+
+        Returns:
+            (placed, remaining) where placed is a list of {"src_path", "dst_path"}
+            recommendations and remaining are the paths that still need the LLM
+        """
+        if self.embeddings is None or not len(self.embeddings):
+            return [], list(paths)
+        
+        min_confidence = config.get("embedding_index.min_confidence", 0.6)
+        k = config.get("embedding_index.neighbours", 10)
+        placed, remaining = [], []
+        for path in paths:
+            summary = self.summaries_cache.get(path, {}).get("summary", "")
+            folder, confidence = self.embeddings.suggest_folder(path, summary, k=k)
+            if folder is None or confidence < min_confidence:
+                remaining.append(path)
+                continue
+            placed.append({
+                "src_path": path,
+                "dst_path": os.path.join(folder, os.path.basename(path)),
+            })
+            print(f"🧭 Placed {path} in {folder} by similarity ({confidence:.2f})")
+        return placed, remaining
+
     def process_event(self, event_type, src_path, dst_path=None):
-        """Process file events and trigger callbacks"""
-        if not self.is_safe_operation(src_path):
-            return
-            
-        # For move events, also check destination path safety
-        if dst_path and not self.is_safe_operation(dst_path):
-            return
+        """Process a single file event immediately"""
+        self.process_events([PendingEvent(event_type, src_path, dst_path)])
 
-        if event_type == "moved":
-            self.events.append({"src_path": src_path, "dst_path": dst_path})
-            self.update_summary(src_path)
-            self.update_summary(dst_path)
+    def process_events(self, events):
+        """Process a batch of coalesced file events and request one recommendation for it"""
+        affected = []
+        needs_recommendation = False
+        safe_events = []
+        for event in events:
+            if not self.is_safe_operation(event.src_path):
+                continue
+                
+            # For move events, also check destination path safety
+            if event.dst_path and not self.is_safe_operation(event.dst_path):
+                continue
+            safe_events.append(event)
+            
+        # Summarize every changed file of the batch concurrently
+        futures = {
+            event.path: self.start_summary(event.path)
+            for event in safe_events
+            if event.event_type != "deleted" and os.path.exists(os.path.join(self.base_path, event.path))
+        }
             
-            # Track move event in evolution system if available
-            if self.evolution and event_type == "moved":
-                self.evolution.track_outcome(src_path, src_path, dst_path)
-        else:
-            self.update_summary(src_path)
+        for event in safe_events:
+            if event.event_type == "moved":
+                self.events.append({"src_path": event.src_path, "dst_path": event.dst_path})
+                self.update_summary(event.src_path)
+                self.update_summary(event.dst_path, futures.get(event.dst_path))
+                
+                # Track move event in evolution system if available
+                if self.evolution:
+                    self.evolution.track_outcome(event.src_path, event.src_path, event.dst_path)
+            else:
+                self.update_summary(event.src_path, futures.get(event.src_path))
+                
+            if event.event_type in ["moved", "created", "deleted"]:
+                needs_recommendation = True
+            if event.event_type != "deleted":
+                affected.append(event.dst_path or event.src_path)
             
-        # Call callback for important events to get recommendations
-        if event_type in ["moved", "created", "deleted"]:
-            print(f"📋 Processing {event_type} event")
-            files = self.callback(
-                summaries=self.summaries, 
-                fs_events=json.dumps({"files": self.events})
+        # Call callback once per batch to get recommendations
+        if needs_recommendation:
+            print(f"📋 Processing batch of {len(events)} events")
+            # Confident placements come from the embedding index; the LLM only sees the rest
+            files, affected = self.place_by_similarity(
+                [path for path in dict.fromkeys(affected) if path in self.summaries_cache]
             )
+            if affected:
+                # Only the affected files, their neighbours and a folder digest are sent
+                context = self.planner.build_context(self.summaries_cache, affected)
+                files += self.callback(
+                    summaries=context["files"], 
+                    fs_events=json.dumps({"files": self.events.recent(
+                        config.get("file_watching.prompt_examples", 20)
+                    )}),
+                    related_files=context["related_files"],
+                    folders=context["folders"],
+                ) or []
+            if self.embeddings is not None:
+                self.embeddings.save()
             
             # Track recommendations in evolution system
             if self.evolution and files:
@@ -179,40 +343,48 @@ class Handler(FileSystemEventHandler):
             self.queue.put(files)
 
     def on_created(self, event: FileSystemEvent) -> None:
-        if event.is_directory:
+        if event.is_directory or not self.active:
             return
             
         src_path = os.path.relpath(event.src_path, self.base_path)
         print(f"➕ Created {src_path}")
-        self.process_event("created", src_path)
+        self.pipeline.submit("created", src_path)
 
     def on_deleted(self, event: FileSystemEvent) -> None:
-        if event.is_directory:
+        if event.is_directory or not self.active:
             return
             
         src_path = os.path.relpath(event.src_path, self.base_path)
         print(f"❌ Deleted {src_path}")
-        self.process_event("deleted", src_path)
+        self.cancel_summary(src_path)
+        self.pipeline.submit("deleted", src_path)
 
     def on_modified(self, event: FileSystemEvent) -> None:
-        if event.is_directory:
+        if event.is_directory or not self.active:
             return
             
         src_path = os.path.relpath(event.src_path, self.base_path)
         print(f"✏️ Modified {src_path}")
-        self.process_event("modified", src_path)
+        self.cancel_summary(src_path)
+        self.pipeline.submit("modified", src_path)
 
     def on_moved(self, event: FileSystemEvent) -> None:
-        if event.is_directory:
+        if event.is_directory or not self.active:
             return
             
         src_path = os.path.relpath(event.src_path, self.base_path)
         dest_path = os.path.relpath(event.dest_path, self.base_path)
         print(f"🔀 Moved {src_path} > {dest_path}")
-        self.process_event("moved", src_path, dest_path)
+        self.cancel_summary(src_path)
+        self.pipeline.submit("moved", src_path, dest_path)
 
 
-def create_file_tree(summaries, fs_events):
+DELTA_PROMPT = """
+Only the files that just changed are listed above. Propose destinations for those files only. Use the related files and the existing folders below as context so new files fit the current organization, and prefer existing folders over creating new ones.
+""".strip()
+
+
+def create_file_tree(summaries, fs_events, related_files=None, folders=None):
     # Ensure we're not processing GitHub paths
     if isinstance(fs_events, str):
         fs_events_data = json.loads(fs_events)
@@ -269,20 +441,26 @@ Here are a few examples of good file naming conventions to emulate, based on the
 Include the above items in your response exactly as is, along all other proposed changes.
 """.strip()
 
-    client = Groq()
-    cmpl = client.chat.completions.create(
-        messages=[
-            {"content": FILE_PROMPT, "role": "system"},
-            {"content": json.dumps(summaries), "role": "user"},
-            {"content": WATCH_PROMPT, "role": "system"},
-            {"content": json.dumps(fs_events_data), "role": "user"},
-        ],
-        model="llama-3.1-70b-versatile",
-        response_format={"type": "json_object"},
-        temperature=0,
-    )
+    messages = [
+        {"content": FILE_PROMPT, "role": "system"},
+        {"content": json.dumps(summaries), "role": "user"},
+    ]
+    if related_files is not None or folders is not None:
+        messages += [
+            {"content": DELTA_PROMPT, "role": "system"},
+            {"content": json.dumps({
+                "related_files": related_files or [],
+                "existing_folders": folders or {},
+            }), "role": "user"},
+        ]
+    messages += [
+        {"content": WATCH_PROMPT, "role": "system"},
+        {"content": json.dumps(fs_events_data), "role": "user"},
+    ]
+
+    content = get_provider().chat(messages, json_mode=True)
     
-    result = json.loads(cmpl.choices[0].message.content)["files"]
+    result = json.loads(content)["files"]
     
     # Track recommendations in evolution system if available
     try:
@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config import config  # noqa: E402
+
+_MISSING = object()
+
+
+@pytest.fixture
+def set_config():
+    """Set configuration values for one test, restoring them afterwards"""
+    saved = []
+
+    def set_value(key_path, value):
+        saved.append((key_path, config.get(key_path, _MISSING)))
+        config.set(key_path, value)
+
+    yield set_value
+    for key_path, value in reversed(saved):
+        if value is _MISSING:
+            parent, _, key = key_path.rpartition(".")
+            (config.get(parent) if parent else config._config).pop(key, None)
+        else:
+            config.set(key_path, value)
@@ -0,0 +1,24 @@
+import os
+
+from src.crawler import crawl
+
+
+def rel_paths(root, **kwargs):
+    return sorted(record.rel_path for record in crawl(str(root), **kwargs))
+
+
+def test_ignored_directories_are_pruned_at_any_depth(tmp_path):
+    for name in ("node_modules/x/f.js", "venv/h.py", "a/node_modules/g.js", "a/b.txt", "ok.txt", ".hidden"):
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(name)
+
+    assert rel_paths(tmp_path) == [os.path.join("a", "b.txt"), "ok.txt"]
+
+
+def test_ignore_rules_can_be_disabled(tmp_path):
+    (tmp_path / "venv").mkdir()
+    (tmp_path / "venv" / "h.py").write_text("h")
+    (tmp_path / "ok.txt").write_text("ok")
+
+    assert rel_paths(tmp_path, apply_ignore_rules=False) == ["ok.txt", os.path.join("venv", "h.py")]
@@ -0,0 +1,49 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from src.embedding_index import EmbeddingIndex
+
+SUMMARIES = [
+    {"file_path": "Finance/electricity_jan.pdf", "summary": "electricity invoice utility bill amount due january"},
+    {"file_path": "Finance/electricity_feb.pdf", "summary": "electricity invoice utility bill amount due february"},
+    {"file_path": "Photos/beach.jpg", "summary": "sunset over a sandy beach with waves"},
+    {"file_path": "unsorted.txt", "summary": "electricity invoice utility bill amount due march"},
+]
+
+
+def test_sync_embeds_only_changes(tmp_path):
+    index = EmbeddingIndex(str(tmp_path / "index.npz"), dim=256)
+    assert index.sync(SUMMARIES) == (4, 0)
+    assert index.sync(SUMMARIES) == (0, 0)
+
+    changed = [dict(SUMMARIES[0], summary="gas invoice")] + SUMMARIES[1:3]
+    assert index.sync(changed) == (1, 1)
+    assert "unsorted.txt" not in index and len(index) == 3
+
+    index.save()
+    reloaded = EmbeddingIndex(str(tmp_path / "index.npz"))
+    assert len(reloaded) == 3
+    assert reloaded.sync(changed) == (0, 0)
+
+
+def test_suggest_folder_votes_among_organized_neighbours():
+    index = EmbeddingIndex(dim=256)
+    index.sync(SUMMARIES)
+
+    folder, confidence = index.suggest_folder("new.pdf", "electricity invoice utility bill amount due april")
+    assert folder == "Finance"
+    assert 0 < confidence <= 1
+
+    # Files in the root are not organized and don't vote
+    root_only = EmbeddingIndex(dim=256)
+    root_only.sync(SUMMARIES[3:])
+    assert root_only.suggest_folder("new.pdf", SUMMARIES[3]["summary"]) == (None, 0.0)
+
+
+def test_a_file_is_not_its_own_neighbour():
+    index = EmbeddingIndex(dim=256)
+    index.sync(SUMMARIES)
+    neighbours = index.query(SUMMARIES[0]["summary"], k=2, exclude=[SUMMARIES[0]["file_path"]])
+    assert neighbours[0][0] == "Finance/electricity_feb.pdf"
+    assert all(path != SUMMARIES[0]["file_path"] for path, _ in neighbours)
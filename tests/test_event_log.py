@@ -0,0 +1,38 @@
+from src.event_log import EventLog
+
+
+def moves(count):
+    return [{"src_path": f"in/{i}.txt", "dst_path": f"out/{i}.txt"} for i in range(1, count + 1)]
+
+
+def test_replay_reads_spilled_events_before_memory(tmp_path):
+    log = EventLog(max_events=3, max_age_seconds=0, spill_path=str(tmp_path / "events.jsonl"))
+    for event in moves(5):
+        log.append(event)
+
+    assert len(log) == 3
+    assert log.cursor == 5
+    assert [e["seq"] for e in log.since(0)] == [1, 2, 3, 4, 5]
+    assert [e["seq"] for e in log.since(1, limit=2)] == [2, 3]
+    assert [e["seq"] for e in log.since(3)] == [4, 5]
+    assert log.since(5) == []
+    assert [e["src_path"] for e in log.recent(2)] == ["in/4.txt", "in/5.txt"]
+
+
+def test_without_spill_old_events_are_gone(tmp_path):
+    log = EventLog(max_events=2, max_age_seconds=0)
+    for event in moves(4):
+        log.append(event)
+    assert [e["seq"] for e in log.since(0)] == [3, 4]
+
+
+def test_events_past_the_age_limit_are_spilled(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("src.event_log.time.time", lambda: now[0])
+    log = EventLog(max_events=10, max_age_seconds=60, spill_path=str(tmp_path / "events.jsonl"))
+    log.append(moves(1)[0])
+    now[0] += 120
+    log.append(moves(2)[1])
+
+    assert len(log) == 1
+    assert [e["seq"] for e in log.since(0)] == [1, 2]
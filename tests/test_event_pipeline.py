@@ -0,0 +1,58 @@
+import threading
+
+import pytest
+
+from src.event_pipeline import EventPipeline
+
+
+def coalesce(*events):
+    batches = []
+    pipeline = EventPipeline(batches.append, quiet_seconds=60, max_wait_seconds=60)
+    for event in events:
+        pipeline.submit(*event)
+    pipeline.stop()
+    return [(e.event_type, e.src_path, e.dst_path) for batch in batches for e in batch]
+
+
+@pytest.mark.parametrize("events, expected", [
+    ([("created", "a"), ("modified", "a")], [("created", "a", None)]),
+    ([("modified", "a"), ("modified", "a")], [("modified", "a", None)]),
+    ([("created", "a"), ("deleted", "a")], []),
+    ([("modified", "a"), ("deleted", "a")], [("deleted", "a", None)]),
+    ([("deleted", "a"), ("created", "a")], [("modified", "a", None)]),
+    ([("created", "a"), ("moved", "a", "b")], [("created", "b", None)]),
+    ([("moved", "a", "b"), ("moved", "b", "c")], [("moved", "a", "c")]),
+    ([("moved", "a", "b"), ("moved", "b", "a")], [("modified", "a", None)]),
+    ([("moved", "a", "b"), ("modified", "b")], [("moved", "a", "b")]),
+    ([("moved", "a", "b"), ("deleted", "b")], [("deleted", "a", None)]),
+    ([("created", "a"), ("modified", "b")], [("created", "a", None), ("modified", "b", None)]),
+])
+def test_events_for_one_file_are_merged(events, expected):
+    assert coalesce(*events) == expected
+
+
+def test_stop_without_flush_drops_pending_events():
+    batches = []
+    pipeline = EventPipeline(batches.append, quiet_seconds=60, max_wait_seconds=60)
+    pipeline.submit("created", "a")
+    pipeline.stop(flush=False)
+    assert batches == []
+
+
+def test_a_burst_is_processed_as_one_batch():
+    batches = []
+    done = threading.Event()
+
+    def process(batch):
+        batches.append(batch)
+        done.set()
+
+    pipeline = EventPipeline(process, quiet_seconds=0.05, max_wait_seconds=5)
+    pipeline.start()
+    try:
+        for name in ("a", "b", "c"):
+            pipeline.submit("created", name)
+        assert done.wait(2)
+    finally:
+        pipeline.stop()
+    assert [[e.path for e in batch] for batch in batches] == [["a", "b", "c"]]
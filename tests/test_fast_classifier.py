@@ -0,0 +1,62 @@
+import pytest
+
+from src.fast_classifier import FastPathClassifier
+
+
+@pytest.fixture
+def classifier():
+    return FastPathClassifier(min_confidence=0.9, use_learned_patterns=False)
+
+
+def write(tmp_path, name, data=b""):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def ftyp(brand):
+    return b"\x00\x00\x00\x18ftyp" + brand + b"\x00\x00\x00\x00" + brand
+
+
+def test_tiers_in_order(classifier, tmp_path):
+    screenshot = classifier.classify(write(tmp_path, "Screenshot 2024-01-02.zip"))
+    assert (screenshot["tier"], screenshot["category"]) == ("name", "Images/Screenshots")
+    archive = classifier.classify(write(tmp_path, "backup.zip"))
+    assert (archive["tier"], archive["category"]) == ("extension", "Archives")
+    assert classifier.classify(write(tmp_path, "notes.txt", b"hello")) is None
+    assert classifier.report() == {"name": 1, "extension": 1, "llm": 1}
+
+
+def test_sniffs_files_without_an_extension(classifier, tmp_path):
+    result = classifier.classify(write(tmp_path, "download", b"PK\x03\x04rest"))
+    assert (result["tier"], result["category"]) == ("mime", "Archives")
+
+
+def test_signature_must_agree_with_the_extension(classifier, tmp_path):
+    # Two bytes of "MZ" at the start of a text or PDF file prove nothing
+    assert classifier.classify(write(tmp_path, "mz.txt", b"MZ is a postcode")) is None
+    assert classifier.classify(write(tmp_path, "report.pdf", b"MZ\x90\x00")) is None
+    result = classifier.classify(write(tmp_path, "tool.dll", b"MZ\x90\x00"))
+    assert result["category"] == "Installers"
+
+
+@pytest.mark.parametrize("name, brand", [("IMG.heic", b"heic"), ("photo.avif", b"avif"), ("scan", b"mif1")])
+def test_heif_photos_are_left_for_the_llm(classifier, tmp_path, name, brand):
+    assert classifier.classify(write(tmp_path, name, ftyp(brand))) is None
+
+
+@pytest.mark.parametrize("name, brand, folder", [("clip", b"isom", "Video"), ("song", b"M4A ", "Audio")])
+def test_iso_media_is_told_apart_by_brand(classifier, tmp_path, name, brand, folder):
+    assert classifier.classify(write(tmp_path, name, ftyp(brand)))["category"] == folder
+
+
+def test_exif_photo_is_filed_by_year(classifier, tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    path = str(tmp_path / "holiday.jpg")
+    exif = Image.Exif()
+    exif[271] = "Canon"
+    exif[306] = "2021:07:14 18:02:11"
+    Image.new("RGB", (8, 8)).save(path, exif=exif)
+
+    result = classifier.classify(path)
+    assert (result["tier"], result["category"]) == ("exif", "Images/Photos/2021")
@@ -0,0 +1,47 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from src.image_stage import ImageStage
+
+
+@pytest.fixture
+def stage(tmp_path):
+    return ImageStage(thumbnail_dir=str(tmp_path), max_distance=2)
+
+
+def test_near_duplicates_wait_for_the_owner(stage):
+    owner, future = stage.begin(0b1010)
+    assert owner
+    waiter, shared = stage.begin(0b1011)
+    assert not waiter and shared is future
+
+    stage.finish(0b1010, future, "A cat")
+    assert shared.result() == "A cat"
+    # Later near-duplicates reuse the finished summary
+    again, done = stage.begin(0b1000)
+    assert not again and done.result() == "A cat"
+
+
+def test_released_claim_can_be_taken_over(stage):
+    owner, future = stage.begin(0b1010)
+    _, shared = stage.begin(0b1011)
+
+    stage.release(0b1010, future)
+    assert shared.cancelled()
+    # The first waiter to claim again becomes the owner; the others join it
+    owner, retry = stage.begin(0b1011)
+    assert owner
+    joined, same = stage.begin(0b1010)
+    assert not joined and same is retry
+
+
+def test_failure_reaches_waiters(stage):
+    _, future = stage.begin(0b1010)
+    _, shared = stage.begin(0b1011)
+
+    stage.finish(0b1010, future, error=ValueError("model down"))
+    with pytest.raises(ValueError):
+        shared.result()
+    # A failed picture is not remembered
+    assert stage.begin(0b1010)[0]
@@ -0,0 +1,175 @@
+import asyncio
+import importlib.util
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from types import SimpleNamespace
+
+import pytest
+
+from src.fake_llm_server import CHAT_PATH, create_server
+from src.llm_provider import CircuitBreaker, CircuitOpenError, GroqProvider, RetryPolicy
+
+MESSAGES = [{"role": "user", "content": "Say hi"}]
+
+HAS_GROQ = importlib.util.find_spec("groq") is not None
+
+
+class StatusError(Exception):
+    """HTTP error shaped like the SDK's: a status_code and the response headers"""
+
+    def __init__(self, status_code, headers):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers)
+
+
+class UrllibClient:
+    """Minimal stand-in for the Groq client when the SDK is not installed"""
+
+    def __init__(self, base_url, timeout):
+        self.url = base_url.rstrip("/") + CHAT_PATH
+        self.timeout = timeout
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def _post(self, request):
+        http_request = urllib.request.Request(
+            self.url, data=json.dumps(request).encode("utf-8"), headers={"Content-Type": "application/json"}
+        )
+        try:
+            with urllib.request.urlopen(http_request, timeout=self.timeout) as response:
+                body = json.load(response)
+        except urllib.error.HTTPError as e:
+            raise StatusError(e.code, e.headers) from None
+        content = body["choices"][0]["message"]["content"]
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    def create(self, **request):
+        return self._post(request)
+
+
+class AsyncUrllibClient(UrllibClient):
+    async def create(self, **request):
+        return await asyncio.to_thread(self._post, request)
+
+
+@pytest.fixture
+def server():
+    server = create_server(port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def provider(server, monkeypatch, set_config):
+    monkeypatch.setenv("GROQ_API_KEY", "test")
+    set_config("llm.fallback_provider", None)
+    set_config("llm.hedge_after_seconds", None)
+    provider = GroqProvider(model="fake", timeout=5, retry=RetryPolicy(max_attempts=3, base_delay=0.001))
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    provider.settings = {**provider.settings, "base_url": base_url}
+    if not HAS_GROQ:
+        monkeypatch.setattr(provider, "_create_client", lambda: UrllibClient(base_url, provider.timeout))
+        monkeypatch.setattr(provider, "_create_async_client", lambda: AsyncUrllibClient(base_url, provider.timeout))
+    return provider
+
+
+def test_retries_honor_retry_after(server, provider):
+    server.statuses = (429,)
+    server.retry_after = 0.3
+    server.fail_first = 2
+
+    start = time.monotonic()
+    assert provider.chat(MESSAGES) == "OK"
+    elapsed = time.monotonic() - start
+
+    assert server.requests == 3
+    # Without Retry-After the backoff would be about a millisecond
+    assert elapsed >= 0.6
+    assert provider.breaker.state == "closed"
+
+
+def test_async_retries_server_errors(server, provider):
+    server.statuses = (500, 503)
+    server.retry_after = 0
+    server.fail_first = 2
+
+    assert asyncio.run(provider.achat(MESSAGES)) == "OK"
+    assert server.requests == 3
+
+
+def test_gives_up_after_max_attempts(server, provider):
+    server.statuses = (503,)
+    server.retry_after = 0
+    server.fail_first = 10
+
+    with pytest.raises(Exception) as error:
+        provider.chat(MESSAGES)
+    assert getattr(error.value, "status_code", None) == 503
+    assert server.requests == 3
+
+
+def test_breaker_opens_half_opens_and_closes(server, provider):
+    provider.retry = RetryPolicy(max_attempts=1)
+    provider.breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.3)
+    server.statuses = (500,)
+    server.fail_first = 2
+
+    for _ in range(2):
+        with pytest.raises(Exception):
+            provider.chat(MESSAGES)
+    assert provider.breaker.state == "open"
+
+    # Open: calls fail fast without reaching the server
+    with pytest.raises(CircuitOpenError):
+        provider.chat(MESSAGES)
+    assert server.requests == 2
+
+    time.sleep(0.35)
+    assert provider.breaker.state == "half-open"
+    assert provider.chat(MESSAGES) == "OK"
+    assert provider.breaker.state == "closed"
+    assert server.requests == 3
+
+
+def test_failed_probe_reopens_the_circuit(server, provider):
+    provider.retry = RetryPolicy(max_attempts=1)
+    provider.breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.2)
+    server.statuses = (503,)
+    server.retry_after = 0
+    server.fail_first = 2
+
+    with pytest.raises(Exception):
+        provider.chat(MESSAGES)
+    time.sleep(0.25)
+    with pytest.raises(Exception) as error:
+        provider.chat(MESSAGES)
+    assert not isinstance(error.value, CircuitOpenError)
+    assert provider.breaker.state == "open"
+
+    time.sleep(0.25)
+    assert asyncio.run(provider.achat(MESSAGES)) == "OK"
+    assert provider.breaker.state == "closed"
+
+
+def test_slow_call_is_hedged(server, provider):
+    provider.hedge_after = 0.2
+    server.slow_seconds = 2
+    server.slow_rate = 1.0
+
+    async def run():
+        # Only the first request is slow; the hedged duplicate answers at once
+        asyncio.get_running_loop().call_later(0.1, setattr, server, "slow_rate", 0.0)
+        start = time.monotonic()
+        reply = await provider.achat(MESSAGES)
+        return reply, time.monotonic() - start
+
+    reply, elapsed = asyncio.run(run())
+    assert reply == "OK"
+    assert elapsed < 1.5
+    assert server.requests == 2
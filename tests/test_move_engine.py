@@ -0,0 +1,83 @@
+import errno
+import os
+
+import pytest
+
+from src import move_engine
+from src.move_engine import PARTIAL_SUFFIX, MoveEngine, Throttle
+
+DATA = os.urandom(300 * 1024)
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    """An engine that treats every move as crossing filesystems"""
+    engine = MoveEngine(verify=True, chunk_size=64 * 1024, throttle=Throttle())
+    monkeypatch.setattr(engine, "same_device", lambda src, dst: False)
+    return engine
+
+
+def test_cross_device_move_copies_and_deletes(tmp_path, engine):
+    src = tmp_path / "a.bin"
+    src.write_bytes(DATA)
+    dst = tmp_path / "b.bin"
+
+    assert engine.move(str(src), str(dst)) == "copied"
+    assert dst.read_bytes() == DATA
+    assert not src.exists()
+    assert not os.path.exists(str(dst) + PARTIAL_SUFFIX)
+
+
+def test_directories_are_copied_recursively(tmp_path, engine):
+    src = tmp_path / "src"
+    (src / "nested").mkdir(parents=True)
+    (src / "nested" / "a.bin").write_bytes(DATA)
+
+    engine.move(str(src), str(tmp_path / "dst"))
+    assert (tmp_path / "dst" / "nested" / "a.bin").read_bytes() == DATA
+    assert not src.exists()
+
+
+def test_unsupported_zero_copy_falls_back_to_read_write(tmp_path, engine, monkeypatch):
+    def unsupported(*args):
+        raise OSError(errno.EXDEV, "cross-device")
+
+    monkeypatch.setattr(os, "copy_file_range", unsupported, raising=False)
+    monkeypatch.setattr(os, "sendfile", unsupported, raising=False)
+    src = tmp_path / "a.bin"
+    src.write_bytes(DATA)
+
+    engine.copy_file(str(src), str(tmp_path / "b.bin"))
+    assert (tmp_path / "b.bin").read_bytes() == DATA
+
+
+def test_checksum_mismatch_keeps_the_source(tmp_path, engine, monkeypatch):
+    src = tmp_path / "a.bin"
+    src.write_bytes(DATA)
+    dst = tmp_path / "b.bin"
+    monkeypatch.setattr(move_engine, "checksum", lambda path: path)
+
+    with pytest.raises(OSError) as excinfo:
+        engine.move(str(src), str(dst))
+    assert excinfo.value.errno == errno.EIO
+    assert src.read_bytes() == DATA
+    assert not dst.exists()
+    assert not os.path.exists(str(dst) + PARTIAL_SUFFIX)
+
+
+def test_throttle_sleeps_to_stay_under_the_cap(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(move_engine.time, "sleep", sleeps.append)
+
+    Throttle().consume(10 ** 9)
+    assert sleeps == []
+
+    throttle = Throttle(bytes_per_second=1000)
+    throttle.consume(2000)
+    assert sleeps and sleeps[-1] == pytest.approx(2.0, abs=0.05)
+
+
+def test_work_hours_cap_applies_during_work_hours():
+    assert Throttle(1000, 10, work_hours=(0, 24)).rate() == 10
+    assert Throttle(1000, 10, work_hours=None).rate() == 1000
+    assert Throttle(1000, None, work_hours=(0, 24)).rate() == 1000
@@ -0,0 +1,161 @@
+import os
+import threading
+
+import pytest
+
+from src.error_handler import FileOperationError
+from src.move_planner import TEMP_SUFFIX, MoveTransaction, PlanError, plan_moves, read_journal, recover
+
+
+def make_files(root, names):
+    for name in names:
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(name)
+
+
+def read(root, name):
+    with open(os.path.join(root, name)) as f:
+        return f.read()
+
+
+def transaction(root, moves, journal="journal.jsonl", cls=MoveTransaction):
+    plan = plan_moves(root, moves)
+    return cls(root, plan["steps"], plan["directories"], journal_path=os.path.join(root, journal))
+
+
+class FailingTransaction(MoveTransaction):
+    """Fails the move after `fail_after` steps have finished"""
+    fail_after = 0
+
+    def _move(self, src, dst):
+        if self.fail_after is not None and len(self.done) == self.fail_after:
+            self.fail_after = None
+            raise OSError("Injected failure")
+        super()._move(src, dst)
+
+
+def test_swap_goes_through_a_temporary_name(tmp_path):
+    root = str(tmp_path)
+    make_files(root, ["a", "b"])
+    plan = plan_moves(root, [{"src_path": "a", "dst_path": "b"}, {"src_path": "b", "dst_path": "a"}])
+
+    steps = plan["steps"]
+    assert len(steps) == 3
+    assert steps[0].dst.endswith(TEMP_SUFFIX)
+    assert steps[-1].src == steps[0].dst
+
+    transaction(root, [{"src_path": "a", "dst_path": "b"}, {"src_path": "b", "dst_path": "a"}]).apply()
+    assert read(root, "a") == "b"
+    assert read(root, "b") == "a"
+    assert sorted(os.listdir(root)) == ["a", "b"]
+
+
+def test_cycle_and_chain_are_ordered(tmp_path):
+    root = str(tmp_path)
+    make_files(root, ["a", "b", "c", "x", "y"])
+    moves = [
+        {"src_path": "a", "dst_path": "b"}, {"src_path": "b", "dst_path": "c"}, {"src_path": "c", "dst_path": "a"},
+        # y must move away before x takes its name
+        {"src_path": "x", "dst_path": "y"}, {"src_path": "y", "dst_path": "sub/z"},
+    ]
+    steps = plan_moves(root, moves)["steps"]
+    assert len(steps) == 6
+    order = [(os.path.basename(step.src), os.path.relpath(step.dst, root)) for step in steps]
+    assert order.index(("y", os.path.join("sub", "z"))) < order.index(("x", "y"))
+
+    transaction(root, moves).apply()
+    assert [read(root, name) for name in ("a", "b", "c", "y", "sub/z")] == ["c", "a", "b", "x", "y"]
+
+
+def test_plan_problems_are_all_reported(tmp_path):
+    root = str(tmp_path)
+    make_files(root, ["a", "b", "c"])
+    with pytest.raises(PlanError) as error:
+        plan_moves(root, [
+            {"src_path": "a", "dst_path": "b"},  # b exists and isn't moved away
+            {"src_path": "missing", "dst_path": "d"},
+            {"src_path": "c", "dst_path": "../outside"},
+        ])
+    assert sorted(problem["error"] for problem in error.value.problems) == [
+        "Destination already exists", "Path is outside the base directory", "Source path does not exist",
+    ]
+
+
+def test_commit_deletes_the_journal(tmp_path):
+    root = str(tmp_path)
+    make_files(root, ["a"])
+    move = transaction(root, [{"src_path": "a", "dst_path": "new/a"}])
+    journal = move.journal_path
+
+    result = move.apply()
+    assert result["status"] == "committed"
+    assert result["directories_created"] == 1
+    assert not os.path.exists(journal)
+    assert move.journal_path is None
+
+
+def test_failed_apply_rolls_back(tmp_path):
+    root = str(tmp_path)
+    names = [f"f{i}" for i in range(5)]
+    make_files(root, names)
+    move = transaction(root, [{"src_path": n, "dst_path": f"dir/{n}"} for n in names], cls=FailingTransaction)
+    move.fail_after = 3
+    journal = move.journal_path
+
+    with pytest.raises(FileOperationError):
+        move.apply()
+    assert sorted(os.listdir(root)) == names
+    assert not os.path.exists(journal)
+
+
+@pytest.mark.parametrize("direction", ["forward", "back"])
+def test_recover_interrupted_transaction(tmp_path, direction):
+    root = str(tmp_path)
+    names = [f"f{i}" for i in range(5)]
+    make_files(root, names)
+    moves = [{"src_path": n, "dst_path": f"dir/{n}"} for n in names]
+    move = transaction(root, moves, cls=FailingTransaction)
+    move.fail_after = 2
+
+    with pytest.raises(FileOperationError):
+        move.apply(rollback_on_error=False)
+    journal = read_journal(move.journal_path)
+    assert journal["state"] == "pending"
+    assert len(journal["done"]) == 2
+
+    result = recover(move.journal_path, direction)
+    if direction == "forward":
+        assert result["status"] == "committed"
+        assert sorted(os.listdir(os.path.join(root, "dir"))) == names
+    else:
+        assert result["status"] == "rolled_back"
+        assert sorted(os.listdir(root)) == names
+    assert not os.path.exists(os.path.join(root, "journal.jsonl"))
+
+
+def test_cross_device_moves_run_on_the_transaction_pool(tmp_path):
+    root = str(tmp_path)
+    names = [f"f{i}" for i in range(6)]
+    make_files(root, names)
+    threads = []
+
+    class CopyingEngine:
+        def move(self, src, dst):
+            threads.append(threading.current_thread().name)
+            os.rename(src, dst)
+            return "copied"
+
+    class CrossDeviceTransaction(MoveTransaction):
+        def _same_device(self, src, dst):
+            return False
+
+    plan = plan_moves(root, [{"src_path": n, "dst_path": f"dir/{n}"} for n in names])
+    move = CrossDeviceTransaction(root, plan["steps"], plan["directories"],
+                                  journal_path=os.path.join(root, "journal.jsonl"),
+                                  engine=CopyingEngine(), max_workers=2)
+    result = move.apply()
+    assert result["copied"] == 6
+    assert sorted(os.listdir(os.path.join(root, "dir"))) == names
+    assert all(name.startswith("move") for name in threads)
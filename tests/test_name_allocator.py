@@ -0,0 +1,71 @@
+import os
+
+from src.name_allocator import NameAllocator
+
+
+def test_collisions_get_increasing_suffixes(tmp_path):
+    (tmp_path / "IMG.jpg").touch()
+    (tmp_path / "IMG_2.jpg").touch()
+    allocator = NameAllocator(verify=False)
+    wanted = str(tmp_path / "IMG.jpg")
+
+    names = [os.path.basename(allocator.allocate(wanted)) for _ in range(4)]
+    assert names == ["IMG_1.jpg", "IMG_3.jpg", "IMG_4.jpg", "IMG_5.jpg"]
+    # Other extensions count separately
+    assert os.path.basename(allocator.allocate(str(tmp_path / "IMG.png"))) == "IMG.png"
+
+
+def test_release_hands_the_name_back(tmp_path):
+    allocator = NameAllocator(verify=False)
+    wanted = str(tmp_path / "report.txt")
+    assert allocator.allocate(wanted) == wanted
+    first = allocator.allocate(wanted)
+    second = allocator.allocate(wanted)
+
+    allocator.release(first)
+    assert allocator.allocate(wanted) == first
+    allocator.release(wanted)
+    assert allocator.allocate(wanted) == wanted
+    assert allocator.allocate(wanted) == str(tmp_path / "report_3.txt")
+    assert second == str(tmp_path / "report_2.txt")
+
+
+def test_without_reserve_the_name_stays_free(tmp_path):
+    allocator = NameAllocator(verify=False)
+    wanted = str(tmp_path / "a.txt")
+    assert allocator.allocate(wanted, reserve=False) == wanted
+    assert allocator.allocate(wanted) == wanted
+    assert allocator.allocate(wanted, reserve=False) == str(tmp_path / "a_1.txt")
+    assert allocator.allocate(wanted) == str(tmp_path / "a_1.txt")
+
+
+def test_verify_sees_files_created_after_listing(tmp_path):
+    allocator = NameAllocator(verify=True)
+    wanted = str(tmp_path / "a.txt")
+    assert allocator.allocate(str(tmp_path / "b.txt")) == str(tmp_path / "b.txt")  # lists the directory
+
+    (tmp_path / "a.txt").touch()
+    (tmp_path / "a_1.txt").touch()
+    assert allocator.allocate(wanted) == str(tmp_path / "a_2.txt")
+
+    # A listed file removed since is free again
+    os.remove(tmp_path / "a.txt")
+    assert allocator.allocate(wanted) == wanted
+
+
+def test_relative_paths_stay_relative(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "x.txt").touch()
+    assert NameAllocator().allocate("x.txt") == "x_1.txt"
+
+
+def test_counters_do_not_rewind_without_release(tmp_path):
+    allocator = NameAllocator(verify=True)
+    wanted = str(tmp_path / "a.txt")
+    (tmp_path / "a.txt").touch()
+    first = allocator.allocate(wanted)
+    open(first, "w").close()
+
+    # The reserved name stays taken after its file is moved away
+    os.remove(first)
+    assert allocator.allocate(wanted) == str(tmp_path / "a_2.txt")
@@ -0,0 +1,29 @@
+import pytest
+
+from src.path_policy import PathPolicy, _legacy_is_safe
+
+SYSTEM_FOLDERS = ["Templates", "Recent"]
+
+
+@pytest.mark.parametrize("path", [
+    "/home/user/docs/report.txt",
+    "/home/user/docs/github-notes.md",
+    "/home/user/docs/Templates.docx",
+    "/home/user/docs/recent-changes.txt",
+    "/home/user/GitHub/project/main.py",
+    "/home/user/Templates/letter.docx",
+    "/home/user/project/node_modules/lib/index.js",
+    "/home/user/project/.git/config",
+    "/home/user/project/.env",
+    "/home/user/venv/bin/python",
+])
+def test_is_safe_matches_the_legacy_checks(path):
+    policy = PathPolicy(system_folders=SYSTEM_FOLDERS, ignore_patterns=[])
+    assert policy.is_safe(path) == _legacy_is_safe(path, SYSTEM_FOLDERS)
+
+
+def test_folder_names_also_reject_file_names():
+    policy = PathPolicy(system_folders=SYSTEM_FOLDERS, ignore_patterns=[])
+    assert policy.verdict("/home/user/docs/github-notes.md", ignore=False) == "github"
+    assert policy.verdict("/home/user/docs/Templates.docx", ignore=False) == "system"
+    assert policy.is_safe("/home/user/docs/report.txt")
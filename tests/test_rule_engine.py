@@ -0,0 +1,68 @@
+import os
+from types import SimpleNamespace
+
+from src.rule_engine import RuleEngine
+
+
+def rule(file_types=("*",), priority=0, recursive=False, size_filter=None, date_filter=None, content_filter=None):
+    return SimpleNamespace(file_types=set(file_types), priority=priority, recursive=recursive,
+                           size_filter=size_filter, date_filter=date_filter, content_filter=content_filter)
+
+
+def winners(engine):
+    return {os.path.basename(record.path): compiled.index for record, compiled in engine.matches()}
+
+
+def test_higher_priority_wins_then_rule_order(tmp_path):
+    (tmp_path / "a.txt").write_text("a")
+    (tmp_path / "b.pdf").write_text("b")
+    root = str(tmp_path)
+    engine = RuleEngine([
+        (rule([".txt"]), root),
+        (rule(priority=5), root),
+        (rule([".txt"], priority=5), root),
+        (rule([".pdf"], priority=9), root),
+    ])
+
+    # The wildcard rule ties with the later .txt rule and was given first
+    assert winners(engine) == {"a.txt": 1, "b.pdf": 3}
+
+
+def test_a_failed_predicate_falls_through_to_lower_priority(tmp_path):
+    (tmp_path / "small.txt").write_text("x")
+    (tmp_path / "large.txt").write_text("x" * 1000)
+    root = str(tmp_path)
+    engine = RuleEngine([
+        (rule([".txt"], priority=1), root),
+        (rule([".txt"], priority=2, size_filter={"min_bytes": 100}), root),
+    ])
+
+    assert winners(engine) == {"small.txt": 0, "large.txt": 1}
+
+
+def test_content_is_read_once_per_file(tmp_path):
+    (tmp_path / "note.txt").write_text("Quarterly INVOICE for march")
+    root = str(tmp_path)
+    engine = RuleEngine([
+        (rule([".txt"], priority=3, content_filter="receipt"), root),
+        (rule([".txt"], priority=2, content_filter="contract"), root),
+        (rule([".txt"], priority=1, content_filter="invoice"), root),
+    ])
+
+    assert winners(engine) == {"note.txt": 2}
+    assert engine.stats["content_reads"] == 1
+
+
+def test_nested_roots_share_one_walk(tmp_path):
+    nested = tmp_path / "inner"
+    nested.mkdir()
+    (tmp_path / "top.txt").write_text("t")
+    (nested / "deep.txt").write_text("d")
+    engine = RuleEngine([
+        (rule([".txt"], recursive=True), str(tmp_path)),
+        (rule([".txt"], priority=1), str(nested)),
+    ])
+
+    assert engine.crawl_roots() == [(str(tmp_path), True)]
+    assert winners(engine) == {"top.txt": 0, "deep.txt": 1}
+    assert engine.stats["files"] == 2
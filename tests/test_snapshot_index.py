@@ -0,0 +1,95 @@
+import os
+import shutil
+
+import pytest
+
+from src.snapshot_index import SnapshotIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SnapshotIndex(str(tmp_path / "snapshot_index.db"))
+    yield index
+    index._conn.close()
+
+
+@pytest.fixture
+def root(tmp_path):
+    root = tmp_path / "docs"
+    (root / "notes").mkdir(parents=True)
+    for name, text in (("a.txt", "alpha"), ("b.txt", "bravo"), ("notes/c.txt", "charlie"), ("d.txt", "delta")):
+        (root / name).write_text(text)
+    return root
+
+
+def snapshot(index, root):
+    diff = index.diff(str(root))
+    index.update(diff, {path: f"summary:{path}" for path in diff.changed})
+    return diff
+
+
+def test_first_diff_adds_everything(index, root):
+    diff = snapshot(index, root)
+    assert sorted(diff.added) == ["a.txt", "b.txt", "d.txt", os.path.join("notes", "c.txt")]
+    assert diff.removed == diff.modified == diff.renamed == []
+
+    diff = index.diff(str(root))
+    assert diff.changed == []
+    assert len(diff.unchanged) == 4
+
+
+def test_diff_reports_each_kind_of_change(index, root):
+    snapshot(index, root)
+    # Same inode: matched by (inode, size)
+    os.rename(root / "a.txt", root / "notes" / "moved.txt")
+    # New inode with the same contents: matched by hash
+    shutil.copy(root / "notes" / "c.txt", root / "c-copy.txt")
+    os.remove(root / "notes" / "c.txt")
+    (root / "b.txt").write_text("bravo, edited")
+    os.remove(root / "d.txt")
+    (root / "e.txt").write_text("echo")
+
+    diff = index.diff(str(root))
+    assert sorted(diff.renamed) == [("a.txt", os.path.join("notes", "moved.txt")),
+                                    (os.path.join("notes", "c.txt"), "c-copy.txt")]
+    assert diff.modified == ["b.txt"]
+    assert diff.removed == ["d.txt"]
+    assert diff.added == ["e.txt"]
+
+    # Renamed files keep their summaries
+    current = diff.current
+    assert current[os.path.join("notes", "moved.txt")]["summary_id"] == "summary:a.txt"
+    assert current["c-copy.txt"]["summary_id"] == f"summary:{os.path.join('notes', 'c.txt')}"
+
+    index.update(diff, {"b.txt": "summary:b2", "e.txt": "summary:e"})
+    stored = index.load(str(root))
+    assert sorted(stored) == sorted(current)
+    assert stored["b.txt"]["summary_id"] == "summary:b2"
+
+
+def test_touched_file_is_unchanged(index, root):
+    snapshot(index, root)
+    stat = os.stat(root / "a.txt")
+    os.utime(root / "a.txt", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    diff = index.diff(str(root))
+    assert diff.changed == []
+    assert diff.current["a.txt"]["summary_id"] == "summary:a.txt"
+
+
+def test_reused_inode_is_not_a_rename(index, root):
+    snapshot(index, root)
+    old = index.load(str(root))["a.txt"]
+    os.remove(root / "a.txt")
+    # A new file of the same size that the filesystem gave the old inode
+    (root / "z.txt").write_text("zulu!")
+    os.utime(root / "z.txt", ns=(old["mtime_ns"], old["mtime_ns"] + 10**9))
+    with index._conn:
+        index._conn.execute("UPDATE snapshot SET inode = ? WHERE path = 'a.txt'",
+                            (os.stat(root / "z.txt").st_ino,))
+
+    diff = index.diff(str(root))
+    assert diff.renamed == []
+    assert diff.added == ["z.txt"]
+    assert diff.removed == ["a.txt"]
+    assert diff.current["z.txt"]["summary_id"] is None
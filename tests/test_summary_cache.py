@@ -0,0 +1,70 @@
+import itertools
+from types import SimpleNamespace
+
+import pytest
+
+from src import summary_cache
+from src.summary_cache import SummaryCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Give every access a distinct, increasing timestamp"""
+    ticks = itertools.count(1000)
+    monkeypatch.setattr(summary_cache, "time", SimpleNamespace(time=lambda: float(next(ticks))))
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    # About 1048 bytes: ten 100-byte summaries fit, the eleventh evicts
+    cache = SummaryCache(str(tmp_path / "summaries.db"), max_size_mb=0.001)
+    yield cache
+    cache._conn.close()
+
+
+def test_eviction_drops_least_recently_used(cache):
+    for i in range(10):
+        cache.put(f"hash{i}", "model", "v1", str(i) * 100)
+    assert cache._total_bytes == 1000
+
+    # Reading hash0 makes hash1 and hash2 the oldest
+    assert cache.get("hash0", "model", "v1") == "0" * 100
+    cache.put("hash10", "model", "v1", "x" * 100)
+
+    # Evicted down to 90% of the limit
+    assert cache._total_bytes == 900
+    assert cache.get("hash1", "model", "v1") is None
+    assert cache.get("hash2", "model", "v1") is None
+    assert cache.get("hash0", "model", "v1") == "0" * 100
+    assert cache.get("hash10", "model", "v1") == "x" * 100
+
+
+def test_replacing_an_entry_keeps_the_size_exact(cache):
+    cache.put("hash", "model", "v1", "a" * 300)
+    cache.put("hash", "model", "v1", "b" * 100)
+    assert cache._total_bytes == 100
+    assert cache.get("hash", "model", "v1") == "b" * 100
+
+
+def test_lookup_by_file_contents(cache, tmp_path):
+    first = tmp_path / "first.txt"
+    second = tmp_path / "second.txt"
+    first.write_text("same contents")
+    second.write_text("same contents")
+
+    assert cache.lookup(str(first), "model", "v1") is None
+    key = cache.store(str(first), "model", "v1", {"file_path": str(first), "summary": "A summary"})
+    assert cache.get_by_key(key) == "A summary"
+    # A copy hits the same entry; another model or prompt version doesn't
+    assert cache.lookup(str(second), "model", "v1") == {"file_path": str(second), "summary": "A summary"}
+    assert cache.lookup(str(second), "other", "v1") is None
+    assert cache.lookup(str(second), "model", "v2") is None
+    assert cache.store(str(first), "model", "v1", {"summary": ""}) is None
+
+
+def test_invalidate_prompt_versions(cache):
+    cache.put("hash", "model", "old", "a" * 100)
+    cache.put("hash", "model", "new", "b" * 100)
+    assert cache.invalidate_prompt_versions(["new"]) == 1
+    assert cache._total_bytes == 100
+    assert cache.get("hash", "model", "old") is None
@@ -0,0 +1,67 @@
+import zipfile
+
+from src import text_extractor
+from src.text_extractor import SAMPLE_SEPARATOR, extract_text
+
+
+def write_lines(path, count):
+    path.write_text("".join(f"line {i:05d}\n" for i in range(count)))
+    return str(path)
+
+
+def test_head_stops_at_the_budget(tmp_path):
+    path = write_lines(tmp_path / "long.txt", 10000)
+    text = extract_text(path, max_tokens=25, sampling="head")
+    assert len(text) == 100
+    assert text.startswith("line 00000")
+
+
+def test_head_middle_tail_samples_text_files(tmp_path):
+    path = write_lines(tmp_path / "long.txt", 10000)
+    text = extract_text(path, max_tokens=30, sampling="head_middle_tail")
+    head, middle, tail = text.split(SAMPLE_SEPARATOR)
+    assert head.startswith("line 00000")
+    assert "line 0500" in middle or "line 0499" in middle
+    assert tail.endswith("line 09999\n")
+
+
+def test_short_files_are_not_sampled(tmp_path):
+    path = write_lines(tmp_path / "short.txt", 3)
+    assert extract_text(path, max_tokens=100, sampling="head_middle_tail") == "line 00000\nline 00001\nline 00002\n"
+
+
+def test_docx_keeps_head_and_tail(tmp_path):
+    ns = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+    paragraphs = "".join(f"<w:p><w:r><w:t>paragraph {i:03d}</w:t></w:r></w:p>" for i in range(200))
+    path = tmp_path / "doc.docx"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("word/document.xml", f'<w:document xmlns:w="{ns}"><w:body>{paragraphs}</w:body></w:document>')
+
+    text = extract_text(str(path), max_tokens=20, sampling="head_middle_tail")
+    head, tail = text.split(SAMPLE_SEPARATOR)
+    assert head.startswith("paragraph 000")
+    assert tail.endswith("paragraph 199")
+    assert "paragraph 100" not in text
+
+
+class FakePage:
+    def __init__(self, number, extracted):
+        self.number = number
+        self.extracted = extracted
+
+    def extract_text(self):
+        self.extracted.append(self.number)
+        return f"page {self.number:03d} " * 10
+
+
+def test_pdf_sampling_only_parses_the_sampled_pages(tmp_path, monkeypatch):
+    extracted = []
+    pages = [FakePage(i, extracted) for i in range(100)]
+    monkeypatch.setattr(text_extractor, "_pdf_pages", lambda path: pages)
+
+    text = extract_text(str(tmp_path / "report.pdf"), max_tokens=60, sampling="head_middle_tail")
+    head, middle, tail = text.split(SAMPLE_SEPARATOR)
+    assert head.startswith("page 000")
+    assert middle.startswith("page 050")
+    assert "page 099" in tail
+    assert len(extracted) < 10
@@ -0,0 +1,81 @@
+import json
+
+from src import tree_generator
+from src.tree_generator import _plan_shard
+
+
+class ScriptedProvider:
+    """Answers each chat request with the next scripted list of proposals"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def chat(self, messages, json_mode=False):
+        self.requests.append([summary["file_path"] for summary in json.loads(messages[-1]["content"])])
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return json.dumps({"files": response})
+
+
+SUMMARIES = [{"file_path": path, "summary": ""} for path in ("a.pdf", "b.jpg", "c.txt")]
+
+
+def test_missing_files_are_requested_again():
+    provider = ScriptedProvider(
+        [{"src_path": "a.pdf", "dst_path": "Docs/a.pdf"}, {"src_path": "invented.txt", "dst_path": "x.txt"}],
+        [{"src_path": "b.jpg", "dst_path": "Photos/b.jpg"}, {"src_path": "c.txt", "dst_path": "Notes/c.txt"}],
+    )
+    files = _plan_shard(provider, SUMMARIES)
+    assert provider.requests == [["a.pdf", "b.jpg", "c.txt"], ["b.jpg", "c.txt"]]
+    assert files == [
+        {"src_path": "a.pdf", "dst_path": "Docs/a.pdf"},
+        {"src_path": "b.jpg", "dst_path": "Photos/b.jpg"},
+        {"src_path": "c.txt", "dst_path": "Notes/c.txt"},
+    ]
+
+
+def test_still_missing_files_are_placed_by_extension():
+    provider = ScriptedProvider(
+        [{"src_path": "a.pdf", "dst_path": "Docs/a.pdf"}, {"src_path": "a.pdf", "dst_path": "Other/a.pdf"}],
+        [{"src_path": "b.jpg", "dst_path": ""}],
+    )
+    files = _plan_shard(provider, SUMMARIES)
+    assert [file["src_path"] for file in files] == ["a.pdf", "b.jpg", "c.txt"]
+    assert files[0]["dst_path"] == "Docs/a.pdf"
+    assert files[1]["dst_path"].startswith("Images")
+    assert files[2]["dst_path"].startswith("Documents")
+
+
+def test_failed_request_falls_back_for_the_rest():
+    provider = ScriptedProvider([{"src_path": "c.txt", "dst_path": "Notes/c.txt"}], RuntimeError("down"))
+    files = _plan_shard(provider, SUMMARIES)
+    assert len(provider.requests) == 2
+    assert [file["dst_path"].split("/")[0] for file in files] == ["Documents", "Images", "Notes"]
+
+
+class FolderProvider:
+    """Puts each file in a fixed folder and merges Docs into Documents"""
+    available = True
+    name = "folders"
+    destinations = {"a.pdf": "Docs/a.pdf", "b.jpg": "Photos/b.jpg", "c.txt": "Documents/c.txt"}
+
+    def chat(self, messages, json_mode=False):
+        if messages[0]["content"] == tree_generator.MERGE_PROMPT:
+            return json.dumps({"folders": [{"src_folder": "Docs", "dst_folder": "Documents"},
+                                           {"src_folder": "Photos", "dst_folder": "Photos"}]})
+        paths = [summary["file_path"] for summary in json.loads(messages[-1]["content"])]
+        return json.dumps({"files": [{"src_path": p, "dst_path": self.destinations[p]} for p in paths]})
+
+
+def test_shards_are_streamed_before_the_folder_merge(monkeypatch, set_config):
+    set_config("llm.tree_shard_tokens", 1)  # one file per shard
+    monkeypatch.setattr(tree_generator, "get_provider", FolderProvider)
+
+    updates = list(tree_generator.iter_file_tree(SUMMARIES))
+    assert [update["type"] for update in updates] == ["files", "files", "files", "folders"]
+    assert updates[-1]["folders"] == {"Docs": "Documents"}
+
+    files = tree_generator.create_file_tree(SUMMARIES)
+    assert sorted(file["dst_path"] for file in files) == ["Documents/a.pdf", "Documents/c.txt", "Photos/b.jpg"]
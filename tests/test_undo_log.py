@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+from src.undo_log import UndoLog
+
+
+@pytest.fixture
+def log(tmp_path, set_config):
+    set_config("paths.data_dir", str(tmp_path / "data"))
+    log = UndoLog(str(tmp_path / "undo_log.db"))
+    yield log
+    log._conn.close()
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "tree"
+    root.mkdir()
+    for name in ("a.txt", "b.txt", "c.txt"):
+        (root / name).write_text(name)
+    return root
+
+
+def organize(log, root, names=("a.txt", "b.txt", "c.txt")):
+    with log.start_run("test", str(root)) as run:
+        for name in names:
+            run.move_file(str(root / name), str(root / "sorted" / name))
+    return run.id
+
+
+def test_rollback_restores_the_run(log, tree):
+    run_id = organize(log, tree)
+
+    preview = log.rollback(run_id, dry_run=True)
+    assert preview["status"] == "dry_run"
+    assert preview["restored"] == 3
+    assert os.listdir(tree) == ["sorted"]
+
+    result = log.rollback(run_id)
+    assert result["status"] == "rolled_back"
+    assert result["restored"] == 3
+    assert result["conflicts"] == []
+    assert result["directories_removed"] == 1
+    assert sorted(os.listdir(tree)) == ["a.txt", "b.txt", "c.txt"]
+    assert log.get_run(run_id)["status"] == "rolled_back"
+    assert log.operations(run_id) == []
+
+
+def test_modified_and_blocked_files_are_left_alone(log, tree):
+    run_id = organize(log, tree)
+    (tree / "sorted" / "a.txt").write_text("edited after the move")
+    (tree / "b.txt").write_text("a new file took the old name")
+
+    result = log.rollback(run_id)
+    reasons = {os.path.basename(c["path"]): c["reason"] for c in result["conflicts"]}
+    assert reasons == {"a.txt": "File was modified", "b.txt": "Original location is taken"}
+    assert result["status"] == "partially_rolled_back"
+    assert result["restored"] == 1
+    assert (tree / "c.txt").read_text() == "c.txt"
+    assert (tree / "b.txt").read_text() == "a new file took the old name"
+    assert sorted(os.listdir(tree / "sorted")) == ["a.txt", "b.txt"]
+
+    # Once the conflicts are resolved a second rollback moves the rest
+    (tree / "b.txt").unlink()
+    (tree / "sorted" / "a.txt").unlink()
+    result = log.rollback(run_id)
+    assert result["restored"] == 1
+    assert [c["reason"] for c in result["conflicts"]] == ["File no longer exists"]
+    assert (tree / "b.txt").read_text() == "b.txt"
+
+
+def test_missing_run(log):
+    with pytest.raises(KeyError):
+        log.rollback("missing")
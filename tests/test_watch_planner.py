@@ -0,0 +1,46 @@
+from src.watch_planner import WatchPlanner
+
+SUMMARIES = {
+    "invoices/jan.pdf": {"summary": "Electricity invoice from the utility company for January"},
+    "invoices/feb.pdf": {"summary": "Electricity invoice from the utility company for February"},
+    "photos/beach.jpg": {"summary": "Sunset over a sandy beach"},
+    "photos/dog.jpg": {"summary": "A brown dog playing fetch"},
+    "notes/todo.txt": {"summary": "Shopping list and errands"},
+}
+
+
+def planner_for(summaries, **kwargs):
+    planner = WatchPlanner(**kwargs)
+    planner.rebuild(summaries)
+    return planner
+
+
+def test_context_holds_only_affected_files_and_their_neighbours():
+    summaries = dict(SUMMARIES, **{"inbox/mar.pdf": {"summary": "Electricity invoice from the utility for March"}})
+    planner = planner_for(summaries, max_neighbours=2)
+
+    context = planner.build_context(summaries, ["inbox/mar.pdf", "inbox/mar.pdf", "missing.txt"])
+    assert [f["file_path"] for f in context["files"]] == ["inbox/mar.pdf"]
+    # Similar summaries rank before unrelated files
+    assert sorted(f["file_path"] for f in context["related_files"]) == ["invoices/feb.pdf", "invoices/jan.pdf"]
+    assert context["folders"]["invoices"] == 2
+
+
+def test_affected_files_are_not_their_own_neighbours():
+    planner = planner_for(SUMMARIES)
+    context = planner.build_context(SUMMARIES, ["invoices/jan.pdf", "invoices/feb.pdf"])
+    related = [f["file_path"] for f in context["related_files"]]
+    assert "invoices/jan.pdf" not in related and "invoices/feb.pdf" not in related
+
+
+def test_indexes_follow_removals_and_updates():
+    summaries = dict(SUMMARIES)
+    planner = planner_for(summaries)
+    planner.remove("invoices/jan.pdf")
+    del summaries["invoices/jan.pdf"]
+    assert planner.folder_digest()["invoices"] == 1
+
+    summaries["photos/dog.jpg"] = {"summary": "Electricity invoice scanned by mistake"}
+    planner.add("photos/dog.jpg", summaries["photos/dog.jpg"])
+    assert planner.neighbours("invoices/feb.pdf")[0] == "photos/dog.jpg"
+    assert "invoices/jan.pdf" not in planner.neighbours("invoices/feb.pdf")